@@ -0,0 +1,80 @@
+"""
+Time loading the gxwf config with 10k and 100k aliases: with PyYAML's pure Python loader (as gxwf used to), with
+libyaml's loader, and from the parsed-config cache, both in a new process and again within the same process.
+
+Run with `python benchmarks/bench_config.py [number of aliases ...]`; nothing outside a temporary directory is touched.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPEATS = 5
+COLD_START = """
+import sys, time
+start = time.perf_counter()
+from gxwf import utils
+cnfg = utils._read_configfile()
+print(time.perf_counter() - start)
+"""
+
+
+def _best(f, repeats=REPEATS):
+    times = []
+    for n in range(repeats):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _in_new_process(env):
+    """
+    Time reading the config in a fresh interpreter, as a gxwf command would (including importing gxwf.utils).
+    """
+    return min(float(subprocess.check_output([sys.executable, '-c', COLD_START], env=env)) for n in range(REPEATS))
+
+
+def bench(aliases, home):
+    import yaml
+
+    env = dict(os.environ, HOME=home, XDG_CACHE_HOME=os.path.join(home, '.cache'))
+    config_path = os.path.join(home, '.gxwf')
+    config = {'active_login': 'main', 'logins': {'main': {'url': 'https://usegalaxy.eu/', 'api_key': 'x' * 32, 'hid': 'f' * 16}},
+              'aliases': {'alias_{}'.format(n): '{:016x}'.format(n) for n in range(aliases)}}
+    with open(config_path, 'w') as f:
+        f.write(yaml.dump(config, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper)))
+
+    def load(loader):
+        with open(config_path) as f:
+            return yaml.load(f, Loader=loader)
+
+    results = [('PyYAML SafeLoader', _best(lambda: load(yaml.SafeLoader), 1))]
+    if hasattr(yaml, 'CSafeLoader'):
+        results.append(('libyaml CSafeLoader', _best(lambda: load(yaml.CSafeLoader))))
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.update(env)
+    from gxwf import utils
+    utils.CACHE_DIR = os.path.join(env['XDG_CACHE_HOME'], 'gxwf')
+    utils._parsed_configs.clear()
+    results.append(('gxwf, first run (parse + cache)', _best(lambda: utils._load_config(config_path), 1)))
+    results.append(('gxwf, same process', _best(lambda: utils._load_config(config_path))))
+    results.append(('gxwf, new process (incl. startup)', _in_new_process(env)))
+    assert utils._load_config(config_path) == config
+    return results
+
+
+def main(sizes):
+    for aliases in sizes:
+        with tempfile.TemporaryDirectory() as home:
+            results = bench(aliases, home)
+        print('\n{} aliases'.format(aliases))
+        baseline = results[0][1]
+        for name, seconds in results:
+            print('  {:<36}{:>10.1f} ms{:>9.1f}x'.format(name, seconds * 1000, baseline / seconds))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10000, 100000])
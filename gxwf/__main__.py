@@ -0,0 +1,3 @@
+from gxwf.cli import cli
+
+cli(prog_name='gxwf')
@@ -0,0 +1,405 @@
+"""
+gxwf from Python: the operations behind the CLI, as functions returning records rather than printing tables.
+
+Log in once with connect() and pass the session to each call, e.g.
+
+    from gxwf import api
+
+    session = api.connect()
+    for wf in api.workflows(search='rnaseq', session=session):
+        print(wf.name, wf.id)
+    run = api.invoke('my_alias', inputs={'0': {'src': 'hda', 'id': 'f2db41e1'}}, session=session)
+
+Listings are iterators of named tuples, parsed from the server's response as it arrives. IDs can be given as
+aliases wherever the CLI accepts them. If no session is given, the active login is used, which means logging in
+again for every call. Failures raise bioblend's ConnectionError rather than printing a message.
+"""
+import threading
+import warnings
+
+from typing import NamedTuple
+
+from gxwf import utils
+from gxwf import stream
+from gxwf import ledger
+from gxwf import dashboard
+from gxwf import completion
+from gxwf import search as search_index
+
+
+class Session(NamedTuple):
+    """
+    A logged in GalaxyInstance, with the login's config and aliases.
+    """
+    gi: object
+    cnfg: dict
+    aliases: dict
+
+    def resolve(self, id_):
+        return self.aliases.get(id_, id_)  # if given an alias, return the id; else assume it is a raw id
+
+    def aliases_inverted(self):
+        return {v: k for k, v in self.aliases.items()}
+
+
+class Workflow(NamedTuple):
+    """
+    All we keep of each workflow, from the moment it is parsed until it is shown; the same tuples are stored in the search index.
+    """
+    id: str
+    name: str
+    owner: str
+    tags: list
+    number_of_steps: int
+    update_time: str
+    alias: str = ''
+
+
+class Dataset(NamedTuple):
+    """
+    All we keep of each dataset, from the moment it is parsed until it is shown; the same tuples are stored in the search index.
+    """
+    id: str
+    name: str
+    extension: str
+    tags: list
+    history_id: str
+    state: str
+    deleted: bool
+    update_time: str
+    alias: str = ''
+
+
+class Invocation(NamedTuple):
+    id: str
+    workflow_id: str
+    history_id: str
+    state: str
+    update_time: str
+    jobs: dict = None  # number of jobs in each state
+
+
+class Run(NamedTuple):
+    """
+    A submitted invocation; reused is set if an identical earlier run which succeeded was returned instead.
+    """
+    id: str
+    history_id: str
+    workflow_id: str
+    reused: bool = False
+
+
+class Upload(NamedTuple):
+    id: str
+    name: str
+    kind: str  # 'workflow' or 'dataset'
+
+
+class Alias(NamedTuple):
+    alias: str
+    id: str
+
+
+class Collection(NamedTuple):
+    id: str
+    name: str
+    collection_type: str  # 'list' or 'list:paired'
+    elements: int
+
+
+WORKFLOW_FIELDS = Workflow._fields[:-1]  # those which come from the server
+DATASET_FIELDS = Dataset._fields[:-1]
+INVOCATION_FIELDS = Invocation._fields[:-1]
+
+
+def connect():
+    """
+    Log in with the active login, as set with `gxwf manage`.
+    """
+    return Session(*utils._login())
+
+
+def workflows(public=False, search=None, session=None):
+    """
+    The user's workflows, or all published workflows if public is set; filtered on the server if search is given.
+    """
+    session = session or connect()
+    params = search_index._workflow_params(search, public) if search else ({'show_published': True} if public else {})
+    aliases_inverted = session.aliases_inverted()
+    for wf in stream._get_list(session.gi, '/workflows', params, Workflow):
+        yield wf._replace(alias=aliases_inverted.get(wf.id, ''))
+
+
+def _datasets(gi, cnfg, all, params=None):
+    """
+    Fetch datasets, optionally filtered on the server using the given q/qv parameters.
+
+    Datasets are parsed one at a time as they arrive, keeping only DATASET_FIELDS of each in a Dataset, and yielded as they are.
+    """
+    params = dict(params or {'v': 'dev'}, keys=','.join(DATASET_FIELDS))  # no need for the server to send anything else
+    if all:
+        params.setdefault('limit', 1000000000000)  # replace this with paging when it is needed
+        for ds in stream._get_list(gi, '/datasets', params, Dataset):
+            yield ds
+        return
+
+    for ds in stream._get_list(gi, '/histories/{}/contents'.format(cnfg['hid']), params, Dataset):
+        if not params.get('q') and 'gxwf' not in (ds.tags or []):
+            gi.histories.update_dataset(cnfg['hid'], ds.id, tags=['gxwf'])
+        yield ds
+
+
+def datasets(all=False, search=None, session=None):
+    """
+    Datasets in the gxwf history, or all of the user's datasets if all is set; filtered on the server if search is
+    given. Without a search, this includes deleted datasets and those which are not ok.
+    """
+    session = session or connect()
+    params = search_index._dataset_params(search, DATASET_FIELDS) if search else None
+    aliases_inverted = session.aliases_inverted()
+    for ds in _datasets(session.gi, session.cnfg, all, params):
+        yield ds._replace(alias=aliases_inverted.get(ds.id, ''))
+
+
+def invocations(workflow_id=None, jobs=True, limit=None, session=None):
+    """
+    Invocations of a workflow, or all invocations, at most limit of them, most recent first, if limit is given;
+    unless jobs is False, with the number of jobs in each state, which takes a request per invocation, made as each
+    one is reached.
+    """
+    session = session or connect()
+    if workflow_id:
+        path = '/workflows/{}/invocations'.format(session.resolve(workflow_id))  # will be deprecated, use /invocations?workflow_id= in future
+    else:
+        path = '/invocations'
+    for item in stream._get_list(session.gi, path, {'limit': limit} if limit else None, INVOCATION_FIELDS):
+        invocation = Invocation(**item)
+        if jobs:
+            invocation = invocation._replace(jobs=session.gi.invocations.get_invocation_summary(invocation.id).get('states', {}))
+        yield invocation
+
+
+def _run_record(gi, inputs_dict, run_ledger):
+    """
+    Describe a run for the ledger: the workflow's current version and the checksums of its input datasets. Each is
+    looked up once per ledger, i.e. per command or api call, however many runs use it.
+    """
+    wf_id = inputs_dict['wf_id']
+    versions, dataset_hashes = run_ledger.versions, run_ledger.hashes
+    if wf_id not in versions:
+        versions[wf_id] = gi.workflows.show_workflow(wf_id).get('version')
+    input_hashes = {}
+    for name, value in (inputs_dict.get('inputs') or {}).items():
+        if isinstance(value, dict) and value.get('src') == 'hda':
+            if value['id'] not in dataset_hashes:
+                hashes = gi.datasets.show_dataset(value['id']).get('hashes') or []
+                dataset_hashes[value['id']] = sorted('{}:{}'.format(h['hash_function'], h['hash_value']) for h in hashes) or None
+            input_hashes[name] = dataset_hashes[value['id']]
+    record = {'type': 'run', 'workflow_id': wf_id, 'version': versions[wf_id], 'inputs': inputs_dict.get('inputs') or {},
+              'input_hashes': input_hashes, 'params': inputs_dict.get('params') or {}}
+    record['key'] = ledger._run_key(wf_id, record['version'], record['inputs'], input_hashes, record['params'])
+    return record
+
+
+def _succeeded(gi, run_ledger, invocation_id):
+    """
+    Whether an invocation finished successfully, from the ledger if its outcome was recorded, else from the server.
+    """
+    state = run_ledger.outcome(invocation_id)
+    if state is None:
+        try:
+            invocation = dashboard.Invocation(gi.invocations.show_invocation(invocation_id))
+            invocation.jobs = gi.invocations.get_invocation_summary(invocation_id).get('states', {})
+        except Exception:  # e.g. it has been deleted since
+            return False
+        if not invocation.finished:
+            return False
+        state = 'failed' if invocation.failed else 'ok'
+        run_ledger.append({'type': 'outcome', 'invocation_id': invocation_id, 'state': state})
+    return state == 'ok'
+
+
+def _history_kept(gi, history_id):
+    """
+    Whether a history, and so the outputs of the runs in it, still exists, i.e. hasn't been deleted or purged (e.g. by `gxwf gc`).
+    """
+    try:
+        history = gi.histories.show_history(history_id)
+    except Exception:  # e.g. it has been purged since
+        return False
+    return not (history.get('deleted') or history.get('purged'))
+
+
+def _tag_history(gi, history_id):
+    """
+    Tag a history as gxwf's in the background; nothing needs the tag until later (e.g. `gxwf gc`), so submitting the next invocation needn't wait for it.
+    """
+    def tag():
+        try:
+            gi.histories.create_history_tag(history_id, 'gxwf')
+        except Exception as e:  # the invocation itself is fine, so just warn
+            warnings.warn("Could not tag history {}: {}".format(history_id, e))
+    thread = threading.Thread(target=tag)  # not a daemon thread, so gxwf won't exit before the tag is added
+    thread.start()
+    return thread
+
+
+def _submit(gi, inputs_dict, history, history_id=None, run_ledger=None, reuse=True):
+    """
+    Invoke a workflow as described by an inputs dict (as saved by `gxwf invoke from-params --save-yaml`), in a new
+    history with the given name, or in an existing one if history_id is given.
+
+    If a ledger is given, the run is recorded in it; unless reuse is False, an identical run which already succeeded,
+    and whose history is still there, is returned instead of invoking the workflow again.
+    """
+    record = _run_record(gi, inputs_dict, run_ledger) if run_ledger is not None else None
+    if record is not None and reuse:
+        for previous in reversed(run_ledger.find('key', record['key'])):
+            if _succeeded(gi, run_ledger, previous['invocation_id']) and _history_kept(gi, previous['history_id']):
+                return Run(previous['invocation_id'], previous['history_id'], previous.get('workflow_instance_id'), reused=True)
+
+    if history_id:
+        inv = gi.workflows.invoke_workflow(inputs_dict['wf_id'], inputs=inputs_dict['inputs'], params=inputs_dict['params'], history_id=history_id)
+    else:  # Galaxy creates the history as part of the invocation, saving a round-trip
+        inv = gi.workflows.invoke_workflow(inputs_dict['wf_id'], inputs=inputs_dict['inputs'], params=inputs_dict['params'], history_name=history)
+    if record is not None:
+        run_ledger.append(dict(record, invocation_id=inv['id'], history_id=inv['history_id'], workflow_instance_id=inv.get('workflow_id')))
+    if not history_id:
+        _tag_history(gi, inv['history_id'])
+    return Run(inv['id'], inv['history_id'], inv.get('workflow_id'))
+
+
+def invoke(workflow_id, inputs=None, params=None, history='gxwf_history', history_id=None, rerun=False, session=None):
+    """
+    Invoke a workflow, in a new history with the given name or in an existing one. inputs map input steps to
+    datasets (e.g. {'0': {'src': 'hda', 'id': ...}}, IDs or aliases) or values, and params map steps to tool parameters.
+
+    The run is recorded in the local ledger (see `gxwf runs`); unless rerun is set, if an identical run has already
+    succeeded, it is returned instead of invoking the workflow again.
+    """
+    session = session or connect()
+    inputs = {name: dict(value, id=session.resolve(value['id'])) if isinstance(value, dict) and 'id' in value else value
+              for name, value in (inputs or {}).items()}
+    inputs_dict = {'wf_id': session.resolve(workflow_id), 'inputs': inputs, 'params': params or {}}
+    run = _submit(session.gi, inputs_dict, history, history_id, ledger._load_ledger(session.cnfg), reuse=not rerun)
+    completion._update_index([('invocation', run.id)])
+    return run
+
+
+def upload(path, public=False, file_type='auto', session=None):
+    """
+    Upload a file to the gxwf history, or a workflow (.ga or Format 2), which is published if public is set.
+    """
+    from gxwf.subcommands import convert
+
+    session = session or connect()
+    gi, cnfg = session.gi, session.cnfg
+    if path[-3:] == '.ga' or convert._is_format2(path):  # decide based on ext whether to upload as wf or ds. is this sufficient?
+        wf_dict = convert._read_workflow(path)  # Format 2 workflows are converted to .ga in memory
+    else:
+        wf_dict = None
+
+    if wf_dict is not None:
+        wf_dict.setdefault('tags', []).append('gxwf')
+        wf = gi.workflows.import_workflow_dict(wf_dict, publish=public)  # could use import_workflow_from_local_path, but then would need a second call to add the gxwf tag
+        return Upload(wf['id'], wf.get('name'), 'workflow')
+
+    return _upload_dataset(gi, cnfg, path, file_type)
+
+
+def _upload_dataset(gi, cnfg, path, file_type='auto'):
+    ds = gi.tools.upload_file(path, cnfg['hid'], file_type=file_type)['outputs'][0]
+    gi.histories.update_dataset(cnfg['hid'], ds['id'], tags=['gxwf'])
+    return Upload(ds['id'], ds.get('name'), 'dataset')
+
+
+def _element_identifiers(elements, collection_type):
+    """
+    The element identifiers describing a collection's elements, given as {identifier: dataset ID} for a list, or
+    {identifier: (forward ID, reverse ID)} for a list:paired.
+    """
+    if collection_type == 'list':
+        return [{'name': name, 'src': 'hda', 'id': id_} for name, id_ in elements.items()]
+    return [{'name': name, 'src': 'new_collection', 'collection_type': 'paired',
+             'element_identifiers': [{'name': 'forward', 'src': 'hda', 'id': forward}, {'name': 'reverse', 'src': 'hda', 'id': reverse}]}
+            for name, (forward, reverse) in elements.items()]
+
+
+def create_collection(name, elements, collection_type='list', history_id=None, session=None):
+    """
+    Build a list or list:paired collection of datasets (see _element_identifiers), in the gxwf history unless
+    history_id is given. However many elements it has, the collection is created with a single request.
+    """
+    session = session or connect()
+    description = {'name': name, 'collection_type': collection_type, 'element_identifiers': _element_identifiers(elements, collection_type)}
+    hdca = session.gi.histories.create_dataset_collection(history_id or session.cnfg['hid'], description)
+    completion._update_index([('dataset', hdca['id'])])
+    return Collection(hdca['id'], hdca.get('name', name), collection_type, len(elements))
+
+
+def _save_aliases(aliases, configfile=utils.CONFIG_PATH):
+    f = utils._read_configfile(configfile=configfile)
+    f['aliases'] = aliases
+    utils._write_to_file(f, configfile)
+    completion._update_index(aliases=aliases)
+    search_index._update_aliases(*utils._read_login())
+
+
+def _aliases(session):
+    return session.aliases if session else utils._read_login()[1]  # aliases are only stored locally, so no need to log in
+
+
+def aliases(session=None):
+    """
+    All aliases, with the IDs they stand for.
+    """
+    for alias, id_ in _aliases(session).items():
+        yield Alias(alias, id_)
+
+
+def add_alias(id_, alias=None, session=None):
+    """
+    Assign an alias to an ID, a randomly generated one if none is given.
+    """
+    import namesgenerator
+
+    aliases = _aliases(session)
+    alias = alias or namesgenerator.get_random_name()
+    aliases[alias] = id_
+    _save_aliases(aliases)
+    return Alias(alias, id_)
+
+
+def add_aliases(session=None):
+    """
+    Assign randomly generated aliases to all workflows and datasets in the gxwf history which do not have one yet,
+    returning the new aliases.
+    """
+    import namesgenerator
+
+    session = session or connect()
+    workflow_ids = [wf.id for wf in workflows(session=session)]
+    dataset_ids = [ds.id for ds in _datasets(session.gi, session.cnfg, False)]
+    completion._update_index([('workflow', id_) for id_ in workflow_ids] + [('dataset', id_) for id_ in dataset_ids])
+    added = []
+    for id_ in workflow_ids + dataset_ids:
+        if id_ not in session.aliases.values():  # we do not overwrite if an alias already exists
+            while True:
+                alias = namesgenerator.get_random_name()
+                # we can allow one id to have multiple aliases but NOT the reverse
+                if alias not in session.aliases:
+                    break
+            session.aliases[alias] = id_
+            added.append(Alias(alias, id_))
+    _save_aliases(session.aliases)
+    return added
+
+
+def remove_aliases(names, session=None):
+    """
+    Remove the given aliases.
+    """
+    aliases = _aliases(session)
+    for alias in names:
+        aliases.pop(alias)
+    _save_aliases(aliases)
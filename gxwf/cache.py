@@ -0,0 +1,117 @@
+"""
+Serving read commands from the local store (the search indexes kept by `gxwf sync`), so they respond immediately
+and keep working while the server is slow or down.
+
+Cached listings are shown straight away and, once they are older than FRESH_FOR, refreshed by a `gxwf sync` run in
+a detached background process (stale-while-revalidate), so the next command sees the updated data. In offline
+mode the server is never contacted. Whenever cached data is shown, a note on stderr says how old it is, so output
+piped into other tools is unaffected.
+
+Nothing in this module may import bioblend at the top level, so offline commands never pay for it.
+"""
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+from gxwf import utils
+
+FRESH_FOR = 60  # seconds for which a cached listing is shown without refreshing it
+
+
+def _connection_errors():
+    """
+    Exceptions meaning the server could not be reached or is failing; evaluated lazily, as it imports bioblend.
+    """
+    import requests
+    from bioblend import ConnectionError as BioblendConnectionError
+
+    return (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout, BioblendConnectionError)
+
+
+def _age(index):
+    """
+    Seconds since an index was last saved, or None if it never was.
+    """
+    try:
+        return max(0.0, time.time() - os.path.getmtime(index.path))
+    except FileNotFoundError:
+        return None
+
+
+def _describe_age(seconds):
+    for unit, length in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= length:
+            n = int(seconds // length)
+            return '{} {}{} ago'.format(n, unit, 's' if n > 1 else '')
+    return 'just now'
+
+
+def _lock_path(cnfg):
+    return os.path.join(utils._cache_dir(cnfg), 'revalidate.lock')
+
+
+def _try_lock(cnfg):
+    """
+    Take the lock held while a background refresh runs, returning the open lock file, or None if it is already held.
+    """
+    try:
+        import fcntl
+    except ImportError:  # no locking available: allow overlapping refreshes, which are harmless, just wasteful
+        return open(os.devnull)
+    path = _lock_path(cnfg)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _revalidate(cnfg, collection):
+    """
+    Refresh a collection of the local store with `gxwf sync` in a detached process, unless a refresh is already running.
+    """
+    lock = _try_lock(cnfg)
+    if lock is None:
+        return
+    lock.close()  # the background sync takes the lock itself; if two slip through, the second one gives up
+    subprocess.Popen([sys.executable, '-m', 'gxwf', 'sync', '--background', collection], stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def _cached(index, cnfg, collection, offline, error=None):
+    """
+    Note on stderr how old the cached data in an index is and, unless offline, refresh it in the background if it
+    is no longer fresh. error is the reason the server couldn't be used, if any.
+    """
+    age = _age(index)
+    if age is None and offline:
+        click.echo(click.style("Offline: nothing is cached yet; run `gxwf sync` while the server is reachable.", fg='yellow'), err=True)
+        return
+    when = _describe_age(age) if age is not None else 'at an unknown time'
+    if offline:
+        click.echo(click.style("Offline: showing data cached {}.".format(when), fg='yellow'), err=True)
+    elif error is not None:
+        click.echo(click.style("Could not reach the server ({}); showing data cached {}.".format(error, when), fg='yellow'), err=True)
+    elif age is None or age >= FRESH_FOR:
+        click.echo(click.style("Showing data cached {}; refreshing in the background.".format(when), fg='yellow'), err=True)
+        _revalidate(cnfg, collection)
+
+
+def _records(index, search, row=None):
+    """
+    Records from an index, matching search if given, else all of them, most recently updated first; as dicts, or
+    as instances of row, a named tuple type with the index's fields.
+    """
+    if search:
+        return index.search(search, row=row)
+    numbers = list(index.numbers.values())
+    if 'update_time' in index.fields:
+        update_time = index.fields.index('update_time')
+        numbers.sort(key=lambda number: index.docs[number][update_time] or '', reverse=True)
+    return index.rows(numbers, row)
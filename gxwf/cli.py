@@ -10,8 +10,18 @@ from .subcommands import alias as alias_commands
 from .subcommands import invocations as invocation_commands
 from .subcommands import upload as upload_commands
 from .subcommands import edit as edit_commands
+from .subcommands import convert as convert_commands
+from .subcommands import sync as sync_commands
+from .subcommands import download as download_commands
+from .subcommands import gc as gc_commands
+from .subcommands import wait as wait_commands
+from .subcommands import runs as runs_commands
+from .subcommands import pipeline as pipeline_commands
+from .subcommands import profile as profile_commands
+from .subcommands import collection as collection_commands
 
 from gxwf import utils
+from gxwf import completion
 
 
 class Info(object):
@@ -44,6 +54,8 @@ def cli(info: Info, verbose: int):
     Run gxwf, a tool for executing and managing scientific workflows on Galaxy.
 
     To get started for the first time, run `gxwf manage add-login --help` to add login details.
+
+    To enable shell completion of IDs and aliases, add `eval "$(_GXWF_COMPLETE=source_bash gxwf)"` to your ~/.bashrc (or source_zsh to ~/.zshrc).
     """
     # Use the verbosity count to determine the logging level...
     if verbose > 0:
@@ -74,17 +86,21 @@ manage.add_command(manage_commands.add_login)
 manage.add_command(manage_commands.switch)
 manage.add_command(manage_commands.delete)
 manage.add_command(manage_commands.view)
+manage.add_command(manage_commands.set_policy)
 
 @cli.command(name="list")
 @click.option("--public/--private", default=False, help="List all public workflows or only user-created?")
-@click.option("--search", '-s', default=False, help="Filter workflows by a string.")
-def list_(public, search):
+@click.option("--search", '-s', default=False, help="Filter workflows by name, owner, tag or alias. Fields can be specified, e.g. 'name:rnaseq owner:bob'; close matches are also found.")
+@click.option("--refresh", is_flag=True, help="Fetch the list from the server, rather than showing the cached list.")
+@click.option("--no-cache", is_flag=True, help="Search on the server rather than in the local index; only matching workflows are downloaded.")
+@click.option("--offline", is_flag=True, envvar='GXWF_OFFLINE', help="Only show cached workflows, without contacting the server (also set by GXWF_OFFLINE=1).")
+def list_(public, search, refresh, no_cache, offline):
     """
     Obtain a list of workflows - either those created/imported by the user, or alternatively all publicly available on the server.
 
-    Results can also be filtered using --search.
+    Results can also be filtered using --search. Once fetched, the list is cached locally and shown straight away, being refreshed in the background when it is more than a minute old; use --refresh to wait for the latest list instead. If the server can't be reached, the cached list is shown.
     """
-    return list_commands.list_workflows(public, search)
+    return list_commands.list_workflows(public, search, refresh, no_cache, offline)
 
 
 @cli.group()
@@ -98,19 +114,24 @@ def invoke():
 
 invoke.add_command(invoke_commands.from_yaml)
 invoke.add_command(invoke_commands.from_params)
+invoke.add_command(invoke_commands.sweep)
+invoke.add_command(invoke_commands.auto)
 
 @cli.command()
-@click.option("--search", '-s', default=False, help="Filter workflows by a string.")
+@click.option("--search", '-s', default=False, help="Filter datasets by name, extension, tag or alias. Fields can be specified, e.g. 'name:reads ext:fastqsanger'; close matches are also found.")
 @click.option("--all", '-a', is_flag=True, help="Get all datasets - not only those in the GXWF history. Warning - may take a REALLY long time.")
-def datasets(search, all):
+@click.option("--refresh", is_flag=True, help="Fetch the list from the server, rather than showing the cached list.")
+@click.option("--no-cache", is_flag=True, help="Search on the server rather than in the local index; only matching datasets are downloaded. Also accepts state: and deleted: filters.")
+@click.option("--offline", is_flag=True, envvar='GXWF_OFFLINE', help="Only show cached datasets, without contacting the server (also set by GXWF_OFFLINE=1).")
+def datasets(search, all, refresh, no_cache, offline):
     """
     Get a list of datasets in the `GXWF datasets` history which is accessed by gxwf.
 
     To access all of a user's datasets, use the --all flag. Note this can take quite a long time to complete.
 
-    Results can also be filtered using --search.
+    Results can also be filtered using --search. Once fetched, the list is cached locally and shown straight away, being refreshed in the background when it is more than a minute old; use --refresh to wait for the latest list instead. If the server can't be reached, the cached list is shown.
     """
-    return dataset_commands.datasets(search, all)
+    return dataset_commands.datasets(search, all, refresh, no_cache, offline)
 
 
 @cli.command()
@@ -121,7 +142,7 @@ def upload(path, public, file_type=None):  # could also call it import
     """
     Upload a file or workflow to Galaxy.
 
-    Currently, gxwf attempts to upload any file with a .ga extension as a workflow, and all others as datasets.
+    Currently, gxwf attempts to upload any file with a .ga extension, or a Format 2 (.gxwf.yml) workflow, as a workflow, and all others as datasets.
     """
     return upload_commands.upload(path, public, file_type)
 
@@ -139,20 +160,48 @@ alias.add_command(alias_commands.list_)
 alias.add_command(alias_commands.delete)
 
 
+@cli.group()
+def collection():
+    """
+    Build dataset collections, so that a workflow can be invoked once over many datasets.
+    """
+    pass
 
-@cli.command()
-@click.option("--id", 'id_', default=False, help="Workflow ID invoked; if not specified, all invocations will be returned")
-def invocations(id_):
+collection.add_command(collection_commands.create)
+
+
+
+@cli.group(invoke_without_command=True)
+@click.option("--id", 'id_', default=False, autocompletion=completion._complete('workflow'), help="Workflow ID invoked; if not specified, all invocations will be returned")
+@click.pass_context
+def invocations(ctx, id_):
     """
     List workflow invocations. If --id is specified, limits list to a specific workflow; else, shows all invocations.
+
+    Use `gxwf invocations watch` for a compact, live view of many invocations, `gxwf invocations download` to fetch the outputs of an invocation, and `gxwf invocations export` to save the history of past invocations for analysis.
     """
-    return invocation_commands.invocations(id_)
+    if ctx.invoked_subcommand is None:
+        return invocation_commands.invocations(id_)
+
+invocations.add_command(invocation_commands.download_)
+invocations.add_command(invocation_commands.watch)
+invocations.add_command(invocation_commands.export_)
 
 
 @cli.command()
-@click.argument("workflow_id")  #, help="Workflow ID to edit")
+@click.argument("workflow_id", autocompletion=completion._complete('workflow'))  #, help="Workflow ID to edit")
 def edit(workflow_id):
     """
     Open a chosen workflow (from its ID or alias) with the Galaxy workflow editor interface, in the user's default web browser.
     """
     return edit_commands.edit(workflow_id)
+
+
+cli.add_command(convert_commands.convert)
+cli.add_command(sync_commands.sync)
+cli.add_command(download_commands.download_)
+cli.add_command(gc_commands.gc)
+cli.add_command(wait_commands.wait)
+cli.add_command(runs_commands.runs)
+cli.add_command(pipeline_commands.pipeline)
+cli.add_command(profile_commands.profile)
@@ -0,0 +1,102 @@
+"""
+Shell completion for workflow, dataset and invocation IDs and aliases.
+
+Candidates are served from a small index file in the gxwf cache directory, so completing never needs to parse the
+config file or contact the server. Each line of the index is ``kind<TAB>key[<TAB>id]``, where kind is a single
+letter (see KINDS), key is an ID or alias and the optional id is the ID an alias refers to. Lines are kept sorted,
+so all candidates for a prefix can be found with a binary search over the memory-mapped file.
+
+Nothing in this module may import bioblend or yaml.
+"""
+import mmap
+import os
+
+from gxwf import utils
+
+INDEX_PATH = os.path.join(utils.CACHE_DIR, 'completion')
+KINDS = {'alias': 'a', 'workflow': 'w', 'dataset': 'd', 'invocation': 'i', 'history': 'h'}
+MAX_CANDIDATES = 200  # no shell is going to display more than this usefully
+
+
+def _read_index(path=INDEX_PATH):
+    try:
+        with open(path) as f:
+            return set(f.read().splitlines())
+    except FileNotFoundError:
+        return set()
+
+
+def _write_index(lines, path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '{}.{}'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(''.join(line + '\n' for line in sorted(lines)))
+    os.replace(tmp, path)  # atomic, so a completing shell never sees a half-written index
+
+
+def _update_index(entries=(), aliases=None, path=INDEX_PATH):
+    """
+    Add IDs to the completion index and/or replace its aliases.
+
+    entries is an iterable of (kind, id) tuples, kind being a key of KINDS. If aliases (the alias: ID dict from the
+    config) is given, all existing aliases are replaced by it. Aliases are also indexed under the kind of the ID they
+    refer to, once that kind is known, so e.g. `gxwf edit` completes workflow aliases only.
+    """
+    lines = _read_index(path)
+    new_ids = {KINDS[kind] + '\t' + id_ for kind, id_ in entries if id_}
+    lines |= new_ids
+
+    if aliases is not None:
+        lines = {line for line in lines if line.count('\t') < 2}  # drop all alias lines
+        lines |= {'a\t{}\t{}'.format(alias, id_) for alias, id_ in aliases.items()}
+
+    kind_of = {line[2:]: line[0] for line in lines if line.count('\t') == 1}
+    for line in [line for line in lines if line[0] == 'a']:
+        _, alias, id_ = line.split('\t')
+        if id_ in kind_of:
+            lines.add('{}\t{}\t{}'.format(kind_of[id_], alias, id_))
+
+    _write_index(lines, path)
+
+
+def _lookup(kind, prefix, path=INDEX_PATH, limit=MAX_CANDIDATES):
+    """
+    Return (key, id) tuples for all keys of the given kind starting with prefix; id is None unless key is an alias.
+    """
+    key = '{}\t{}'.format(KINDS[kind], prefix).encode()
+    try:
+        with open(path, 'rb') as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):  # ValueError: the index is empty
+        return []
+
+    with m:
+        lo, hi = 0, len(m)
+        while lo < hi:  # find the first line >= key
+            mid = (lo + hi) // 2
+            start = m.rfind(b'\n', 0, mid) + 1
+            end = m.find(b'\n', start)
+            if m[start:end] < key:
+                lo = end + 1
+            else:
+                hi = start
+
+        candidates = []
+        while lo < len(m) and len(candidates) < limit:
+            end = m.find(b'\n', lo)
+            line = m[lo:end]
+            if not line.startswith(key):
+                break
+            fields = line.decode().split('\t')
+            candidates.append((fields[1], fields[2] if len(fields) > 2 else None))
+            lo = end + 1
+    return candidates
+
+
+def _complete(*kinds):
+    """
+    Create a click autocompletion callback offering IDs and aliases of the given kinds.
+    """
+    def complete(ctx, args, incomplete):
+        return [(key, id_) if id_ else key for kind in kinds for key, id_ in _lookup(kind, incomplete)]
+    return complete
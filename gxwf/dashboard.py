@@ -0,0 +1,325 @@
+"""
+A full-screen, live view of many invocations at once, one row each, for `gxwf invocations watch`.
+
+Each poll cycle makes one request listing the invocations (or one per invocation, if specific IDs are watched),
+plus one job summary request per invocation which hasn't finished yet, all sent concurrently; finished invocations
+are never polled again. Only the screen lines which changed since the last frame are redrawn, which keeps the
+output small enough to be usable over a slow SSH connection.
+
+Keys: q quits, s changes the sort order, r reverses it, f changes the filter, j/k (or space/b) scroll.
+"""
+import datetime
+import os
+import re
+import select
+import sys
+import time
+
+import click
+
+TERMINAL_INVOCATION_STATES = ('scheduled', 'cancelled', 'failed')
+ACTIVE_JOB_STATES = ('new', 'queued', 'running', 'waiting', 'upload', 'resubmitted')
+ERROR_JOB_STATES = ('error', 'failed', 'deleted', 'deleted_new')
+# columns of job counts: heading, states counted, colour
+COUNT_COLUMNS = (('ok', ('ok', 'skipped'), 'green'), ('run', ('running',), 'yellow'),
+                 ('queue', ('new', 'queued', 'waiting', 'upload', 'resubmitted'), 'cyan'),
+                 ('err', ERROR_JOB_STATES, 'red'), ('paused', ('paused',), 'magenta'))
+STATE_COLORS = {'new': 'cyan', 'ready': 'yellow', 'scheduled': 'green', 'cancelled': 'magenta', 'failed': 'red',
+                'running': 'yellow', 'error': 'red', 'ok': 'green', 'paused': 'magenta'}
+BAR_WIDTH = 20
+FILTERS = ('all', 'active', 'failed', 'done')
+SORTS = ('started', 'progress', 'state', 'elapsed', 'workflow')
+ANSI_CODE = re.compile(r'(\x1b\[[0-9;]*m)')
+
+
+def _parse_time(value):
+    try:
+        return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')  # Galaxy's times are UTC, without a zone
+    except (TypeError, ValueError):
+        return None
+
+
+def _truncate(line, width):
+    """
+    Cut a line to at most width characters, not counting colour codes, which are kept (and reset if the line is cut).
+    """
+    out, left = [], width
+    for n, part in enumerate(ANSI_CODE.split(line)):
+        if n % 2:  # a colour code
+            out.append(part)
+        elif len(part) > left:
+            return ''.join(out) + part[:left] + '\x1b[0m'
+        else:
+            out.append(part)
+            left -= len(part)
+    return ''.join(out)
+
+
+def _format_elapsed(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '{}h{:02d}m'.format(seconds // 3600, seconds % 3600 // 60)
+    return '{}m{:02d}s'.format(seconds // 60, seconds % 60)
+
+
+class Invocation(object):
+    """
+    What the dashboard knows about one invocation.
+    """
+    __slots__ = ('id', 'workflow_id', 'state', 'create_time', 'update_time', 'jobs')
+
+    def __init__(self, invocation):
+        self.id = invocation['id']
+        self.jobs = None  # job state -> count, once fetched
+        self.update(invocation)
+
+    def update(self, invocation):
+        self.workflow_id = invocation.get('workflow_id')
+        self.state = invocation.get('state')
+        self.create_time = _parse_time(invocation.get('create_time'))
+        self.update_time = _parse_time(invocation.get('update_time'))
+
+    def count(self, states):
+        return sum(self.jobs.get(state, 0) for state in states) if self.jobs else 0
+
+    @property
+    def progress(self):
+        total = sum(self.jobs.values()) if self.jobs else 0
+        return self.count(('ok', 'skipped')) / total if total else 0.0
+
+    @property
+    def failed(self):
+        return self.state in ('failed', 'cancelled') or bool(self.count(ERROR_JOB_STATES))
+
+    @property
+    def finished(self):
+        return self.state in TERMINAL_INVOCATION_STATES and self.jobs is not None and not self.count(ACTIVE_JOB_STATES)
+
+    @property
+    def elapsed(self):
+        if self.create_time is None:
+            return 0
+        end = self.update_time if self.finished and self.update_time else datetime.datetime.utcnow()
+        return max(0, (end - self.create_time).total_seconds())
+
+    @property
+    def display_state(self):
+        if self.state == 'scheduled' and not self.finished:
+            return 'running'
+        if self.state == 'scheduled' and self.failed:
+            return 'error'
+        return 'ok' if self.state == 'scheduled' else self.state or '?'
+
+
+class Dashboard(object):
+    """
+    Polls the invocations being watched and renders them as lines of text.
+    """
+
+    def __init__(self, gi, invocation_ids=None, workflow_id=None, limit=200, workers=8, workflow_names=None):
+        self.gi = gi
+        self.invocation_ids = invocation_ids
+        self.workflow_id = workflow_id
+        self.limit = limit
+        self.workers = workers
+        self.invocations = {}  # id -> Invocation, in the order first seen
+        self.workflow_names = dict(workflow_names or {})  # workflow (version) id -> name
+        self.sort, self.reverse, self.filter, self.offset = SORTS[0], False, FILTERS[0], 0
+        self.last_poll, self.errors, self.last_error = None, 0, None
+
+    def _fetch_summary(self, invocation):
+        invocation.jobs = self.gi.invocations.get_invocation_summary(invocation.id).get('states', {})
+
+    def _fetch_invocation(self, invocation_id):
+        invocation = self.gi.invocations.show_invocation(invocation_id)
+        self.invocations.setdefault(invocation_id, Invocation(invocation)).update(invocation)
+
+    def _fetch_workflow_name(self, workflow_id):
+        try:
+            workflow = self.gi.workflows._get(id=workflow_id, params={'instance': 'true'})  # invocations refer to versions, not stored workflows
+            self.workflow_names[workflow_id] = workflow.get('name', workflow_id)
+        except Exception:  # e.g. someone else's workflow; the ID will do
+            self.workflow_names[workflow_id] = workflow_id
+
+    def poll(self, pool):
+        """
+        Bring all unfinished invocations up to date, sending the requests of each stage of the cycle concurrently.
+        """
+        try:
+            if self.invocation_ids:
+                todo = [id_ for id_ in self.invocation_ids if id_ not in self.invocations or not self.invocations[id_].finished]
+                list(pool.map(self._fetch_invocation, todo))
+            else:
+                listing = self.gi.invocations.get_invocations(workflow_id=self.workflow_id, limit=self.limit)
+                for invocation in listing:
+                    self.invocations.setdefault(invocation['id'], Invocation(invocation)).update(invocation)
+            unfinished = [inv for inv in self.invocations.values() if not inv.finished]
+            unnamed = {inv.workflow_id for inv in self.invocations.values()} - set(self.workflow_names) - {None}
+            list(pool.map(self._fetch_summary, unfinished))
+            list(pool.map(self._fetch_workflow_name, unnamed))
+            self.last_poll, self.errors = time.time(), 0
+        except Exception as e:  # keep showing what we have; the request policy already retried
+            self.errors += 1
+            self.last_error = e
+
+    def rows(self):
+        rows = list(self.invocations.values())
+        if self.filter == 'active':
+            rows = [inv for inv in rows if not inv.finished]
+        elif self.filter == 'failed':
+            rows = [inv for inv in rows if inv.failed]
+        elif self.filter == 'done':
+            rows = [inv for inv in rows if inv.finished]
+        keys = {
+            'started': lambda inv: inv.create_time or datetime.datetime.min,
+            'progress': lambda inv: inv.progress,
+            'state': lambda inv: (inv.display_state, inv.progress),
+            'elapsed': lambda inv: inv.elapsed,
+            'workflow': lambda inv: self.workflow_names.get(inv.workflow_id, ''),
+        }
+        return sorted(rows, key=keys[self.sort], reverse=(self.sort in ('started', 'elapsed')) != self.reverse)
+
+    def render(self, width, height):
+        """
+        Return the lines of one frame, each at most width characters wide (not counting colour codes).
+        """
+        invocations = list(self.invocations.values())
+        totals = {heading: sum(inv.count(states) for inv in invocations) for heading, states, color in COUNT_COLUMNS}
+        finished = sum(inv.finished for inv in invocations)
+        status = 'updated {}'.format(time.strftime('%H:%M:%S', time.localtime(self.last_poll))) if self.last_poll else 'loading...'
+        if self.errors:
+            status = 'poll failed ({}x): {}'.format(self.errors, self.last_error)
+        title = '{} invocations, {} finished, {} failed  jobs: {}  {}'.format(
+            len(invocations), finished, sum(inv.failed for inv in invocations),
+            ' '.join('{} {}'.format(totals[heading], heading) for heading, states, color in COUNT_COLUMNS), status)
+        help_ = 'sort: {}{}  filter: {}  (q quit, s sort, r reverse, f filter, j/k scroll)'.format(self.sort, ' (reversed)' if self.reverse else '', self.filter)
+        lines = [click.style(title[:width], bold=True, fg='red' if self.errors else None), help_[:width]]  # cut to fit, so lines never wrap
+
+        name_width = max(10, width - (8 + 10 + BAR_WIDTH + 7 + 7 * len(COUNT_COLUMNS) + 9))
+        header = '{:<8}{:<{}}{:<10}{:<{}}{:>6}'.format('ID', 'Workflow', name_width, 'State', 'Progress', BAR_WIDTH + 1, '%')
+        header += ''.join('{:>7}'.format(heading) for heading, states, color in COUNT_COLUMNS) + '{:>9}'.format('Elapsed')
+        lines.append(click.style(header[:width], bold=True))
+
+        rows = self.rows()
+        space = max(1, height - len(lines) - 1)
+        self.offset = max(0, min(self.offset, len(rows) - space))
+        for inv in rows[self.offset:self.offset + space]:
+            name = self.workflow_names.get(inv.workflow_id, inv.workflow_id or '')
+            filled = int(round(inv.progress * BAR_WIDTH))
+            bar = click.style('█' * filled, fg='red' if inv.failed else 'green') + '·' * (BAR_WIDTH - filled)
+            state = inv.display_state
+            line = '{:<8}{:<{}}'.format(inv.id[-7:], name[:name_width - 1], name_width)
+            line += click.style('{:<10}'.format(state[:9]), fg=STATE_COLORS.get(state))
+            line += bar + ' {:>5.0f}%'.format(100 * inv.progress)
+            line += ''.join(click.style('{:>7}'.format(inv.count(states) or '.'), fg=color if inv.count(states) else None) for heading, states, color in COUNT_COLUMNS)
+            line += '{:>9}'.format(_format_elapsed(inv.elapsed))
+            lines.append(_truncate(line, width))  # the fixed columns alone are wider than a narrow terminal
+        if len(rows) > space:
+            lines.append('rows {}-{} of {}'.format(self.offset + 1, min(len(rows), self.offset + space), len(rows)))
+        return lines
+
+    def key(self, key):
+        """
+        Handle a key press; return False if the dashboard should quit.
+        """
+        if key == 'q':
+            return False
+        if key == 's':
+            self.sort = SORTS[(SORTS.index(self.sort) + 1) % len(SORTS)]
+        elif key == 'r':
+            self.reverse = not self.reverse
+        elif key == 'f':
+            self.filter = FILTERS[(FILTERS.index(self.filter) + 1) % len(FILTERS)]
+            self.offset = 0
+        elif key in ('j', ' '):
+            self.offset += 1 if key == 'j' else 20
+        elif key in ('k', 'b'):
+            self.offset = max(0, self.offset - (1 if key == 'k' else 20))
+        return True
+
+
+class Screen(object):
+    """
+    Draws frames on the terminal's alternate screen, rewriting only the lines which differ from the last frame.
+    """
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.previous = []
+
+    def __enter__(self):
+        self.out.write('\x1b[?1049h\x1b[?25l\x1b[2J')  # alternate screen, hide cursor, clear
+        self.out.flush()
+        return self
+
+    def __exit__(self, *exc):
+        self.out.write('\x1b[?25h\x1b[?1049l')
+        self.out.flush()
+
+    def draw(self, lines):
+        output = []
+        for n, line in enumerate(lines):
+            if n >= len(self.previous) or self.previous[n] != line:
+                output.append('\x1b[{};1H{}\x1b[K'.format(n + 1, line))  # move to the line, write it, clear the rest
+        if len(lines) < len(self.previous):
+            output.append('\x1b[{};1H\x1b[J'.format(len(lines) + 1))  # clear everything below
+        self.previous = lines
+        if output:
+            self.out.write(''.join(output))
+            self.out.flush()
+
+
+def _read_key(timeout):
+    """
+    Wait up to timeout seconds for a key press on stdin, returning it or None.
+    """
+    ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    return os.read(sys.stdin.fileno(), 1).decode(errors='ignore') if ready else None
+
+
+def _watch(dashboard, interval):
+    """
+    Run the dashboard until q is pressed, or until all invocations have finished if stdin isn't a terminal.
+    """
+    import termios
+    import tty
+    from concurrent.futures import ThreadPoolExecutor
+
+    interactive = sys.stdin.isatty()
+    settings = termios.tcgetattr(sys.stdin) if interactive else None
+    try:
+        if interactive:
+            tty.setcbreak(sys.stdin.fileno())  # keys are read as they are pressed, without echo
+        with ThreadPoolExecutor(dashboard.workers) as pool, Screen() as screen:
+            while True:
+                dashboard.poll(pool)
+                next_poll = time.monotonic() + interval
+                while time.monotonic() < next_poll:
+                    size = os.get_terminal_size(sys.stdout.fileno())
+                    screen.draw(dashboard.render(size.columns, size.lines))
+                    if not interactive:
+                        if dashboard.invocations and all(inv.finished for inv in dashboard.invocations.values()):
+                            return
+                        time.sleep(min(1, next_poll - time.monotonic()))
+                        continue
+                    key = _read_key(min(1, max(0, next_poll - time.monotonic())))  # redraw at least every second, for elapsed times
+                    if key and not dashboard.key(key):
+                        return
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if settings is not None:
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, settings)
+
+
+def _print_once(dashboard, width=None):
+    """
+    Print a single frame, without the full-screen machinery, e.g. when output is redirected to a file.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(dashboard.workers) as pool:
+        dashboard.poll(pool)
+    lines = dashboard.render(width or 160, 10 ** 9)
+    for line in lines[:1] + lines[2:]:  # no need for the key help
+        click.echo(line)
@@ -0,0 +1,210 @@
+"""
+Downloading datasets to disk: streamed, resumable and checked against the checksums Galaxy records. Large
+datasets can also be split into parts which are downloaded in parallel.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+PART_SIZE = 16 * 1024 * 1024  # size of each range request when downloading in parallel
+RANGED_MIN_SIZE = 4 * PART_SIZE  # below this, a single stream is as fast
+DEFAULT_CONNECTIONS = 4
+HASH_FUNCTIONS = {'MD5': 'md5', 'SHA-1': 'sha1', 'SHA-256': 'sha256', 'SHA-512': 'sha512'}  # Galaxy's names -> hashlib's
+FAILED_STATES = ('error', 'deleted', 'discarded', 'failed_metadata', 'paused')
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _safe_name(name):
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'unnamed'
+
+
+def _extension(dataset):
+    ext = dataset.get('file_ext') or dataset.get('extension')
+    return 'data' if ext in (None, '', 'auto', '_sniff_') else ext  # as bioblend does for temporary extensions
+
+
+def _filename(name, dataset):
+    return '{}.{}'.format(_safe_name(name), _extension(dataset))
+
+
+def _url(gi, dataset):
+    return '{}/datasets/{}/display'.format(gi.url, dataset['id'])  # gi.url already has any path prefix of the server
+
+
+def _get_dataset(gi, dataset, headers=None):
+    return _get(gi, _url(gi, dataset), headers, params={'to_ext': _extension(dataset)}, stream=True)
+
+
+def _get(gi, url, headers=None, **kwargs):
+    import requests  # imported here so shell completion doesn't pay for it
+
+    kwargs = dict(kwargs, headers=dict(gi.json_headers, **(headers or {})), verify=gi.verify, timeout=gi.timeout)
+    policy = getattr(gi, 'policy', None)  # the login's retry policy applies to downloads too
+    return policy.call('GET', requests.get, url, **kwargs) if policy else requests.get(url, **kwargs)
+
+
+def _hasher(dataset):
+    """
+    Return a hash object and the expected digest for the strongest checksum Galaxy has for the dataset, or (None, None).
+    """
+    hashes = {h.get('hash_function'): h.get('hash_value') for h in dataset.get('hashes') or []}
+    for function in ('SHA-512', 'SHA-256', 'SHA-1', 'MD5'):
+        if hashes.get(function):
+            return hashlib.new(HASH_FUNCTIONS[function]), hashes[function]
+    return None, None
+
+
+def _verify(path, dataset, hasher, expected):
+    if hasher is not None and hasher.hexdigest() != expected.lower():
+        raise DownloadError('checksum mismatch for {}'.format(path))
+    size = dataset.get('file_size')
+    if size is not None and os.path.getsize(path) != size:
+        raise DownloadError('expected {} bytes for {}, got {}'.format(size, path, os.path.getsize(path)))
+
+
+def _download_dataset(gi, dataset, dest):
+    """
+    Stream a dataset (a dict from show_dataset) to dest.
+
+    Data is written to dest + '.part' first; if that already exists, the download resumes from where it stopped,
+    using an HTTP range request. The file is only moved to dest once it has been verified.
+    """
+    part, state_path = dest + '.part', dest + '.part.json'
+    if os.path.exists(state_path):  # left by a ranged download: preallocated, with holes, so not a prefix to resume from
+        for path in (part, state_path):
+            if os.path.exists(path):
+                os.remove(path)
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    hasher, expected = _hasher(dataset)
+
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+    with _get_dataset(gi, dataset, headers) as r:
+        if r.status_code == 416:  # range not satisfiable: the part file is complete, or isn't what we're downloading
+            if offset != dataset.get('file_size'):
+                os.remove(part)
+                return _download_dataset(gi, dataset, dest)  # start again, without a range
+            r = None
+        else:
+            r.raise_for_status()
+            if offset and r.status_code != 206:  # the server ignored the range, start again
+                offset = 0
+
+        if hasher is not None and offset:
+            with open(part, 'rb') as f:  # the checksum covers the whole file, including what we already have
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+        if r is not None:
+            with open(part, 'ab' if offset else 'wb') as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+
+    try:
+        _verify(part, dataset, hasher, expected)
+    except DownloadError:
+        os.remove(part)  # don't resume from corrupt data next time
+        raise
+    os.replace(part, dest)
+    return dest
+
+
+def _probe_ranges(gi, dataset):
+    """
+    Check whether the server honours range requests for a dataset, returning its size in bytes if so, else None.
+    """
+    with _get_dataset(gi, dataset, {'Range': 'bytes=0-0'}) as r:
+        content_range = r.headers.get('Content-Range', '')
+        if r.status_code != 206 or '/' not in content_range:
+            return None
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+
+
+def _read_state(state_path, size, part):
+    """
+    Return the set of parts already downloaded by an earlier, interrupted ranged download.
+    """
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        if state['size'] == size and state['part_size'] == PART_SIZE:
+            return set(state['done'])
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    if os.path.exists(part) and not os.path.exists(state_path):  # left by a streamed download: a complete prefix
+        return set(range(os.path.getsize(part) // PART_SIZE))
+    return set()
+
+
+def _download_ranged(gi, dataset, dest, connections):
+    """
+    Download a dataset using several range requests at once, each writing its part directly into a preallocated,
+    memory-mapped file. Which parts are complete is recorded next to the file, so an interrupted download resumes
+    where it stopped.
+
+    Falls back to _download_dataset if the dataset is small or the server doesn't support range requests.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    size = dataset.get('file_size')
+    if connections < 2 or not size or size < RANGED_MIN_SIZE or _probe_ranges(gi, dataset) != size:
+        return _download_dataset(gi, dataset, dest)
+
+    part, state_path = dest + '.part', dest + '.part.json'
+    done = _read_state(state_path, size, part)
+    with open(part, 'ab') as f:
+        f.truncate(size)  # preallocate, keeping anything already downloaded
+    lock = threading.Lock()
+
+    def save_state():
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump({'size': size, 'part_size': PART_SIZE, 'done': sorted(done)}, f)
+        os.replace(state_path + '.tmp', state_path)
+
+    with open(part, 'r+b') as f, mmap.mmap(f.fileno(), size) as m:
+        save_state()
+
+        def fetch(n):
+            start, end = n * PART_SIZE, min((n + 1) * PART_SIZE, size) - 1
+            with _get_dataset(gi, dataset, {'Range': 'bytes={}-{}'.format(start, end)}) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise DownloadError('server ignored range request for {}'.format(dest))
+                pos = start
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    m[pos:pos + len(chunk)] = chunk
+                    pos += len(chunk)
+            if pos != end + 1:
+                raise DownloadError('incomplete part {} of {}'.format(n, dest))
+            with lock:
+                done.add(n)
+                save_state()
+
+        todo = [n for n in range((size + PART_SIZE - 1) // PART_SIZE) if n not in done]
+        with ThreadPoolExecutor(connections) as pool:
+            for result in pool.map(fetch, todo):  # re-raises the first error, if any
+                pass
+        m.flush()
+
+        hasher, expected = _hasher(dataset)
+        if hasher is not None:
+            for pos in range(0, size, CHUNK_SIZE):
+                hasher.update(m[pos:pos + CHUNK_SIZE])
+
+    try:
+        _verify(part, dataset, hasher, expected)
+    except DownloadError:
+        os.remove(part)
+        os.remove(state_path)
+        raise
+    os.remove(state_path)
+    os.replace(part, dest)
+    return dest
@@ -0,0 +1,201 @@
+"""
+Export of finished invocations and their jobs as tables, for analysing run history without querying Galaxy again.
+
+Two tables are written to the destination directory: invocations (one row each) and jobs (one row per job, with
+the step it ran for and its timings). Only invocations which have finished are exported, as their rows won't
+change any more; each export appends the invocations not exported before, so it can simply be run again later.
+
+With pyarrow installed, tables are written as Parquet: each export adds a file to invocations/ and jobs/, which
+read as one table, e.g. with pandas.read_parquet('dest/jobs'). Otherwise, or with format 'csv', rows are appended
+to invocations.csv and jobs.csv.
+"""
+import csv
+import os
+import time
+import uuid
+
+from gxwf import dashboard
+
+INVOCATION_COLUMNS = (('invocation_id', 'str'), ('workflow_id', 'str'), ('history_id', 'str'), ('state', 'str'),
+                      ('create_time', 'str'), ('update_time', 'str'), ('seconds', 'float'), ('steps', 'int'),
+                      ('jobs', 'int'), ('failed_jobs', 'int'))
+JOB_COLUMNS = (('invocation_id', 'str'), ('workflow_id', 'str'), ('step_index', 'int'), ('step_label', 'str'),
+               ('step_state', 'str'), ('job_id', 'str'), ('tool_id', 'str'), ('state', 'str'), ('create_time', 'str'),
+               ('update_time', 'str'), ('seconds', 'float'), ('runtime_seconds', 'float'), ('galaxy_slots', 'int'),
+               ('memory_mb', 'float'))
+JOBS_PAGE = 500  # jobs listed per request
+METRICS = {'runtime_seconds': ('runtime_seconds', 1), 'galaxy_slots': ('galaxy_slots', 1), 'galaxy_memory_mb': ('memory_mb', 1),
+           'memory.peak': ('memory_mb', 1 / 2 ** 20), 'memory.max_usage_in_bytes': ('memory_mb', 1 / 2 ** 20)}  # job metric -> (column, scale)
+
+
+def _have_pyarrow():
+    try:
+        import pyarrow  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+def _seconds(start, end):
+    start, end = dashboard._parse_time(start), dashboard._parse_time(end)
+    return (end - start).total_seconds() if start and end else None
+
+
+def _number(value, kind):
+    try:
+        return None if value is None else int(float(value)) if kind == 'int' else float(value)
+    except ValueError:
+        return None
+
+
+def _metrics(gi, job_id):
+    """
+    The job metrics which have a column, e.g. {'runtime_seconds': 12.0}.
+    """
+    metrics = {}
+    for metric in gi.jobs.get_metrics(job_id):
+        if metric.get('name') in METRICS:
+            column, scale = METRICS[metric['name']]
+            value = _number(metric.get('raw_value'), 'float')
+            if value is not None:
+                metrics[column] = value * scale
+    return metrics
+
+
+def _jobs(gi, invocation_id):
+    jobs, offset = [], 0
+    while True:
+        # by create_time, which doesn't change, so no job moves between pages while we page through them
+        page = gi.jobs.get_jobs(invocation_id=invocation_id, limit=JOBS_PAGE, offset=offset, order_by='create_time')
+        jobs += page
+        if len(page) < JOBS_PAGE:
+            return jobs
+        offset += JOBS_PAGE
+
+
+def _fetch(gi, invocation_id, metrics=False, partial=False):
+    """
+    Fetch an invocation's steps and jobs, returning (invocation row, job rows), or None if it hasn't finished yet,
+    unless partial is set.
+
+    Jobs are listed with one request; only steps which don't name their job (e.g. those mapped over a collection,
+    and inputs) need a request of their own to tell which jobs they ran.
+    """
+    invocation = gi.invocations.show_invocation(invocation_id)
+    if invocation['state'] not in dashboard.TERMINAL_INVOCATION_STATES and not partial:
+        return None
+    jobs = {job['id']: job for job in _jobs(gi, invocation_id)}
+    if not partial and any(job.get('state') in dashboard.ACTIVE_JOB_STATES for job in jobs.values()):
+        return None
+
+    step_of = {}  # job id -> step
+    for step in invocation.get('steps', []):
+        if step.get('job_id'):
+            step_of[step['job_id']] = step
+        else:
+            for job in gi.invocations.show_invocation_step(invocation_id, step['id']).get('jobs') or []:
+                step_of[job['id']] = step
+                jobs.setdefault(job['id'], job)
+
+    job_rows = []
+    for job_id, job in sorted(jobs.items(), key=lambda item: (item[1].get('create_time') or '', item[0])):
+        step = step_of.get(job_id, {})
+        row = {'invocation_id': invocation_id, 'workflow_id': invocation.get('workflow_id'), 'step_index': step.get('order_index'),
+               'step_label': step.get('workflow_step_label'), 'step_state': step.get('state'), 'job_id': job_id,
+               'tool_id': job.get('tool_id'), 'state': job.get('state'), 'create_time': job.get('create_time'),
+               'update_time': job.get('update_time'), 'seconds': _seconds(job.get('create_time'), job.get('update_time'))}
+        if metrics:
+            row.update(_metrics(gi, job_id))
+        job_rows.append(row)
+
+    # a scheduled invocation is last updated when it has been scheduled, not when its jobs finish, so it ends with its last job
+    end = max([time for time in [invocation.get('update_time')] + [row['update_time'] for row in job_rows] if time], default=None)
+    invocation_row = {'invocation_id': invocation_id, 'workflow_id': invocation.get('workflow_id'), 'history_id': invocation.get('history_id'),
+                      'state': invocation['state'], 'create_time': invocation.get('create_time'), 'update_time': invocation.get('update_time'),
+                      'seconds': _seconds(invocation.get('create_time'), end), 'steps': len(invocation.get('steps', [])),
+                      'jobs': len(job_rows), 'failed_jobs': sum(1 for row in job_rows if row['state'] in dashboard.ERROR_JOB_STATES)}
+    return invocation_row, job_rows
+
+
+class CsvTable(object):
+    def __init__(self, dest, name, columns):
+        self.path = os.path.join(dest, name + '.csv')
+        self.columns = columns
+
+    def ids(self, column):
+        try:
+            with open(self.path, newline='') as f:
+                return {row[column] for row in csv.DictReader(f)}
+        except FileNotFoundError:
+            return set()
+
+    def append(self, rows):
+        new = not os.path.exists(self.path)
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, [name for name, kind in self.columns], extrasaction='ignore')
+            if new:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+class ParquetTable(object):
+    """
+    A table kept as a directory of Parquet files, one added by each export.
+    """
+    TYPES = {'str': 'string', 'int': 'int64', 'float': 'float64'}
+
+    def __init__(self, dest, name, columns):
+        import pyarrow
+
+        self.path = os.path.join(dest, name)
+        self.columns = columns
+        self.schema = pyarrow.schema([(name, getattr(pyarrow, self.TYPES[kind])()) for name, kind in columns])
+
+    def ids(self, column):
+        import pyarrow.parquet
+
+        if not os.path.isdir(self.path) or not any(name.endswith('.parquet') for name in os.listdir(self.path)):
+            return set()
+        return set(pyarrow.parquet.read_table(self.path, columns=[column]).column(column).to_pylist())
+
+    def append(self, rows):
+        import pyarrow
+        import pyarrow.parquet
+
+        if not rows:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        table = pyarrow.table({name: [row.get(name) if kind == 'str' else _number(row.get(name), kind) for row in rows]
+                               for name, kind in self.columns}, schema=self.schema)
+        name = 'part-{}-{}.parquet'.format(time.strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8])
+        tmp = os.path.join(self.path, '.' + name)  # hidden, so readers never see a partly written file
+        pyarrow.parquet.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, os.path.join(self.path, name))
+
+
+def _tables(dest, format):
+    table = ParquetTable if format == 'parquet' else CsvTable
+    return table(dest, 'invocations', INVOCATION_COLUMNS), table(dest, 'jobs', JOB_COLUMNS)
+
+
+def _export(gi, invocation_ids, dest, format, pool, metrics=False, batch=200):
+    """
+    Fetch and append the given invocations (those not exported yet), in batches so that an interrupted export
+    keeps what it had fetched. Returns (invocations exported, jobs exported, invocations not finished yet).
+    """
+    os.makedirs(dest, exist_ok=True)
+    invocations_table, jobs_table = _tables(dest, format)
+    done = invocations_table.ids('invocation_id')
+    jobs_done = jobs_table.ids('invocation_id')  # e.g. by an export interrupted before it marked them as exported
+    todo = [id_ for id_ in invocation_ids if id_ not in done]
+    exported, exported_jobs, unfinished = 0, 0, 0
+    for start in range(0, len(todo), batch):
+        results = list(pool.map(lambda id_: _fetch(gi, id_, metrics), todo[start:start + batch]))
+        finished = [result for result in results if result is not None]
+        unfinished += len(results) - len(finished)
+        job_rows = [row for invocation_row, rows in finished for row in rows if invocation_row['invocation_id'] not in jobs_done]
+        jobs_table.append(job_rows)  # jobs first, so an invocation is only marked as exported once its jobs are
+        invocations_table.append([invocation_row for invocation_row, rows in finished])
+        exported += len(finished)
+        exported_jobs += len(job_rows)
+    return exported, exported_jobs, unfinished
@@ -0,0 +1,149 @@
+"""
+An append-only local ledger of the runs gxwf has submitted, for provenance and for call-caching.
+
+Each line of <cache dir>/ledger.jsonl is a JSON record, either of a run (type 'run': the workflow and its version,
+the inputs with the checksums Galaxy has for them, the parameters and the resulting invocation) or of an outcome
+learned later (type 'outcome': an invocation's final state). Records are never changed once written.
+
+Runs are identified by a key hashed from everything which determines their results, so an identical run can be
+found and its earlier invocation reused instead of being submitted again. To keep lookups quick as the ledger
+grows, a small index of the byte offset of each record, by run key, invocation, workflow and input dataset, is
+kept next to it and brought up to date by reading only the lines appended since.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+from gxwf import utils
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _ledger_path(cnfg):
+    return os.path.join(utils._cache_dir(cnfg), 'ledger.jsonl')
+
+
+def _run_key(workflow_id, version, inputs, input_hashes, params):
+    """
+    Hash everything which determines the results of a run. Inputs are identified by their checksums where Galaxy
+    has them, so e.g. the same data uploaded twice is still recognised as the same input.
+    """
+    resolved = {name: input_hashes.get(name) or value for name, value in (inputs or {}).items()}
+    run = {'workflow_id': workflow_id, 'version': version, 'inputs': resolved, 'params': params or {}}
+    return hashlib.sha1(json.dumps(run, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Ledger(object):
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.size = 0  # bytes of the ledger covered by the index
+        self.offsets = {}  # ('key', run key) / ('invocation', id) / ('workflow', id) / ('dataset', id) -> [record offsets]
+        self.lock = threading.Lock()  # one Ledger is shared by the threads submitting a batch of runs
+        self.versions = {}  # workflow versions and dataset hashes looked up for its runs; a Ledger is loaded per command,
+        self.hashes = {}  # so a workflow edited since the last command is looked up again
+
+    def _index_record(self, record, offset):
+        keys = [('invocation', record.get('invocation_id'))]
+        if record.get('type') == 'run':
+            keys += [('key', record.get('key')), ('workflow', record.get('workflow_id'))]
+            keys += [('dataset', value.get('id')) for value in (record.get('inputs') or {}).values() if isinstance(value, dict)]
+        for key in keys:
+            if key[1]:
+                self.offsets.setdefault(key, []).append(offset)
+
+    def _refresh(self):
+        """
+        Bring the index up to date with the ledger, reading only what was appended since it was last saved.
+        """
+        if not self.size:
+            try:
+                with open(self.index_path, 'rb') as f:
+                    self.size, self.offsets = pickle.load(f)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+                self.size, self.offsets = 0, {}
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size < self.size:  # the ledger was replaced, start again
+            self.size, self.offsets = 0, {}
+        if size == self.size:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.size)
+            offset = self.size
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # still being written
+                try:
+                    self._index_record(json.loads(line), offset)
+                except ValueError:
+                    pass  # a corrupt line shouldn't make the rest of the ledger unreadable
+                offset += len(line)
+        self.size = offset
+        tmp = '{}.{}'.format(self.index_path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump((self.size, self.offsets), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.index_path)
+
+    def append(self, record):
+        """
+        Append a record, stamped with the current time; safe to call from several threads and processes at once.
+        """
+        record = dict(record, time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        line = (json.dumps(record, sort_keys=True, default=str) + '\n').encode()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)  # O_APPEND alone doesn't promise a large line won't interleave with another
+            os.write(fd, line)
+        finally:
+            os.close(fd)  # also releases the lock
+        return record
+
+    def _read(self, offsets):
+        if not offsets:
+            return []
+        records = []
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+    def find(self, kind, value):
+        """
+        All records (oldest first) with the given run key, invocation, workflow or input dataset.
+        """
+        with self.lock:
+            self._refresh()
+            offsets = list(self.offsets.get((kind, value), []))
+        return self._read(offsets)
+
+    def outcome(self, invocation_id):
+        """
+        The last recorded final state of an invocation, or None.
+        """
+        outcomes = [r for r in self.find('invocation', invocation_id) if r.get('type') == 'outcome']
+        return outcomes[-1]['state'] if outcomes else None
+
+    def runs(self, limit=None):
+        """
+        The most recent runs, newest first.
+        """
+        with self.lock:
+            self._refresh()
+            offsets = sorted({offset for (kind, value), found in self.offsets.items() if kind == 'key' for offset in found}, reverse=True)
+        return self._read(offsets[:limit])
+
+
+def _load_ledger(cnfg):
+    return Ledger(_ledger_path(cnfg))
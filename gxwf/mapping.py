@@ -0,0 +1,292 @@
+"""
+Automatic mapping of datasets to workflow inputs, for invoking a workflow once per sample without any prompting.
+
+Candidates (datasets and collections in a history, or files in a local directory) are indexed once, by kind and
+extension. Each input of the workflow is then matched against the candidates it could take: of the right kind
+(dataset or collection, and collection type), with an extension the input accepts, and named like the input,
+either by a pattern given for it (e.g. 'forward=*_R1.fastq.gz') or by the words of its label and their usual
+synonyms (e.g. forward: R1, fwd). What is left of a matching name once the matched part and the extension are
+removed is the sample it belongs to. Inputs with a single candidate (e.g. a reference genome) are shared by all
+samples; each sample which has exactly one candidate for every other input becomes one invocation.
+
+All of this is done locally, with one request for the workflow and one for the history's contents, however many
+inputs and samples there are.
+"""
+import os
+import re
+
+from typing import NamedTuple
+
+from gxwf import stream
+
+SYNONYMS = {  # not bare 1/2 or f/r, which number samples and replicates just as often (see STRICT_READ_MARKER)
+    'forward': ('r1', 'fwd'), 'reverse': ('r2', 'rev'),
+    'r1': ('forward', 'fwd'), 'r2': ('reverse', 'rev'),
+    'reference': ('ref', 'genome'), 'genome': ('ref', 'reference'), 'annotation': ('gtf', 'gff', 'gff3'),
+}
+SUFFIXES = {  # Galaxy datatypes of local files, by suffix
+    'fastq': 'fastqsanger', 'fq': 'fastqsanger', 'fastq.gz': 'fastqsanger.gz', 'fq.gz': 'fastqsanger.gz',
+    'fasta': 'fasta', 'fa': 'fasta', 'fna': 'fasta', 'fasta.gz': 'fasta.gz', 'fa.gz': 'fasta.gz',
+    'gff': 'gff3', 'gff3': 'gff3', 'gtf': 'gtf', 'sam': 'sam', 'bam': 'bam', 'vcf': 'vcf', 'vcf.gz': 'vcf_bgzip',
+    'bed': 'bed', 'tsv': 'tabular', 'txt': 'txt', 'csv': 'csv',
+}
+WORD = re.compile(r'[A-Za-z0-9]+')
+CONTENT_KEYS = ('id', 'name', 'extension', 'history_content_type', 'collection_type', 'state', 'deleted', 'visible')
+
+
+class Input(NamedTuple):
+    index: str
+    label: str
+    kind: str  # 'dataset', 'collection' or 'parameter'
+    formats: tuple
+    collection_type: str
+    optional: bool
+
+
+class Candidate(NamedTuple):
+    id: str  # for a local file, its path
+    name: str
+    extension: str
+    src: str  # 'hda', 'hdca' or 'file'
+    collection_type: str
+
+
+def _workflow_inputs(workflow):
+    """
+    The inputs of a workflow, from the workflow as shown by the API.
+    """
+    kinds = {'data_input': 'dataset', 'data_collection_input': 'collection', 'parameter_input': 'parameter'}
+    inputs = []
+    for index, step in sorted(workflow.get('steps', {}).items(), key=lambda item: int(item[0])):
+        if step.get('type') not in kinds:
+            continue
+        tool_inputs = step.get('tool_inputs') or {}
+        formats = tool_inputs.get('format') or ()
+        label = (workflow.get('inputs', {}).get(str(index)) or {}).get('label') or step.get('label') or str(index)
+        optional = bool(tool_inputs.get('optional')) or 'default' in tool_inputs
+        inputs.append(Input(str(index), label, kinds[step['type']], (formats,) if isinstance(formats, str) else tuple(formats),
+                            tool_inputs.get('collection_type') or '', optional))
+    return inputs
+
+
+def _split_name(name):
+    """
+    Split a name into its stem and extension, taking .gz and the like with the extension, e.g. ('s1_R1', 'fastq.gz').
+    """
+    parts = name.split('.')
+    n = 2 if len(parts) > 2 and parts[-1] in ('gz', 'bz2', 'zip') else 1
+    return ('.'.join(parts[:-n]), '.'.join(parts[-n:])) if len(parts) > 1 else (name, '')
+
+
+def _history_candidates(gi, history_id):
+    params = {'v': 'dev', 'keys': ','.join(CONTENT_KEYS), 'q': ['deleted', 'visible'], 'qv': ['false', 'true']}
+    for item in stream._get_list(gi, '/histories/{}/contents'.format(history_id), params, CONTENT_KEYS):
+        if item['history_content_type'] == 'dataset_collection':
+            yield Candidate(item['id'], item['name'] or '', '', 'hdca', item.get('collection_type') or '')
+        elif item.get('state') == 'ok':
+            yield Candidate(item['id'], item['name'] or '', item.get('extension') or '', 'hda', '')
+
+
+def _directory_candidates(directory):
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and not name.startswith('.'):
+            suffix = _split_name(name)[1].lower()
+            yield Candidate(path, name, SUFFIXES.get(suffix, suffix), 'file', '')
+
+
+class CandidateIndex(object):
+    """
+    Candidates grouped by kind and extension, so each input only looks at those it could take.
+    """
+
+    def __init__(self, candidates):
+        self.by_kind = {}
+        for candidate in candidates:
+            key = ('collection', candidate.collection_type) if candidate.src == 'hdca' else ('dataset', candidate.extension)
+            self.by_kind.setdefault(key, []).append(candidate)
+
+    def compatible(self, inp):
+        for (kind, subtype), candidates in self.by_kind.items():
+            if kind != inp.kind:
+                continue
+            if kind == 'collection' and inp.collection_type and subtype != inp.collection_type:
+                continue
+            if kind == 'dataset' and inp.formats and 'data' not in inp.formats and not _accepts(inp.formats, subtype):
+                continue
+            for candidate in candidates:
+                yield candidate
+
+
+def _accepts(formats, extension):
+    # subtypes are accepted by prefix (e.g. fastqsanger for fastq), but compressed types only by name
+    return extension in formats or ('.' not in extension and any(extension.startswith(f) for f in formats))
+
+
+def _pattern(glob):
+    """
+    A regular expression for a glob, with the part matched by its first * as the sample.
+    """
+    parts = glob.split('*')
+    if len(parts) == 1:
+        return re.compile(re.escape(glob) + '$')
+    return re.compile(re.escape(parts[0]) + '(.*)' + re.escape(parts[1]) + ''.join('.*' + re.escape(part) for part in parts[2:]) + '$')
+
+
+def _matches(inp, candidates, pattern=None, common=frozenset()):
+    """
+    Group the candidates named like an input by sample: {sample: [candidates]}, and whether they were only guessed.
+    Only the last word of a name matching the input is left out of its sample, as in _read_direction. Words in common, i.e. shared with other inputs' labels (e.g. 'reads' of 'Forward reads' and 'Reverse reads'),
+    don't tell inputs apart, so are ignored. If no candidates are named like the input, all of them match, each its
+    own sample, which is a guess.
+    """
+    samples = {}
+    if pattern is not None:
+        regex = _pattern(pattern)
+        for candidate in candidates:
+            match = regex.match(candidate.name)
+            if match:
+                samples.setdefault(match.group(1) if regex.groups else '', []).append(candidate)
+        return samples, False
+
+    words = {word.lower() for word in WORD.findall(inp.label)} - common
+    words |= {synonym for word in words for synonym in SYNONYMS.get(word, ())}
+    for candidate in candidates:
+        stem = _split_name(candidate.name)[0] if candidate.src != 'hdca' else candidate.name
+        tokens = WORD.findall(stem)
+        matched = [n for n, token in enumerate(tokens) if token.lower() in words]
+        if matched:
+            samples.setdefault('_'.join(tokens[:matched[-1]] + tokens[matched[-1] + 1:]), []).append(candidate)
+    if samples:
+        return samples, False
+    for candidate in candidates:
+        stem = _split_name(candidate.name)[0] if candidate.src != 'hdca' else candidate.name
+        samples.setdefault('_'.join(WORD.findall(stem)), []).append(candidate)
+    return samples, True
+
+
+def _common_words(inputs):
+    """
+    The words found in the labels of more than one input.
+    """
+    seen, common = set(), set()
+    for inp in inputs:
+        words = {word.lower() for word in WORD.findall(inp.label)}
+        common |= seen & words
+        seen |= words
+    return common
+
+
+class Mapping(NamedTuple):
+    runs: dict  # sample -> {input index: candidate or parameter value}
+    skipped: dict  # sample -> why it has no run
+    missing: list  # labels of required inputs nothing matched
+    ambiguous: list = ()  # labels of inputs which could only be guessed, and need a --map pattern
+
+
+def _map_inputs(inputs, index, patterns=None, params=None):
+    """
+    Map candidates to the inputs of a workflow, one run per sample. patterns and params map input labels (or
+    indexes) to name patterns and to parameter values respectively.
+    """
+    patterns, params = patterns or {}, params or {}
+    shared, per_sample, missing, guessed = {}, {}, [], []
+    common = _common_words([inp for inp in inputs if inp.kind != 'parameter'])
+    for inp in inputs:
+        given = next((params[key] for key in (inp.label, inp.index) if key in params), None)
+        if inp.kind == 'parameter':
+            if given is not None:
+                shared[inp.index] = given
+            elif not inp.optional:
+                missing.append(inp.label)
+            continue
+        pattern = next((patterns[key] for key in (inp.label, inp.index) if key in patterns), None)
+        samples, guess = _matches(inp, list(index.compatible(inp)), pattern, common)
+        found = [candidate for candidates in samples.values() for candidate in candidates]
+        if len(found) == 1:
+            shared[inp.index] = found[0]
+        elif found:
+            per_sample[inp.index] = samples
+            if guess:
+                guessed.append(inp.label)
+        elif not inp.optional:
+            missing.append(inp.label)
+
+    runs, skipped = {}, {}
+    if missing or len(guessed) > 1:  # several inputs could each take any of the same candidates: don't guess which
+        return Mapping(runs, skipped, missing, guessed if len(guessed) > 1 else [])
+    if not per_sample:
+        return Mapping({'': dict(shared)}, skipped, missing)
+    labels = {inp.index: inp.label for inp in inputs}
+    for sample in sorted({sample for samples in per_sample.values() for sample in samples}):
+        run, problems = dict(shared), []
+        for inp_index, samples in per_sample.items():
+            candidates = samples.get(sample, [])
+            if len(candidates) == 1:
+                run[inp_index] = candidates[0]
+            else:
+                problems.append('{} for {}'.format('no match' if not candidates else '{} matches'.format(len(candidates)), labels[inp_index]))
+        taken = {}
+        for inp_index, value in run.items():
+            if isinstance(value, Candidate):
+                taken.setdefault(value, []).append(labels.get(inp_index, inp_index))
+        problems += ['{} for each of {}'.format(candidate.name, ', '.join(names)) for candidate, names in taken.items() if len(names) > 1]
+        if problems:
+            skipped[sample] = ', '.join(problems)
+        else:
+            runs[sample] = run
+    return Mapping(runs, skipped, missing)
+
+
+def _inputs_dict(workflow_id, run, uploaded=None):
+    """
+    The inputs dict (as used by `gxwf invoke from-yaml`) for a run, with local files replaced by their uploads.
+    """
+    inputs = {}
+    for index, value in run.items():
+        if isinstance(value, Candidate):
+            value = {'src': 'hda', 'id': uploaded[value.id]} if value.src == 'file' else {'src': value.src, 'id': value.id}
+        inputs[index] = value
+    return {'wf_id': workflow_id, 'inputs': inputs, 'params': {}}
+
+
+READ_MARKER = re.compile(r'(?<![A-Za-z0-9])(r?[12]|fwd|rev|forward|reverse|f|r)(?![A-Za-z0-9])', re.IGNORECASE)
+# bare 1/2 and f/r are just as likely to number replicates, e.g. rep_1.fastq, so only these are certain to mark reads
+STRICT_READ_MARKER = re.compile(r'(?<![A-Za-z0-9])(r[12]|fwd|rev|forward|reverse)(?![A-Za-z0-9])', re.IGNORECASE)
+
+
+def _read_direction(name, strict=False):
+    """
+    Whether a read file is forward or reverse, from the last marker in its name, and its sample: the name without
+    the marker and extension, e.g. ('forward', 'sampleA_001') for sampleA_R1_001.fastq.gz. None if it has no marker,
+    or, if strict, none of the unambiguous ones (R1/R2, fwd/rev, forward/reverse).
+    """
+    stem = _split_name(name)[0]
+    markers = list((STRICT_READ_MARKER if strict else READ_MARKER).finditer(stem))
+    if not markers:
+        return None
+    marker = markers[-1]
+    direction = 'forward' if marker.group(1).lower() in ('r1', '1', 'fwd', 'forward', 'f') else 'reverse'
+    return direction, stem[:marker.start()].rstrip('._- ') + stem[marker.end():]
+
+
+def _pair_reads(candidates, strict=False):
+    """
+    Pair forward and reverse reads by sample, only by unambiguous markers if strict. Returns ({sample: (forward,
+    reverse)}, [candidates left unpaired]).
+    """
+    by_sample, unpaired = {}, []
+    for candidate in candidates:
+        found = _read_direction(candidate.name, strict)
+        if found is None:
+            unpaired.append(candidate)
+        else:
+            by_sample.setdefault(found[1], {}).setdefault(found[0], []).append(candidate)
+    pairs = {}
+    for sample, reads in by_sample.items():
+        forward, reverse = reads.get('forward', []), reads.get('reverse', [])
+        if len(forward) == 1 and len(reverse) == 1:
+            pairs[sample] = (forward[0], reverse[0])
+        else:
+            unpaired += forward + reverse
+    return pairs, unpaired
@@ -0,0 +1,279 @@
+"""
+The request policy applied to every Galaxy API call gxwf makes: retries with exponential backoff and jitter,
+honouring Retry-After, and a circuit breaker which stops sending requests to a server which keeps failing.
+
+Only idempotent requests (GET, PUT, DELETE) are retried after a failure which may have reached the server;
+POST and PATCH requests are retried only if they were rate limited or never got through, so that e.g. a workflow
+is never invoked twice.
+
+Requests can also be limited, to stay within what the server's admins allow: a token bucket limits the rate at
+which requests are sent, and a cap limits how many are in flight at once. Both are enforced across all threads and,
+through lock files in the login's cache directory, across all gxwf processes running on the same machine.
+
+The policy can be configured for each login, under the `policy` key of the login in the config file.
+"""
+import contextlib
+import email.utils
+import logging
+import os
+import random
+import struct
+import threading
+import time
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # e.g. on Windows: limits then only apply within one process
+    fcntl = None
+
+from bioblend import galaxy
+from bioblend import ConnectionError as BioblendConnectionError
+
+from gxwf import utils
+
+DEFAULT_POLICY = {
+    'retries': 4,  # retries after the first attempt
+    'backoff': 1.0,  # seconds before the first retry, doubled for each retry after
+    'max_backoff': 60.0,
+    'failure_threshold': 8,  # consecutive failures after which the circuit opens
+    'reset_timeout': 60.0,  # seconds before an open circuit lets a trial request through
+    'rate': None,  # requests per second, or None for no limit
+    'burst': None,  # requests which can be sent at once after a pause; defaults to rate (and at least 1)
+    'max_in_flight': None,  # requests waiting for a response at once, or None for no limit
+}
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+RETRY_STATUSES = (429, 502, 503, 504)
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request while the server is considered unhealthy.
+    """
+
+
+def _retry_after(response):
+    """
+    Seconds to wait according to a Retry-After header (in seconds or as an HTTP date), or None.
+    """
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):  # not a date either, so back off as usual
+        return None
+    return max(0.0, date.timestamp() - time.time()) if date else None
+
+
+def _never_sent(error):
+    """
+    Whether a request certainly never reached the server, so that retrying it can't duplicate its effect.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return type(reason).__name__ == 'NewConnectionError'  # e.g. connection refused, or DNS failure
+
+
+class Limiter(object):
+    """
+    A token bucket rate limit and a cap on requests in flight, shared by all processes using the same lock_dir.
+
+    The bucket is stored in a small file, updated under an exclusive lock. Each in-flight slot is a lock file which
+    is held while a request is sent, so slots held by a process which is killed are freed by the OS.
+    """
+    SLOT_POLL_INTERVAL = 0.05
+
+    def __init__(self, lock_dir, rate=None, burst=None, max_in_flight=None):
+        self.lock_dir = lock_dir
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.max_in_flight = max_in_flight
+        self.lock = threading.Lock()
+        self.bucket = None  # (tokens, time) when there is no fcntl to share the bucket through a file
+        self.semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight and fcntl is None else None
+        if fcntl is not None and (rate or max_in_flight):
+            os.makedirs(lock_dir, exist_ok=True)
+
+    def _reserve(self, bucket):
+        """
+        Take a token from the bucket (tokens, time), possibly going into debt. Return the new bucket and how long to wait.
+        """
+        now = time.time()
+        tokens, last = bucket or (self.burst, now)
+        tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate) - 1
+        return (tokens, now), max(0.0, -tokens / self.rate)
+
+    def _wait_for_token(self):
+        if fcntl is None:
+            with self.lock:
+                self.bucket, wait = self._reserve(self.bucket)
+        else:
+            with open(os.path.join(self.lock_dir, 'bucket'), 'a+b') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                data = f.read(16)
+                bucket, wait = self._reserve(struct.unpack('dd', data) if len(data) == 16 else None)
+                f.seek(0)
+                f.truncate()
+                f.write(struct.pack('dd', *bucket))
+                f.flush()  # the lock is released when the file is closed
+        if wait:
+            time.sleep(wait)
+
+    def _acquire_slot(self):
+        if fcntl is None:
+            self.semaphore.acquire()
+            return None
+        while True:
+            for n in random.sample(range(self.max_in_flight), self.max_in_flight):  # random order, so processes don't all queue for slot 0
+                f = open(os.path.join(self.lock_dir, 'slot-{}'.format(n)), 'a')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except OSError:  # taken
+                    f.close()
+            time.sleep(self.SLOT_POLL_INTERVAL)
+
+    @contextlib.contextmanager
+    def request(self):
+        """
+        Wait until a request may be sent, and hold its in-flight slot for the duration of the context.
+        """
+        if self.rate:
+            self._wait_for_token()
+        if not self.max_in_flight:
+            yield
+            return
+        slot = self._acquire_slot()
+        try:
+            yield
+        finally:
+            if slot is None:
+                self.semaphore.release()
+            else:
+                slot.close()  # releases the lock
+
+
+class RequestPolicy(object):
+    """
+    Retry, circuit breaking and limits for requests to a single server; shared by all threads using the same login.
+
+    Limits (rate, burst and max_in_flight) are only enforced if lock_dir is given.
+    """
+
+    def __init__(self, retries=DEFAULT_POLICY['retries'], backoff=DEFAULT_POLICY['backoff'], max_backoff=DEFAULT_POLICY['max_backoff'],
+                 failure_threshold=DEFAULT_POLICY['failure_threshold'], reset_timeout=DEFAULT_POLICY['reset_timeout'],
+                 rate=None, burst=None, max_in_flight=None, lock_dir=None, sleep=time.sleep):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self.limiter = Limiter(lock_dir, rate, burst, max_in_flight) if lock_dir and (rate or max_in_flight) else None
+        self.failures = 0  # consecutive failures
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def _before_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("Galaxy server is failing; not sending further requests for {:.0f}s.".format(
+                    self.reset_timeout - (time.monotonic() - self.opened_at)))
+            self.opened_at = time.monotonic()  # half-open: let this request through as a trial, but hold back the rest
+
+    def _record(self, success):
+        with self.lock:
+            if success:
+                self.failures, self.opened_at = 0, None
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+
+    def _delay(self, attempt, response=None):
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))  # "full jitter"
+
+    def call(self, method, send, *args, **kwargs):
+        """
+        Make a request by calling send(*args, **kwargs), retrying according to the policy.
+
+        send may return a requests Response or raise bioblend's ConnectionError for an unexpected status code.
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self._before_request()
+            response = None
+            try:
+                with self.limiter.request() if self.limiter else contextlib.suppress():  # suppress() as a no-op context
+                    result = send(*args, **kwargs)
+            except BioblendConnectionError as e:
+                status, retryable = e.status_code, e.status_code in RETRY_STATUSES and (idempotent or e.status_code == 429)
+                error = e
+            except requests.exceptions.RequestException as e:
+                status, retryable = None, isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)) and (idempotent or _never_sent(e))
+                error = e
+            else:
+                status = getattr(result, 'status_code', None)
+                if status not in RETRY_STATUSES:
+                    self._record(success=True)
+                    return result
+                response, error = result, None
+                retryable = idempotent or status == 429
+
+            self._record(success=status is not None and status < 500 and status != 429)  # only server trouble trips the breaker
+            if not retryable or attempt >= self.retries:
+                if error is not None:
+                    raise error
+                return response
+            delay = self._delay(attempt, response)
+            log.warning("%s request failed (%s), retrying in %.1fs", method, status or error, delay)
+            self.sleep(delay)
+            attempt += 1
+
+
+class GalaxyInstance(galaxy.GalaxyInstance):
+    """
+    A bioblend GalaxyInstance which sends every request through a RequestPolicy.
+    """
+
+    def __init__(self, url, key, policy=None, **kwargs):
+        super(GalaxyInstance, self).__init__(url, key, **kwargs)
+        self.policy = policy or RequestPolicy()
+
+    def make_get_request(self, url, **kwargs):
+        return self.policy.call('GET', super(GalaxyInstance, self).make_get_request, url, **kwargs)
+
+    def make_post_request(self, url, *args, **kwargs):
+        return self.policy.call('POST', super(GalaxyInstance, self).make_post_request, url, *args, **kwargs)
+
+    def make_put_request(self, url, *args, **kwargs):
+        return self.policy.call('PUT', super(GalaxyInstance, self).make_put_request, url, *args, **kwargs)
+
+    def make_delete_request(self, url, *args, **kwargs):
+        return self.policy.call('DELETE', super(GalaxyInstance, self).make_delete_request, url, *args, **kwargs)
+
+    def make_patch_request(self, url, *args, **kwargs):
+        return self.policy.call('PATCH', super(GalaxyInstance, self).make_patch_request, url, *args, **kwargs)
+
+
+def _galaxy_instance(cnfg):
+    """
+    Create a GalaxyInstance for a login, using the request policy configured for it.
+    """
+    settings = dict(DEFAULT_POLICY, **(cnfg.get('policy') or {}))
+    lock_dir = os.path.join(utils._cache_dir(cnfg), 'limits')
+    return GalaxyInstance(cnfg['url'], cnfg['api_key'], policy=RequestPolicy(lock_dir=lock_dir, **settings))
@@ -0,0 +1,157 @@
+"""
+Profiling workflow steps from the metrics of their jobs, to find which steps make a workflow slow.
+
+Jobs are grouped by the step they ran for, over one or many invocations, and summarised per step: median and 95th
+percentile of their runtime, of the time they spent waiting (queued, or staging data, i.e. the time from the job
+being created to it finishing, less its runtime), cores and memory. The time each step adds to an invocation (the
+runtime of its longest job, as the median over invocations) is then used as its weight in the workflow graph, and
+the heaviest path through it, which no amount of parallelism can shorten, is the critical path; its heaviest step
+is the bottleneck.
+
+Statistics are computed with numpy if it is installed, for all steps at once, else in pure Python.
+"""
+import math
+
+from gxwf import export
+
+STATS = ('runtime_seconds', 'wait_seconds', 'galaxy_slots', 'memory_mb')
+
+
+def _numpy():
+    try:
+        import numpy  # imported here, not at the top, so that shell completion and other commands don't pay for it
+    except ImportError:
+        return None
+    return numpy
+
+
+def _quantiles(keys, values, qs):
+    """
+    For each distinct key, the number of values and the given quantiles of them (linear interpolation, as numpy's
+    default). Missing (None) values are left out. Returns {key: (count, [quantile for each of qs])}.
+    """
+    numpy = _numpy()
+    if numpy is not None:
+        keys = numpy.asarray(keys)
+        values = numpy.asarray([numpy.nan if v is None else v for v in values], dtype=float)
+        present = ~numpy.isnan(values)
+        keys, values = keys[present], values[present]
+        if not len(values):
+            return {}
+        order = numpy.lexsort((values, keys))  # by key, then by value
+        keys, values = keys[order], values[order]
+        unique, starts, counts = numpy.unique(keys, return_index=True, return_counts=True)
+        results = []
+        for q in qs:  # each quantile of every group at once
+            position = starts + (counts - 1) * q
+            low, high = numpy.floor(position).astype(int), numpy.ceil(position).astype(int)
+            results.append(values[low] + (values[high] - values[low]) * (position - low))
+        return {key.item(): (int(count), [float(result[n]) for result in results]) for n, (key, count) in enumerate(zip(unique, counts))}
+
+    groups = {}
+    for key, value in zip(keys, values):
+        if value is not None:
+            groups.setdefault(key, []).append(value)
+    quantiles = {}
+    for key, group in groups.items():
+        group.sort()
+        results = []
+        for q in qs:
+            position = (len(group) - 1) * q
+            low, high = int(math.floor(position)), int(math.ceil(position))
+            results.append(group[low] + (group[high] - group[low]) * (position - low))
+        quantiles[key] = (len(group), results)
+    return quantiles
+
+
+def _runtime(row):
+    """
+    The runtime of a job from its metrics or, on servers without job metrics, its whole time, which will have to do.
+    """
+    return row['runtime_seconds'] if row.get('runtime_seconds') is not None else row.get('seconds')
+
+
+def _step_stats(job_rows):
+    """
+    Summarise jobs by step: {step index: {'label', 'tool_id', 'jobs', 'invocations', and (median, p95) for each of STATS}}.
+    """
+    steps = {}
+    job_rows = [dict(row) for row in job_rows]  # the derived columns are only for the stats, not for the caller's rows
+    for row in job_rows:
+        step = steps.setdefault(row['step_index'], {'label': row.get('step_label'), 'tool_id': row.get('tool_id'), 'jobs': 0, 'invocations': set()})
+        step['jobs'] += 1
+        step['invocations'].add(row['invocation_id'])
+        runtime = row.get('runtime_seconds')
+        row['wait_seconds'] = max(0.0, row['seconds'] - runtime) if runtime is not None and row.get('seconds') is not None else None
+        row['runtime_seconds'] = _runtime(row)
+    keys = [row['step_index'] for row in job_rows]
+    for stat in STATS:
+        for key, (count, (median, p95)) in _quantiles(keys, [row.get(stat) for row in job_rows], (0.5, 0.95)).items():
+            steps[key][stat] = (median, p95)
+    for step in steps.values():
+        step['invocations'] = len(step['invocations'])
+    return steps
+
+
+def _step_weights(job_rows):
+    """
+    The time each step adds to an invocation: the runtime of its longest job (jobs of a step run side by side), as the median over invocations.
+    """
+    longest = {}
+    for row in job_rows:
+        key = (row['step_index'], row['invocation_id'])
+        if _runtime(row) is not None:
+            longest[key] = max(longest.get(key, 0.0), _runtime(row))
+    medians = _quantiles([step for step, invocation in longest], list(longest.values()), (0.5,))
+    return {step: quantiles[0] for step, (count, quantiles) in medians.items()}
+
+
+def _graph(workflow):
+    """
+    The steps each step takes inputs from, by step index, from a workflow as shown by the API.
+    """
+    return {int(key): {int(source['source_step']) for source in (step.get('input_steps') or {}).values()}
+            for key, step in workflow.get('steps', {}).items()}
+
+
+def _critical_path(graph, weights):
+    """
+    The heaviest path through the workflow graph, as a list of step indices, and its total weight.
+    """
+    best = {}  # step -> (weight of the heaviest path ending at it, the step before it on that path)
+
+    def visit(step, visiting=()):
+        if step not in best:
+            if step in visiting:
+                raise ValueError('the workflow graph has a cycle')
+            before = max(((visit(source, visiting + (step,))[0], source) for source in graph.get(step, ())), default=(0.0, None))
+            best[step] = (before[0] + weights.get(step, 0.0), before[1])
+        return best[step]
+
+    for step in graph:
+        visit(step)
+    if not best:
+        return [], 0.0
+    step = max(best, key=lambda s: best[s][0])
+    total, path = best[step][0], []
+    while step is not None:
+        path.append(step)
+        step = best[step][1]
+    return list(reversed(path)), total
+
+
+def _profile(gi, invocation_ids, pool, partial=False):
+    """
+    Fetch the jobs of the invocations, with their metrics, and profile them. Returns (step stats, step weights,
+    critical path, its total weight, number of invocations profiled).
+    """
+    fetched = [result for result in pool.map(lambda id_: export._fetch(gi, id_, metrics=True, partial=partial), invocation_ids) if result]
+    job_rows = [row for invocation_row, rows in fetched for row in rows if row['step_index'] is not None]
+    stats = _step_stats(job_rows)
+    graph = {}
+    if fetched:  # the graph of the most recent invocation's version of the workflow
+        latest = max(fetched, key=lambda result: result[0].get('create_time') or '')[0]
+        graph = _graph(gi.workflows._get(id=latest['workflow_id'], params={'instance': 'true'}))
+    weights = _step_weights(job_rows)
+    path, total = _critical_path(graph, weights)
+    return stats, weights, path, total, len(fetched)
@@ -0,0 +1,308 @@
+"""
+Local search index for workflow and dataset listings, used by `--search`.
+
+The index is an inverted index from character trigrams of each field (name, owner, tag, extension, alias) to the
+documents containing them, so queries can be answered without fetching anything from the server and can tolerate
+typos. It is kept up to date incrementally from whatever listings gxwf fetches.
+
+Query syntax: whitespace-separated terms, all of which must match. A term can be restricted to one field with a
+prefix, e.g. `name:rnaseq tag:paired ext:fastqsanger`; bare terms match any field.
+
+The same queries can instead be translated into Galaxy's own filters (see _workflow_params and _dataset_params),
+for when the search should be done on the server, rather than locally.
+"""
+import os
+import pickle
+
+from array import array
+from collections import Counter
+
+from gxwf import utils
+
+FIELDS = {'name': 'n', 'owner': 'o', 'tags': 't', 'extension': 'e', 'alias': 'a'}  # record keys indexed, and their codes
+CODE_FIELDS = {code: field for field, code in FIELDS.items()}
+FIELD_ALIASES = {'ext': 'extension', 'tag': 'tags', 'user': 'owner'}
+FIELD_WEIGHTS = {'n': 1.0, 'a': 1.0, 'o': 0.8, 't': 0.8, 'e': 0.8}
+FUZZY_THRESHOLD = 0.5  # fraction of a term's trigrams which must be found in a field for it to match
+EXACT_BONUS = 0.5  # added to the score when a term is an exact substring of the field
+
+# fields which can be filtered on the server, and how Galaxy's APIs name them
+SERVER_FIELDS = ('name', 'owner', 'tags', 'extension', 'state', 'deleted')
+WORKFLOW_FILTERS = {'name': 'name', 'owner': 'user', 'tags': 'tag'}
+DATASET_FILTERS = {'name': 'name-contains', 'extension': 'extension-eq', 'tags': 'tag-has'}
+
+
+def _grams(text, pad=True):
+    text = text.lower()
+    if pad:
+        text = ' {} '.format(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _field_values(record, field):
+    return _values(record.get(field))
+
+
+def _values(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def _parse_query(query):
+    """
+    Split a query into (field code or None, term) tuples.
+    """
+    terms = []
+    for token in query.split():
+        field, sep, term = token.partition(':')
+        field = FIELD_ALIASES.get(field.lower(), field.lower())
+        if sep and field in FIELDS and term:
+            terms.append((FIELDS[field], term.lower()))
+        else:
+            terms.append((None, token.lower()))
+    return terms
+
+
+def _server_terms(query):
+    """
+    Split a query into (field, term) tuples for filtering on the server; bare terms filter on name.
+    """
+    terms = []
+    for token in query.split():
+        field, sep, term = token.partition(':')
+        field = FIELD_ALIASES.get(field.lower(), field.lower())
+        if sep and field in SERVER_FIELDS and term:
+            terms.append((field, term))
+        else:
+            terms.append(('name', token))
+    return terms
+
+
+def _is_true(term):
+    return term.lower() in ('true', 'yes', '1')
+
+
+def _workflow_params(query, public=False):
+    """
+    Translate a search query into parameters for Galaxy's workflow list (GET /api/workflows), which accepts
+    `name:`, `tag:` and `user:` filters in its `search` parameter.
+    """
+    params = {'show_published': public} if public else {}
+    filters = []
+    for field, term in _server_terms(query):
+        if field == 'deleted':
+            params['show_deleted'] = _is_true(term)
+        elif field in WORKFLOW_FILTERS:
+            filters.append("{}:'{}'".format(WORKFLOW_FILTERS[field], term))
+        # extension and state don't apply to workflows
+    if filters:
+        params['search'] = ' '.join(filters)
+    return params
+
+
+def _dataset_params(query, keys=None):
+    """
+    Translate a search query into q/qv filters for Galaxy's dataset and history contents lists. Unless the query
+    says otherwise, only datasets which are ok and not deleted are requested. If keys are given, only those
+    fields are returned for each dataset.
+    """
+    filters = {'state': ['state-eq', 'ok'], 'deleted': ['deleted-eq', 'false']}
+    q, qv = [], []
+    for field, term in _server_terms(query):
+        if field in ('state', 'deleted'):
+            filters[field] = ['{}-eq'.format(field), term.lower() if field == 'state' else str(_is_true(term)).lower()]
+        elif field in DATASET_FILTERS:
+            q.append(DATASET_FILTERS[field])
+            qv.append(term)
+        # owner doesn't apply to datasets
+    for filter_, value in filters.values():
+        q.append(filter_)
+        qv.append(value)
+    params = {'v': 'dev', 'q': q, 'qv': qv}
+    if keys:
+        params['keys'] = ','.join(keys)
+    return params
+
+
+class SearchIndex(object):
+    """
+    A persistent trigram index over a collection of listing records (dicts with at least an 'id').
+
+    Records are stored as tuples of the given fields and posting lists as arrays of document numbers, which keeps
+    the pickled index small and quick to load.
+    """
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = tuple(fields)
+        self.docs = []  # doc number -> record tuple, or None once removed
+        self.numbers = {}  # record id -> doc number
+        self.postings = {}  # field code + trigram -> array of doc numbers
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def _record(self, number):
+        return dict(zip(self.fields, self.docs[number]))
+
+    def _field(self, number, code):
+        """
+        Lower-cased values of a field of a document, without building the record dict.
+        """
+        field = CODE_FIELDS[code]
+        if field not in self.fields:
+            return []
+        return [value.lower() for value in _values(self.docs[number][self.fields.index(field)])]
+
+    def _row(self, record):
+        """
+        The stored tuple for a record: a dict, or a named tuple, which is used as it is if it has the index's fields.
+        """
+        if getattr(record, '_fields', None) == self.fields:
+            return tuple(record)
+        if hasattr(record, '_asdict'):
+            record = record._asdict()
+        return tuple(record.get(field) for field in self.fields)
+
+    def _keys(self, record):
+        return {code + gram for field, code in FIELDS.items() for value in _field_values(record, field) for gram in _grams(value)}
+
+    def remove(self, ids):
+        removed = {}
+        for id_ in ids:
+            number = self.numbers.pop(id_, None)
+            if number is not None:
+                for key in self._keys(self._record(number)):
+                    removed.setdefault(key, set()).add(number)
+                self.docs[number] = None
+        for key, numbers in removed.items():  # filter each posting list once, however many docs were removed
+            postings = array('I', (n for n in self.postings[key] if n not in numbers))
+            if postings:
+                self.postings[key] = postings
+            else:
+                del self.postings[key]
+
+    def update(self, records, complete=False):
+        """
+        Add or replace records (dicts or named tuples) in the index. If complete is set, records is the full listing and anything else is removed.
+        """
+        rows = {row[0]: row for row in map(self._row, records)}  # 'id' is the first field
+        stale = set(self.numbers) - set(rows) if complete else set()
+        stale |= {id_ for id_, row in rows.items() if id_ in self.numbers and self.docs[self.numbers[id_]] != row}
+        self.remove(stale)
+        for id_, row in rows.items():
+            if id_ in self.numbers:
+                continue  # unchanged, nothing to do
+            number = len(self.docs)
+            self.docs.append(row)
+            self.numbers[id_] = number
+            for key in self._keys(self._record(number)):
+                self.postings.setdefault(key, array('I')).append(number)
+        if len(self.docs) > 2 * len(self.numbers) + 1000:  # too many holes left by removed docs, start afresh
+            live = [self._record(number) for number in self.numbers.values()]
+            self.docs, self.numbers, self.postings = [], {}, {}
+            self.update(live)
+
+    def _match_term(self, code, term):
+        """
+        Return {doc number: score} for all docs matching a single term.
+        """
+        codes = [code] if code else FIELD_WEIGHTS.keys()
+        scores = {}
+        if len(term) < 3:  # too short to be split into trigrams, but any trigram containing it is a match
+            for key, postings in self.postings.items():
+                if key[0] in codes and term in key[1:]:
+                    score = FIELD_WEIGHTS[key[0]] * (1 + EXACT_BONUS)
+                    for number in postings:
+                        if score > scores.get(number, 0):
+                            scores[number] = score
+            return scores
+
+        grams = _grams(term, pad=False)
+        for c in codes:
+            counts = Counter()
+            for gram in grams:
+                counts.update(self.postings.get(c + gram, ()))
+            for number, count in counts.items():
+                ratio = count / len(grams)
+                if ratio < FUZZY_THRESHOLD:
+                    continue
+                if ratio == 1 and any(term in value for value in self._field(number, c)):
+                    ratio += EXACT_BONUS
+                score = FIELD_WEIGHTS[c] * ratio
+                if score > scores.get(number, 0):
+                    scores[number] = score
+        return scores
+
+    def rows(self, numbers, row=None):
+        """
+        The records of the given docs: dicts, or instances of row, a named tuple type with the index's fields.
+        """
+        return [row._make(self.docs[number]) for number in numbers] if row else [self._record(number) for number in numbers]
+
+    def search(self, query, limit=None, row=None):
+        """
+        Return the records matching all terms of the query, best matches first, as dicts or as instances of row.
+        """
+        totals = None
+        for code, term in _parse_query(query):
+            scores = self._match_term(code, term)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {number: totals[number] + score for number, score in scores.items() if number in totals}
+            if not totals:
+                return []
+        if totals is None:
+            return []
+        name = self.fields.index('name') if 'name' in self.fields else 0
+        ranked = sorted(totals, key=lambda number: (-totals[number], self.docs[number][name] or ''))
+        return self.rows(ranked[:limit], row)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = '{}.{}'.format(self.path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump((self.fields, self.docs, self.postings), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+
+def _load_index(cnfg, collection, fields=None):
+    """
+    Load the search index for a collection (e.g. 'workflows') of the given login; it is empty if never built.
+
+    fields are the record fields to index, 'id' first; if not given, those the index was built with are used.
+    """
+    index = SearchIndex(os.path.join(utils._cache_dir(cnfg), 'search', collection), fields or ())
+    try:
+        with open(index.path, 'rb') as f:
+            stored_fields, docs, postings = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+        return index  # start from scratch if the index is missing or corrupt
+    if fields is None or tuple(fields) == stored_fields:  # otherwise the records have changed shape since the index was built
+        index.fields, index.docs, index.postings = stored_fields, docs, postings
+        index.numbers = {doc[0]: number for number, doc in enumerate(docs) if doc is not None}
+    return index
+
+
+def _update_aliases(cnfg, aliases):
+    """
+    Bring the alias field of every search index of a login up to date after aliases have changed.
+    """
+    aliases_inverted = {v: k for k, v in aliases.items()}
+    search_dir = os.path.join(utils._cache_dir(cnfg), 'search')
+    if not os.path.isdir(search_dir):
+        return
+    for collection in os.listdir(search_dir):
+        if '.' in collection:
+            continue  # a temporary file left by an interrupted save
+        index = _load_index(cnfg, collection)
+        records = [index._record(number) for number in index.numbers.values()]
+        changed = [dict(record, alias=aliases_inverted.get(record['id'], '')) for record in records
+                   if record.get('alias', '') != aliases_inverted.get(record['id'], '')]
+        if changed:
+            index.update(changed)
+            index.save()
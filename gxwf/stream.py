@@ -0,0 +1,75 @@
+"""
+Incremental parsing of listing responses from the Galaxy API.
+
+bioblend reads each response whole and parses it into a list of dicts, which for large accounts means hundreds of
+MB of Python objects before gxwf has looked at a single item. Here, a listing (a JSON array of objects) is decoded
+one item at a time as the response arrives, and each item is cut down to the fields the caller needs straight
+away, so memory use while parsing is proportional to one item rather than the whole response.
+"""
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+def _iter_array(chunks):
+    """
+    Yield the items of a JSON array, given its text as an iterable of byte chunks.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf, pos, started, done = '', 0, False, False
+    for chunk in chunks:
+        buf = buf[pos:] + (text.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and (buf[pos] in WHITESPACE or (started and buf[pos] == ',')):
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError('expected a JSON array, got {!r}'.format(buf[pos:pos + 50]))
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == ']':
+                done = True
+                break
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                break  # the item isn't complete yet, wait for more
+            if end == len(buf) and not isinstance(item, (dict, list)):
+                break  # a number or literal at the end of the buffer might continue in the next chunk
+            yield item
+            pos = end
+        if done:
+            return
+    if not done:
+        raise ValueError('incomplete JSON array')
+
+
+def _project(item, fields):
+    """
+    Cut an item down to fields: a tuple of keys, giving a dict, or a named tuple type, giving a compact record of it.
+    """
+    if hasattr(fields, '_make'):
+        return fields._make(item.get(k) for k in fields._fields)
+    return {k: item.get(k) for k in fields} if fields else item
+
+
+def _get_list(gi, path, params=None, fields=None):
+    """
+    Stream a listing from the API (e.g. path='/datasets'), yielding each item with only the given fields, if any (see _project).
+
+    The request goes through the GalaxyInstance, so it follows the login's request policy.
+    """
+    from bioblend import ConnectionError as BioblendConnectionError
+
+    r = gi.make_get_request(gi.url + path, params=params, stream=True)
+    with r:
+        if r.status_code != 200:
+            raise BioblendConnectionError('GET: error {}: {!r}'.format(r.status_code, r.content), body=r.text, status_code=r.status_code)
+        for item in _iter_array(r.iter_content(chunk_size=CHUNK_SIZE)):
+            yield _project(item, fields)
@@ -0,0 +1,147 @@
+import click
+import fnmatch
+import operator
+
+from gxwf import api
+from gxwf import utils
+from gxwf import mapping
+
+SHEET_COLUMNS = {'sample': 'sample', 'name': 'sample', 'forward': 'forward', 'r1': 'forward', 'fwd': 'forward', 'read1': 'forward',
+                 'reverse': 'reverse', 'r2': 'reverse', 'rev': 'reverse', 'read2': 'reverse', 'dataset': 'dataset', 'id': 'dataset', 'file': 'dataset'}
+
+
+def _select(datasets, patterns, alias_patterns, aliases):
+    """
+    The datasets whose names match any of the patterns, and those with an alias matching any of the alias patterns.
+    """
+    by_id = {ds.id: ds for ds in datasets}
+    selected = {ds.id: ds for ds in datasets if any(fnmatch.fnmatchcase(ds.name, pattern) for pattern in patterns)}
+    for alias, id_ in aliases.items():
+        if any(fnmatch.fnmatchcase(alias, pattern) for pattern in alias_patterns):
+            selected.setdefault(id_, by_id.get(id_) or mapping.Candidate(id_, alias, '', 'hda', ''))  # not in the history, so named by its alias
+    return list(selected.values())
+
+
+def _elements(selected, collection_type):
+    """
+    Make the elements of a collection from the selected datasets, pairing reads for a list:paired, or if collection_type is 'auto' and
+    they all pair by unambiguous markers (R1/R2, fwd/rev, forward/reverse; a bare 1/2 may just number replicates). Returns ({identifier:
+    dataset or (forward, reverse)}, collection type, datasets left out).
+    """
+    pairs, unpaired = mapping._pair_reads(selected, strict=collection_type == 'auto')
+    if collection_type == 'auto':
+        collection_type = 'list:paired' if pairs and not unpaired else 'list'
+    if collection_type == 'list:paired':
+        return pairs, collection_type, unpaired
+
+    elements, duplicates = {}, set()
+    for ds in selected:
+        identifier = mapping._split_name(ds.name)[0] or ds.name
+        if identifier in elements:
+            duplicates.add(identifier)
+        elements[identifier] = ds
+    if duplicates:
+        raise click.ClickException("Several datasets are named {}; element names must be unique.".format(', '.join(sorted(duplicates))))
+    return elements, collection_type, []
+
+
+def _read_sheet(path, datasets, aliases):
+    """
+    Read the elements of a collection from a sample sheet: a CSV or TSV file with a header, with columns sample and either forward and
+    reverse (for a list:paired) or dataset (for a list). Datasets are given by ID, alias or name. Returns ({identifier: dataset or
+    (forward, reverse)}, collection type).
+    """
+    import csv
+
+    by_name, by_id = {}, {ds.id: ds for ds in datasets}
+    for ds in datasets:
+        by_name.setdefault(ds.name, []).append(ds)
+
+    def resolve(value):
+        value = value.strip()
+        if value in aliases:
+            return by_id.get(aliases[value]) or mapping.Candidate(aliases[value], value, '', 'hda', '')
+        named = by_name.get(value, [])
+        if len(named) > 1:
+            raise click.ClickException("Several datasets are named {}; give its ID or alias in the sample sheet instead.".format(value))
+        return named[0] if named else by_id.get(value) or mapping.Candidate(value, value, '', 'hda', '')  # else assume it is an ID
+
+    with open(path, newline='') as f:
+        try:
+            dialect = csv.Sniffer().sniff(f.readline(), delimiters=',\t;')
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        reader = csv.DictReader(f, dialect=dialect)
+        columns = {SHEET_COLUMNS.get(column.strip().lower()): column for column in reader.fieldnames or ()}
+        paired = 'forward' in columns and 'reverse' in columns
+        if 'sample' not in columns or not (paired or 'dataset' in columns):
+            raise click.ClickException("The sample sheet needs a sample column, and forward and reverse columns or a dataset column.")
+        elements = {}
+        for row in reader:
+            if None in row.values():  # fewer fields than the header
+                raise click.ClickException("Line {} of the sample sheet has fewer columns than its header.".format(reader.line_num))
+            sample = row[columns['sample']].strip()
+            if not sample:
+                continue
+            if sample in elements:
+                raise click.ClickException("Sample {} is in the sample sheet twice.".format(sample))
+            elements[sample] = (resolve(row[columns['forward']]), resolve(row[columns['reverse']])) if paired else resolve(row[columns['dataset']])
+    return elements, 'list:paired' if paired else 'list'
+
+
+@click.command()
+@click.argument('patterns', nargs=-1)
+@click.option('--name', default='gxwf_collection', help="Name of the collection (default: gxwf_collection).")
+@click.option('--type', 'collection_type', type=click.Choice(['auto', 'list', 'list:paired']), default='auto',
+              help="Type of collection to build; by default a list:paired if the datasets all pair as forward and reverse reads (marked R1/R2, fwd/rev or forward/reverse), else a list.")
+@click.option('--alias', 'alias_patterns', multiple=True, help="Also include the datasets with aliases matching this pattern, e.g. 'reads_*'. Can be repeated.")
+@click.option('--sample-sheet', default=None, type=click.Path(exists=True, dir_okay=False), help="CSV or TSV file listing the elements, with columns sample and either forward and reverse, or dataset.")
+@click.option('--source-history', default=None, help="History to take datasets from by name (default: the gxwf history).")
+@click.option('--history', default=None, help="History to create the collection in (default: the source history).")
+@click.option('--dry-run', '-n', is_flag=True, help="Only show the elements the collection would have.")
+def create(patterns, name, collection_type, alias_patterns, sample_sheet, source_history, history, dry_run):
+    """
+    Build a list or list:paired collection from many datasets at once, so that a single invocation can map a workflow over all of them.
+
+    Datasets are chosen by name with PATTERNS (e.g. '*.fastq.gz'), by alias with --alias, or listed in a --sample-sheet. Forward and reverse reads (e.g. sampleA_R1.fastq.gz and sampleA_R2.fastq.gz) are paired automatically by sample; reads numbered only 1 and 2 (e.g. sampleA_1.fastq.gz) are only paired with --type list:paired, as they may be replicates. Reads which can't be paired are reported and left out of a list:paired.
+
+    However many datasets it has, the collection is created with a single request.
+    """
+    if bool(sample_sheet) == bool(patterns or alias_patterns):
+        raise click.UsageError("Give either PATTERNS and/or --alias, or a --sample-sheet.")
+    gi, cnfg, aliases = utils._login()
+    source_history = aliases.get(source_history, source_history) if source_history else cnfg['hid']
+    datasets = [ds for ds in mapping._history_candidates(gi, source_history) if ds.src == 'hda']  # one listing, to find datasets by name
+
+    if sample_sheet:
+        elements, sheet_type = _read_sheet(sample_sheet, datasets, aliases)
+        if collection_type not in ('auto', sheet_type):
+            raise click.ClickException("The sample sheet describes a {}.".format(sheet_type))
+        collection_type, left_out = sheet_type, []
+    else:
+        selected = _select(datasets, patterns, alias_patterns, aliases)
+        if not selected:
+            raise click.ClickException("No datasets matched.")
+        elements, collection_type, left_out = _elements(selected, collection_type)
+    for ds in sorted(left_out, key=operator.attrgetter('name')):
+        click.echo(click.style("Left out {} ({}): no forward/reverse pair".format(ds.name, ds.id), fg='yellow'))
+    if not elements:
+        raise click.ClickException("No elements to build a collection from.")
+    elements = dict(sorted(elements.items()))
+
+    if dry_run:
+        if collection_type == 'list:paired':
+            rows = [(identifier, forward.name, reverse.name) for identifier, (forward, reverse) in elements.items()]
+            headers = ('Element', 'Forward', 'Reverse')
+        else:
+            rows = [(identifier, ds.name, ds.id) for identifier, ds in elements.items()]
+            headers = ('Element', 'Dataset', 'ID')
+        click.echo(click.style("{} of {} elements".format(collection_type, len(elements)), bold=True))
+        utils._tabulate_rows([(header, operator.itemgetter(n)) for n, header in enumerate(headers)], rows)
+        return
+
+    ids = {identifier: tuple(ds.id for ds in value) if collection_type == 'list:paired' else value.id for identifier, value in elements.items()}
+    collection = api.create_collection(name, ids, collection_type, aliases.get(history, history) if history else source_history,
+                                       api.Session(gi, cnfg, aliases))
+    click.echo("Created {} {} of {} elements: ".format(collection.collection_type, collection.name, collection.elements) + click.style(collection.id, bold=True))
@@ -0,0 +1,118 @@
+import click
+import os
+import json
+
+FORMAT2_EXTS = ('.gxwf.yml', '.gxwf.yaml', '.yml', '.yaml')
+
+
+def _is_format2(path):
+    return path.endswith(FORMAT2_EXTS)
+
+
+def _format2_to_native(wf_dict, workflow_directory=None):
+    import gxformat2  # imported here, it is slow to load and most commands don't need it
+    return gxformat2.python_to_workflow(wf_dict, None, workflow_directory)
+
+
+def _native_to_format2(wf_dict):
+    import gxformat2
+    # gxformat2 returns OrderedDicts, which the safe dumper can't represent
+    return json.loads(json.dumps(gxformat2.from_galaxy_native(wf_dict)))
+
+
+def _read_workflow(path):
+    """
+    Read a workflow file in either format and return it as a native (.ga) dict, converting in memory if needed.
+
+    Returns None if the file is YAML but not a Format 2 workflow.
+    """
+    import yaml
+
+    with open(path) as f:
+        if not _is_format2(path):
+            return json.load(f)
+        wf_dict = yaml.safe_load(f)
+    if not isinstance(wf_dict, dict) or wf_dict.get('class') != 'GalaxyWorkflow':
+        return None
+    return _format2_to_native(wf_dict, os.path.dirname(os.path.abspath(path)))
+
+
+def _dest_path(path, dest_dir, to):
+    name = os.path.basename(path)
+    for ext in FORMAT2_EXTS + ('.ga',):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return os.path.join(dest_dir, name + ('.gxwf.yml' if to == 'format2' else '.ga'))
+
+
+def _convert_file(args):
+    """
+    Convert a single workflow file; run in a worker process, so any error is returned rather than raised.
+    """
+    import yaml
+
+    path, dest, to = args
+    try:
+        if to == 'format2':
+            with open(path) as f:
+                wf_dict = _native_to_format2(json.load(f))
+            with open(dest, 'w') as f:
+                f.write(yaml.dump(wf_dict, Dumper=yaml.SafeDumper, sort_keys=False))
+        else:
+            wf_dict = _read_workflow(path)
+            if wf_dict is None:
+                return path, dest, 'not a Format 2 workflow'
+            with open(dest, 'w') as f:
+                json.dump(wf_dict, f, indent=4)
+    except Exception as e:  # report and carry on with the rest of the batch
+        return path, dest, str(e)
+    return path, dest, None
+
+
+def _collect(src, to):
+    src_ext = FORMAT2_EXTS if to == 'native' else ('.ga',)
+    if os.path.isfile(src):
+        return [src]
+    paths = []
+    for root, dirs, files in os.walk(src):
+        paths += [os.path.join(root, f) for f in sorted(files) if f.endswith(src_ext)]
+    return paths
+
+
+@click.command()
+@click.argument('src')
+@click.argument('dest', required=False)
+@click.option('--to', type=click.Choice(['format2', 'native']), required=True, help="Format to convert to: Format 2 YAML (.gxwf.yml) or native Galaxy JSON (.ga).")
+@click.option('--processes', '-p', default=None, type=int, help="Number of worker processes (default: number of CPUs).")
+def convert(src, dest, to, processes):
+    """
+    Convert a workflow file, or all workflows in a directory, between native Galaxy (.ga) and Format 2 YAML.
+
+    Converted files are written to DEST (default: alongside the originals), keeping any subdirectory structure.
+    """
+    paths = _collect(src, to)
+    if not paths:
+        click.echo("No workflows found to convert.")
+        return
+
+    src_dir = src if os.path.isdir(src) else os.path.dirname(src) or '.'
+    jobs = []
+    for path in paths:
+        dest_dir = os.path.dirname(path) or '.'
+        if dest:
+            dest_dir = os.path.join(dest, os.path.relpath(dest_dir, src_dir))
+        os.makedirs(dest_dir, exist_ok=True)
+        jobs.append((path, _dest_path(path, dest_dir, to), to))
+
+    from multiprocessing import Pool
+
+    failed = 0
+    with Pool(processes) as pool:
+        for path, out, error in pool.imap_unordered(_convert_file, jobs):
+            if error:
+                failed += 1
+                click.echo(click.style("Failed ", fg='red') + "{}: {}".format(path, error))
+            else:
+                click.echo(click.style("Converted ", fg='green') + "{} -> {}".format(path, out))
+    click.echo(click.style("{} of {} workflows converted.".format(len(jobs) - failed, len(jobs)), bold=True))
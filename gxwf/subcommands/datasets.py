@@ -1,46 +1,49 @@
-import click
-import os
-import yaml
-
-from bioblend import galaxy
-
-from requests import ConnectionError as RequestsConnectionError
-from bioblend import ConnectionError as BioblendConnectionError
-from yaml import SafeLoader
-
 from gxwf import utils
-
-def datasets(search, all):
-    gi, cnfg, aliases = utils._login()
+from gxwf import api
+from gxwf import cache
+from gxwf import completion
+from gxwf import search as search_index
+from gxwf.api import Dataset
+
+def _listed(ds):
+    """
+    Whether a dataset (a Dataset, or a dict as used by `gxwf sync`) is shown in listings.
+    """
+    deleted, state = (ds.get('deleted'), ds.get('state')) if isinstance(ds, dict) else (ds.deleted, ds.state)
+    return deleted == False and state == 'ok'  # could show non-ok datasets too?
+
+def _fetch_listing(index, search, all, no_cache):
+    """
+    Fetch datasets from the server, updating the local index with them.
+    """
+    if search and no_cache:  # let the server do the filtering, and only send the fields we show
+        dataset_list = list(api.datasets(all, search))
+        index.update(ds for ds in dataset_list if _listed(ds))  # a partial listing, but still worth keeping
+        index.save()
+        return dataset_list
+    dataset_list = [ds for ds in api.datasets(all) if _listed(ds)]
+    index.update(dataset_list, complete=True)
+    index.save()
+    return index.search(search, row=Dataset) if search else dataset_list
+
+def datasets(search, all, refresh=False, no_cache=False, offline=False):
+    cnfg, aliases = utils._read_login()
     aliases_inverted = {v: k for k, v in aliases.items()}  # need this below
+    index = search_index._load_index(cnfg, 'datasets_all' if all else 'datasets', Dataset._fields)
+    collection = 'datasets' if all else 'history'  # as named by `gxwf sync`; without --all, only the gxwf history is refreshed
 
-    if all:
-        # replace all this rubbish with gi.datasets.get_datasets() when the PR is merged
-        dataset_list = gi.datasets._get('?limit=1000000000000')
-        # for h in gi.histories.get_histories():
-        #     h_name = gi.histories.show_history(h['id'])['name']
-        #     history_list = gi.histories.show_history(h['id'], contents=True)
-        #     for dataset in history_list:
-        #         dataset['history_name'] = h_name
-        #     dataset_list += history_list
-
+    if offline or (len(index) and not refresh and not no_cache):  # serve the local store, refreshing it in the background if needed
+        dataset_list = cache._records(index, search, Dataset)
+        cache._cached(index, cnfg, collection, offline)
     else:
-        dataset_list = gi.histories.show_history(cnfg['hid'], contents=True)
-        for dataset in dataset_list:
-            if 'gxwf' not in dataset['tags']:
-                gi.histories.update_dataset(cnfg['hid'], dataset['id'], tags=['gxwf'])
-
-    ds_name, ds_id, ds_alias, ds_ext = ['Dataset name'], ['ID'], ['Alias'], ['Extension']#, ['History']
-
-    for ds in dataset_list:
-        if search:
-            if search not in ds.get('name', ''):
-                continue
-        if ds.get('deleted') == False and ds.get('state') == 'ok':  # could show non-ok datasets too? 
-            ds_name.append(ds.get('name', ''))
-            ds_id.append(ds.get('id', ''))
-            ds_alias.append(aliases_inverted.get(ds.get('id'), ''))
-            ds_ext.append(str(ds.get('extension', '')))
-            # ds_hist.append(ds.get('history_name', ''))  # could hide this option when --all is not set
-
-    utils._tabulate([ds_name, ds_ext, ds_id, ds_alias,])  # ds_hist])
\ No newline at end of file
+        try:
+            dataset_list = _fetch_listing(index, search, all, no_cache)
+        except cache._connection_errors() as e:
+            if not len(index):
+                raise
+            dataset_list = cache._records(index, search, Dataset)
+            cache._cached(index, cnfg, collection, offline, error=e)
+
+    completion._update_index(('dataset', ds.id) for ds in dataset_list)
+    utils._tabulate_rows([('Dataset name', 'name'), ('Extension', 'extension'), ('ID', 'id'),
+                          ('Alias', lambda ds: aliases_inverted.get(ds.id, ''))], dataset_list)  # could add the history when --all is set
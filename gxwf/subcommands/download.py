@@ -0,0 +1,56 @@
+import click
+import os
+
+from gxwf import utils
+from gxwf import completion
+from gxwf import download
+
+
+def _history_datasets(gi, history_id):
+    contents = gi.histories._get(id=history_id, contents=True, params={'v': 'dev', 'q': ['deleted', 'state-eq'], 'qv': ['false', 'ok'], 'keys': 'id,hid,history_content_type'})
+    return [ds for ds in contents if ds.get('history_content_type', 'dataset') == 'dataset']
+
+
+def _fetch(gi, ds_id, dest, prefix, connections):
+    dataset = gi.datasets.show_dataset(ds_id)
+    if dataset['state'] != 'ok':
+        raise download.DownloadError("dataset state is {}".format(dataset['state']))
+    path = os.path.join(dest, download._filename(prefix + dataset['name'], dataset))
+    return download._download_ranged(gi, dataset, path, connections)
+
+
+@click.command(name='download')
+@click.argument('dataset_ids', nargs=-1, autocompletion=completion._complete('dataset'))
+@click.option('--history', default=False, help="Download all datasets in a history (ID or alias).")
+@click.option('--dest', '-d', default='.', help="Directory to save datasets to (default: current directory).")
+@click.option('--connections', '-c', default=download.DEFAULT_CONNECTIONS, type=int, help="Number of parallel range requests for each large dataset (default: {}).".format(download.DEFAULT_CONNECTIONS))
+@click.option('--workers', '-w', default=2, type=int, help="Number of datasets to download at the same time (default: 2).")
+def download_(dataset_ids, history, dest, connections, workers):
+    """
+    Download datasets, using their IDs or aliases, or all datasets in a history.
+
+    Large datasets are split into parts which are downloaded in parallel. Interrupted downloads are resumed when the command is run again, and files are verified against Galaxy's checksums where available.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not dataset_ids and not history:
+        click.echo(click.get_current_context().get_help())  # we need at least one of them
+        return
+
+    gi, cnfg, aliases = utils._login()
+    jobs = [(aliases.get(ds_id, ds_id), '') for ds_id in dataset_ids]
+    if history:
+        jobs += [(ds['id'], '{}_'.format(ds['hid'])) for ds in _history_datasets(gi, aliases.get(history, history))]  # hid prefix, as names in a history needn't be unique
+    os.makedirs(dest, exist_ok=True)
+
+    failures = 0
+    with ThreadPoolExecutor(workers) as pool:
+        futures = [(ds_id, pool.submit(_fetch, gi, ds_id, dest, prefix, connections)) for ds_id, prefix in jobs]
+        for ds_id, future in futures:
+            try:
+                click.echo(click.style("Downloaded ", fg='green') + future.result())
+            except Exception as e:  # report it and carry on with the rest
+                failures += 1
+                click.echo(click.style("Failed ", fg='red') + "{}: {}".format(ds_id, e))
+    if failures:
+        raise click.ClickException("{} of {} datasets could not be downloaded.".format(failures, len(jobs)))
@@ -0,0 +1,92 @@
+import click
+import datetime
+
+from gxwf import utils
+
+HISTORY_KEYS = 'id,name,tags,state,size,update_time'
+DATASETS_HISTORY = 'GXWF datasets'
+
+
+def _protected_ids(login_dict):
+    """
+    The `GXWF datasets` histories of all logins, not only the active one: logins to the same server share histories.
+    """
+    return {login.get('hid') for login in (login_dict.get('logins') or {}).values()} - {None}
+
+
+def _gxwf_histories(gi, protected):
+    """
+    All histories tagged by gxwf, apart from the `GXWF datasets` histories, which must never be deleted.
+    """
+    histories = gi.histories._get(params={'q': ['tag'], 'qv': ['gxwf'], 'keys': HISTORY_KEYS})
+    return [h for h in histories if 'gxwf' in (h.get('tags') or []) and h['id'] not in protected and h.get('name') != DATASETS_HISTORY]
+
+
+def _invocation_states(gi, history_id):
+    return {inv['state'] for inv in gi.invocations._get(params={'history_id': history_id})}
+
+
+def _select(gi, histories, older_than, states, invocation_states, workers):
+    from concurrent.futures import ThreadPoolExecutor
+
+    if older_than is not None:
+        cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=older_than)).isoformat()  # ISO timestamps sort as strings
+        histories = [h for h in histories if (h.get('update_time') or '') < cutoff]
+    if states:
+        histories = [h for h in histories if h.get('state') in states]
+    if invocation_states:  # one request per history, so only for those which are left, and concurrently
+        with ThreadPoolExecutor(workers) as pool:
+            found = list(pool.map(lambda h: _invocation_states(gi, h['id']), histories))
+        histories = [h for h, found_states in zip(histories, found)
+                     if found_states & set(invocation_states) or (not found_states and 'none' in invocation_states)]
+    return histories
+
+
+@click.command()
+@click.option('--older-than', type=int, default=None, help="Only histories not updated for this many days.")
+@click.option('--state', 'states', multiple=True, type=click.Choice(['ok', 'error', 'paused', 'running', 'queued', 'new']), help="Only histories in this state. Can be given more than once.")
+@click.option('--invocation-state', 'invocation_states', multiple=True, type=click.Choice(['scheduled', 'failed', 'cancelled', 'none']), help="Only histories containing an invocation in this state ('none': no invocation at all). Can be given more than once.")
+@click.option('--purge', is_flag=True, help="Purge the histories, freeing their disk space, rather than just deleting them.")
+@click.option('--dry-run', '-n', is_flag=True, help="Only show which histories would be deleted.")
+@click.option('--workers', '-w', default=8, type=int, help="Number of requests to make at the same time (default: 8).")
+@click.option('--yes', '-y', is_flag=True, help="Delete without asking for confirmation.")
+def gc(older_than, states, invocation_states, purge, dry_run, workers, yes):
+    """
+    Delete (or purge) histories created by gxwf for invocations, selected by age, state and invocation outcome.
+
+    All histories tagged `gxwf` are considered, apart from the `GXWF datasets` histories of all logins. Use --dry-run first to see what would be deleted and how much space would be freed; otherwise you are asked to confirm, unless --yes is given.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    gi, cnfg, aliases = utils._login()
+    histories = _select(gi, _gxwf_histories(gi, _protected_ids(utils._read_configfile()) | {cnfg['hid']}), older_than, states, invocation_states, workers)
+    if not histories:
+        click.echo("No histories found.")
+        return
+
+    utils._tabulate([['History name'] + [h['name'] for h in histories],
+                     ['ID'] + [h['id'] for h in histories],
+                     ['State'] + [str(h.get('state')) for h in histories],
+                     ['Updated'] + [(h.get('update_time') or '')[:16] for h in histories],
+                     ['Size'] + [utils._format_size(h.get('size') or 0) for h in histories]])
+    size = utils._format_size(sum(h.get('size') or 0 for h in histories))
+    if dry_run:
+        click.echo(click.style("{} histories would be {}; {} {}.".format(len(histories), 'purged' if purge else 'deleted', size,
+                                                                       'would be freed' if purge else 'would only be freed once purged'), bold=True))
+        return
+    if not yes and not click.confirm("{} {} histories ({})?".format('Purge' if purge else 'Delete', len(histories), size)):
+        return
+
+    deleted = []
+    with ThreadPoolExecutor(workers) as pool:
+        futures = [(h, pool.submit(gi.histories.delete_history, h['id'], purge=purge)) for h in histories]
+        for h, future in futures:
+            try:
+                future.result()
+            except Exception as e:  # report it and carry on with the rest
+                click.echo(click.style("Failed ", fg='red') + "to delete {}: {}".format(h['id'], e))
+            else:
+                deleted.append(h)
+    size = utils._format_size(sum(h.get('size') or 0 for h in deleted))  # only what was actually deleted
+    click.echo(click.style("{} histories {}; {} {}.".format(len(deleted), 'purged' if purge else 'deleted', size,
+                                                          'freed' if purge else 'will be freed once purged'), bold=True))
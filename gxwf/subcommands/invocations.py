@@ -1,34 +1,188 @@
 import click
 import os
-import yaml
 import json
-
-from bioblend import galaxy
-
-from requests import ConnectionError as RequestsConnectionError
-from bioblend import ConnectionError as BioblendConnectionError
-from yaml import SafeLoader
+import time
 
 from gxwf import utils
+from gxwf import completion
+from gxwf import download
+from gxwf import dashboard
+from gxwf import api
+from gxwf import export
 
 
 def invocations(id_):
-    gi, cnfg, aliases = utils._login()
-    if id_:
-        id_ = aliases.get(id_, id_)  # if the user provided an alias, return the id; else assume they provided a raw id
-        invocations = gi.workflows.get_invocations(id_)  # will be deprecated, use line below in future
-        # invocations = gi.invocations.get_invocations(workflow_id=id_)
-
-    else:  # get all invocations - whether this is actually useful or not I don't know, but you get to see a lot of pretty colours
-        invocations = gi.invocations.get_invocations()
-
-    for n in range(len(invocations)):
+    # without an ID, get all invocations - whether this is actually useful or not I don't know, but you get to see a lot of pretty colours
+    invocation_ids = []
+    state_colors = {'ok': 'green', 'running': 'yellow', 'error': 'red', 'paused': 'cyan', 'deleted': 'magenta', 'deleted_new': 'magenta', 'new': 'cyan', 'queued': 'yellow'}
+    for n, invocation in enumerate(api.invocations(id_)):  # shown as they are parsed, rather than after the whole listing
         click.echo(click.style("\nInvocation {}".format(n+1), bold=True))
-        invoc_id = invocations[n]['id']
+        invocation_ids.append(invocation.id)
 
         step_no = 1
-        state_colors = {'ok': 'green', 'running': 'yellow', 'error': 'red', 'paused': 'cyan', 'deleted': 'magenta', 'deleted_new': 'magenta', 'new': 'cyan', 'queued': 'yellow'}
         for state in state_colors:
-            for k in range(gi.invocations.get_invocation_summary(invoc_id)['states'].get(state, 0)):
+            for k in range(invocation.jobs.get(state, 0)):
                 click.echo(click.style(u'\u2B24' + ' Job {} ({})'.format(k+step_no, state), fg=state_colors[state]))
                 step_no += k + 1
+
+    completion._update_index(('invocation', invoc_id) for invoc_id in invocation_ids)
+
+
+def _flatten(elements, path):
+    """
+    Yield (path, dataset id) for every dataset in a (possibly nested) collection.
+    """
+    for element in elements:
+        obj = element['object']
+        element_path = path + [download._safe_name(element['element_identifier'])]
+        if element.get('element_type') == 'dataset_collection':
+            for item in _flatten(obj.get('elements', []), element_path):
+                yield item
+        else:
+            yield element_path, obj['id']
+
+
+def _fetch_output(gi, ds_id, path):
+    dataset = gi.datasets.show_dataset(ds_id)
+    dest = os.path.join(*path[:-1], download._filename(path[-1], dataset))
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    return download._download_ranged(gi, dataset, dest, download.DEFAULT_CONNECTIONS)
+
+
+def _download_outputs(gi, invocation_id, dest, workers, poll_interval):
+    """
+    Wait for an invocation and download its outputs, each as soon as it is ok. Returns (downloaded paths, failures).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    outputs = {}  # dataset id -> path of the file it will be saved to, relative to dest
+    started = set()
+    failed_collections = set()  # never going to be populated, so not waited for
+    failures = []
+    with ThreadPoolExecutor(workers) as pool:
+        futures = {}
+        while True:
+            invocation = gi.invocations.show_invocation(invocation_id)
+            for label, output in invocation.get('outputs', {}).items():
+                outputs.setdefault(output['id'], [dest, label])
+            collections_populated = True
+            for label, output in invocation.get('output_collections', {}).items():
+                if output['id'] in failed_collections:
+                    continue
+                collection = gi.dataset_collections.show_dataset_collection(output['id'])
+                if collection.get('populated_state') == 'failed':
+                    failures.append((os.path.join(dest, download._safe_name(label)), 'collection could not be populated: {}'.format(
+                        collection.get('populated_state_message') or 'unknown error')))
+                    failed_collections.add(output['id'])
+                    continue
+                collections_populated &= collection.get('populated_state', 'ok') == 'ok'
+                for path, ds_id in _flatten(collection.get('elements', []), [dest, download._safe_name(label)]):
+                    outputs.setdefault(ds_id, path)
+
+            if set(outputs) - started:  # one request gives us the states of all datasets in the history
+                states = {ds['id']: ds['state'] for ds in gi.histories._get(id=invocation['history_id'], contents=True, params={'v': 'dev', 'keys': 'id,state'})}
+                for ds_id in set(outputs) - started:
+                    if states.get(ds_id) == 'ok':
+                        click.echo("Downloading {}".format(os.path.join(*outputs[ds_id])))
+                        futures[pool.submit(_fetch_output, gi, ds_id, outputs[ds_id])] = ds_id
+                        started.add(ds_id)
+                    elif states.get(ds_id) in download.FAILED_STATES:
+                        failures.append((os.path.join(*outputs[ds_id]), 'dataset state is {}'.format(states[ds_id])))
+                        started.add(ds_id)
+
+            if invocation['state'] in ('failed', 'cancelled'):
+                failures.append(('invocation {}'.format(invocation_id), 'invocation {}'.format(invocation['state'])))
+                break
+            if invocation['state'] == 'scheduled' and collections_populated and not set(outputs) - started:
+                break
+            time.sleep(poll_interval)
+
+        downloaded = []
+        for future, ds_id in futures.items():
+            try:
+                downloaded.append(future.result())
+            except Exception as e:  # e.g. a connection or checksum error - report it with the others
+                failures.append((os.path.join(*outputs[ds_id]), str(e)))
+    return downloaded, failures
+
+
+@click.command(name='download')
+@click.argument('invocation_id', autocompletion=completion._complete('invocation'))
+@click.option('--dest', '-d', default='.', help="Directory to save outputs to (default: current directory).")
+@click.option('--workers', '-w', default=4, type=int, help="Number of outputs to download at the same time (default: 4).")
+@click.option('--poll-interval', default=10, type=float, help="Seconds between checks on the invocation's progress (default: 10).")
+def download_(invocation_id, dest, workers, poll_interval):
+    """
+    Wait for an invocation to complete and download all its outputs, including collections.
+
+    Each output is downloaded as soon as it is ready, rather than when the whole invocation has finished. Interrupted downloads are resumed when the command is run again, and files are verified against Galaxy's checksums where available.
+    """
+    gi, cnfg, aliases = utils._login()
+    invocation_id = aliases.get(invocation_id, invocation_id)
+    downloaded, failures = _download_outputs(gi, invocation_id, dest, workers, poll_interval)
+    click.echo(click.style("{} outputs downloaded to {}".format(len(downloaded), dest), bold=True))
+    for name, reason in failures:
+        click.echo(click.style("Failed ", fg='red') + "{}: {}".format(name, reason))
+    if failures:
+        raise click.ClickException("{} outputs could not be downloaded.".format(len(failures)))
+
+
+@click.command()
+@click.argument('invocation_ids', nargs=-1, autocompletion=completion._complete('invocation'))
+@click.option('--workflow', '-w', 'workflow_id', default=None, autocompletion=completion._complete('workflow'), help="Only watch invocations of this workflow (ID or alias).")
+@click.option('--limit', default=200, type=int, help="Maximum number of recent invocations shown, if no IDs are given (default: 200).")
+@click.option('--interval', default=10, type=float, help="Seconds between polls of the server (default: 10).")
+@click.option('--sort', type=click.Choice(dashboard.SORTS), default=dashboard.SORTS[0], help="Initial sort order (default: started); press s to change it.")
+@click.option('--filter', 'filter_', type=click.Choice(dashboard.FILTERS), default=dashboard.FILTERS[0], help="Initial filter (default: all); press f to change it.")
+def watch(invocation_ids, workflow_id, limit, interval, sort, filter_):
+    """
+    Show a live, full-screen dashboard of invocations, one row each with a progress bar, job counts by state and elapsed time.
+
+    Watches the given INVOCATION_IDS (or aliases), or else the most recent invocations (of --workflow, if given). Press q to quit, s to sort, r to reverse, f to filter and j/k to scroll.
+
+    If output isn't a terminal, the table is printed once instead.
+    """
+    import sys
+
+    gi, cnfg, aliases = utils._login()
+    board = dashboard.Dashboard(gi, [aliases.get(id_, id_) for id_ in invocation_ids], aliases.get(workflow_id, workflow_id), limit)
+    board.sort, board.filter = sort, filter_
+    if sys.stdout.isatty():
+        dashboard._watch(board, interval)
+    else:
+        dashboard._print_once(board)
+    completion._update_index(('invocation', id_) for id_ in board.invocations)
+
+
+@click.command(name='export')
+@click.argument('dest')
+@click.option('--workflow', '-w', 'workflow_id', default=None, autocompletion=completion._complete('workflow'), help="Only export invocations of this workflow (ID or alias).")
+@click.option('--format', 'format_', type=click.Choice(['auto', 'parquet', 'csv']), default='auto', help="Parquet (needs pyarrow) or CSV; by default, Parquet if pyarrow is installed.")
+@click.option('--metrics', is_flag=True, help="Also fetch each job's metrics (runtime, slots and memory), which takes a request per job.")
+@click.option('--limit', default=100000, type=int, help="Maximum number of recent invocations considered (default: 100000).")
+@click.option('--workers', default=8, type=int, help="Number of requests to make at the same time (default: 8).")
+def export_(dest, workflow_id, format_, metrics, limit, workers):
+    """
+    Export finished invocations, with their steps and jobs and their timings, as tables in DEST for analysis.
+
+    Two tables are written: invocations, one row per invocation, and jobs, one row per job with its step, state and timings. With Parquet, these are the directories DEST/invocations and DEST/jobs, which each read as one table (e.g. with pandas.read_parquet); with CSV, the files DEST/invocations.csv and DEST/jobs.csv.
+
+    Invocations already in DEST are skipped, and invocations still running are left for a later export, so running the same export again appends only what is new.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if format_ == 'auto':
+        format_ = 'parquet' if export._have_pyarrow() else 'csv'
+    elif format_ == 'parquet' and not export._have_pyarrow():
+        raise click.ClickException("Exporting to Parquet needs pyarrow; install it with `pip install pyarrow`, or use --format csv.")
+
+    session = api.Session(*utils._login())
+    invocation_ids, running = [], 0
+    for invocation in api.invocations(workflow_id, jobs=False, limit=limit, session=session):
+        if invocation.state in dashboard.TERMINAL_INVOCATION_STATES:
+            invocation_ids.append(invocation.id)
+        else:
+            running += 1
+    with ThreadPoolExecutor(workers) as pool:
+        exported, jobs, unfinished = export._export(session.gi, invocation_ids, dest, format_, pool, metrics)
+    click.echo("Exported {} invocations ({} jobs) to {} as {}; {} not finished yet.".format(exported, jobs, dest, format_, running + unfinished))
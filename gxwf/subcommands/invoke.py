@@ -1,29 +1,40 @@
 import click
 import os
-import yaml
 import json
+import operator
 
-from bioblend import galaxy
-
-from requests import ConnectionError as RequestsConnectionError
-from bioblend import ConnectionError as BioblendConnectionError
-from yaml import SafeLoader
-
+from gxwf import api
 from gxwf import utils
+from gxwf import completion
+from gxwf import ledger
+from gxwf import mapping
 
-def _invoke(gi, inputs_dict, history):
-    click.echo(click.style("Invoking workflow...", bold=True))
-    # print(id, inputs_dict['inputs'], inputs_dict['params'], hist)
+def _create_history(gi, history):
     hid = gi.histories.create_history(history)['id']
     gi.histories.create_history_tag(hid, 'gxwf')
+    return hid
+
+def _invoke(gi, inputs_dict, history, history_id=None, run_ledger=None, reuse=True):
+    """
+    Invoke a workflow, in a new history with the given name, or in an existing one if history_id is given (see api._submit), reporting on it.
+    """
+    from bioblend import ConnectionError as BioblendConnectionError  # bioblend is imported lazily to keep shell completion fast
+    click.echo(click.style("Invoking workflow...", bold=True))
     try:
-        inv = gi.workflows.invoke_workflow(inputs_dict['wf_id'], inputs=inputs_dict['inputs'], params=inputs_dict['params'], history_id=hid)
+        run = api._submit(gi, inputs_dict, history, history_id, run_ledger, reuse)
     except (ConnectionError, BioblendConnectionError):
         click.echo('Invocation failed due to a ConnectionError. Check dataset IDs were specified correctly.')
-        gi.histories.delete_history(hid, purge=True)  # tidy up our mess
+        return None
+    if run.reused:
+        click.echo("An identical run already succeeded: invocation " + click.style(run.id, bold=True) + " (use --rerun to run it again)")
+    else:
+        completion._update_index([('invocation', run.id)])
+        click.echo("Invocation ID: " + click.style(run.id, bold=True) + " (use `gxwf invocations download` to fetch the outputs)")
+    return run._asdict()
 
 
 def _create_dict(gi, id_, wf, aliases, save_yaml=None):
+    from bioblend import ConnectionError as BioblendConnectionError
     inputs_dict = {'params': {}, 'inputs': {}}  # what is params actually used for? not clear from the docs
     click.echo(click.style("Enter inputs (dataset id):", bold=True))
     for inp in wf['inputs']:
@@ -38,24 +49,25 @@ def _create_dict(gi, id_, wf, aliases, save_yaml=None):
     inputs_dict['wf_id'] = id_
     if save_yaml:
         utils._write_to_file(inputs_dict, save_yaml)
-        with open(save_yaml, 'w') as f:
-            f.write(yaml.dump(inputs_dict)) 
         cont = click.prompt("Continue to run workflow? [y/n]")
         if cont not in ['y', 'Y']:
             return None
     return inputs_dict
 
 @click.command()
-@click.argument('id_')
+@click.argument('id_', autocompletion=completion._complete('workflow'))
 @click.option("--history", default='gxwf_history', help="Name to give history in which workflow will be executed (default: gxwf_history).")
 @click.option("--save-yaml", default=False, help="Save inputs as YAML, or perform a dry-run.")
-def from_params(id_, history, save_yaml):
+@click.option("--rerun", is_flag=True, help="Invoke the workflow even if an identical run has already succeeded.")
+def from_params(id_, history, save_yaml, rerun):
     """
     Invoke a workflow using its ID (or alias) and select datasets and parameters interactively.
 
     When prompted to give a value for an input, provide a ID or alias for a dataset, and text in whatever format (e.g. integer, string) is required for a parameter.
 
     A new history will be created for the invocation; this can be named using --history.
+
+    If an identical run has already succeeded, its invocation is reported instead, unless --rerun is given.
     """
     gi, cnfg, aliases = utils._login()
     id_ = aliases.get(id_, id_)  # if the user provided an alias, return the id; else assume they provided a raw id
@@ -76,19 +88,260 @@ def from_params(id_, history, save_yaml):
     if not inputs_dict:
         return
 
-    _invoke(gi, inputs_dict, history)
+    _invoke(gi, inputs_dict, history, run_ledger=ledger._load_ledger(cnfg), reuse=not rerun)
+
+
+def _pairs(values, option):
+    pairs = {}
+    for value in values:
+        if '=' not in value:
+            raise click.BadParameter("expected LABEL=VALUE, got {}".format(value), param_hint=option)
+        key, value = value.split('=', 1)
+        pairs[key] = value
+    return pairs
 
 
 @click.command()
-@click.argument("yaml_file")
+@click.argument('id_', metavar='WORKFLOW', autocompletion=completion._complete('workflow'))
+@click.option("--source-history", default=None, help="History to take the datasets and collections from (default: the gxwf history).")
+@click.option("--dir", 'directory', default=None, type=click.Path(exists=True, file_okay=False), help="Take the inputs from the files in this directory instead, uploading those used.")
+@click.option("--map", 'patterns', multiple=True, help="Name pattern for an input, as LABEL=PATTERN, where the * matches the sample, e.g. forward=*_R1.fastq.gz. Can be repeated.")
+@click.option("--param", 'params', multiple=True, help="Value for a parameter input, as LABEL=VALUE. Can be repeated.")
+@click.option("--history", default='gxwf_history', help="Name given to the history of each invocation, followed by its sample (default: gxwf_history).")
+@click.option("--save-yaml", default=None, help="Save the inputs of each sample as YAML files in this directory (for `gxwf invoke from-yaml`), rather than invoking the workflow.")
+@click.option("--workers", '-w', default=4, type=int, help="Number of uploads and invocations to submit at the same time (default: 4).")
+@click.option("--dry-run", '-n', is_flag=True, help="Only show how datasets would be mapped to inputs.")
+@click.option("--rerun", is_flag=True, help="Invoke the workflow even if an identical run has already succeeded.")
+def auto(id_, source_history, directory, patterns, params, history, save_yaml, workers, dry_run, rerun):
+    """
+    Invoke a workflow once for each sample of datasets in a history (or files in a directory), mapping them to its inputs automatically instead of prompting for them.
+
+    Datasets are mapped to an input if the input accepts their type and their names contain the input's label or a usual synonym of it (e.g. R1 or fwd for 'forward'), or match its pattern given with --map. The rest of the name (e.g. 'sampleA' of sampleA_R1.fastq.gz) is the sample. Inputs only one dataset maps to, such as a reference genome, are used for every sample; samples missing an input, or with several datasets for one, are reported and skipped.
+
+    Use --dry-run to check the mapping before running anything.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    gi, cnfg, aliases = utils._login()
+    id_ = aliases.get(id_, id_)
+    wf = gi.workflows.show_workflow(id_)
+    inputs = mapping._workflow_inputs(wf)
+    if directory:
+        candidates = mapping._directory_candidates(directory)
+    else:
+        source_history = aliases.get(source_history, source_history) if source_history else cnfg['hid']
+        candidates = mapping._history_candidates(gi, source_history)
+    result = mapping._map_inputs(inputs, mapping.CandidateIndex(candidates), _pairs(patterns, '--map'), _pairs(params, '--param'))
+    if result.missing:
+        raise click.ClickException("Nothing found for input{} {}.".format('s' if len(result.missing) > 1 else '', ', '.join(result.missing)))
+    if result.ambiguous:
+        raise click.ClickException("Can't tell which datasets go to inputs {}, as none are named like them; give a pattern for each with --map.".format(
+            ', '.join(result.ambiguous)))
+    for sample, problem in sorted(result.skipped.items()):
+        click.echo(click.style("Skipping sample {}: {}".format(sample, problem), fg='yellow'))
+    if not result.runs:
+        raise click.ClickException("No complete samples found.")
+
+    click.echo(click.style("Workflow selected: ", bold=True) + wf['name'])
+    labels = {inp.index: inp.label for inp in inputs}
+    if dry_run:
+        rows = [(sample or '-', labels[index], value.name if isinstance(value, mapping.Candidate) else value, value.id if isinstance(value, mapping.Candidate) else '')
+                for sample, run in sorted(result.runs.items()) for index, value in sorted(run.items(), key=lambda item: int(item[0]))]
+        utils._tabulate_rows([(header, operator.itemgetter(n)) for n, header in enumerate(('Sample', 'Input', 'Dataset', 'ID'))], rows)
+        return
+
+    with ThreadPoolExecutor(workers) as pool:
+        files = sorted({value for run in result.runs.values() for value in run.values() if isinstance(value, mapping.Candidate) and value.src == 'file'})
+        if files:
+            click.echo(click.style("Uploading {} files...".format(len(files)), bold=True))
+        uploads = pool.map(lambda f: api._upload_dataset(gi, cnfg, f.id, f.extension if f.extension in mapping.SUFFIXES.values() else 'auto'), files)
+        uploaded = {f.id: upload.id for f, upload in zip(files, uploads)}
+        inputs_dicts = {sample: mapping._inputs_dict(id_, run, uploaded) for sample, run in result.runs.items()}
+
+        if save_yaml:
+            os.makedirs(save_yaml, exist_ok=True)
+            for sample, inputs_dict in sorted(inputs_dicts.items()):
+                utils._write_to_file(inputs_dict, os.path.join(save_yaml, '{}.yml'.format(sample or 'inputs')))
+            click.echo("Saved inputs of {} samples to {}.".format(len(inputs_dicts), save_yaml))
+            return
+
+        run_ledger = ledger._load_ledger(cnfg)
+        list(pool.map(lambda item: _invoke(gi, item[1], '{} {}'.format(history, item[0]).strip(), run_ledger=run_ledger, reuse=not rerun),
+                      sorted(inputs_dicts.items())))
+
+
+@click.command()
+@click.argument("yaml_files", nargs=-1, required=True)
 @click.option("--history", default='gxwf_history', help="Name to give history in which workflow will be executed (default: gxwf_history).")
+@click.option("--single-history", is_flag=True, help="Run all invocations in one shared history, rather than one history each.")
+@click.option("--workers", '-w', default=4, type=int, help="Number of invocations to submit at the same time (default: 4).")
+@click.option("--rerun", is_flag=True, help="Invoke the workflow even if an identical run has already succeeded.")
 # @click.option("--yaml", required=True, help="YAML file containing parameters for workflow to be run")
-def from_yaml(yaml_file, history):
+def from_yaml(yaml_files, history, single_history, workers, rerun):
     """
     Invoke a workflow from a YAML file containing all parameters (workflow ID, inputs, etc...). This YAML file can be generated using `gxwf invoke ... --save_yaml`.
+
+    Several YAML files can be given to submit a batch of invocations at once; use --single-history to run them all in the same history.
+
+    Runs are recorded in a local ledger (see `gxwf runs`). If an identical run - same workflow version, inputs and parameters - has already succeeded, its invocation is reported instead of invoking the workflow again, unless --rerun is given.
     """
+    import yaml
+    from concurrent.futures import ThreadPoolExecutor
+
     gi, cnfg, aliases = utils._login()
-    with open(yaml_file) as f:
-        inputs_dict = yaml.load(f, Loader=SafeLoader)
-    
-    _invoke(gi, inputs_dict, history)
\ No newline at end of file
+    inputs_dicts = []
+    for yaml_file in yaml_files:
+        with open(yaml_file) as f:
+            inputs_dicts.append(yaml.safe_load(f))
+
+    history_id = _create_history(gi, history) if single_history else None
+    with ThreadPoolExecutor(workers) as pool:
+        run_ledger = ledger._load_ledger(cnfg)
+        list(pool.map(lambda inputs_dict: _invoke(gi, inputs_dict, history, history_id, run_ledger, reuse=not rerun), inputs_dicts))
+
+def _sweep_values(spec):
+    """
+    The values a swept parameter takes: a list, a {range: [start, stop, step]} (stop included) or a single value.
+    """
+    if isinstance(spec, dict) and 'range' in spec:
+        bounds = spec['range']
+        if not (isinstance(bounds, list) and len(bounds) == 3 and all(isinstance(v, (int, float)) for v in bounds)):
+            raise click.BadParameter("a range must be [start, stop, step], got {}".format(bounds))
+        start, stop, step = bounds
+        if step == 0 or (stop - start) * step < 0:
+            raise click.BadParameter("range {} never reaches its stop; its step must be non-zero and go from start towards stop".format(bounds))
+        count = int((stop - start) / step + 1e-9) + 1  # allow for floating point error, so stop is included
+        values = [start + n * step for n in range(count)]
+        return values if all(isinstance(v, int) for v in (start, stop, step)) else [round(v, 10) for v in values]
+    return list(spec) if isinstance(spec, list) else [spec]
+
+
+def _sweep_axes(sweep, aliases):
+    """
+    Flatten the `sweep` section of a sweep YAML into a list of ((section, step or input, name), values) axes.
+    """
+    axes = []
+    for step, params in (sweep.get('params') or {}).items():
+        for name, spec in params.items():
+            axes.append((('params', str(step), name), _sweep_values(spec)))
+    for inp, spec in (sweep.get('inputs') or {}).items():
+        values = [{'src': 'hda', 'id': aliases.get(v, v)} if isinstance(v, str) else v for v in _sweep_values(spec)]  # datasets by ID or alias
+        axes.append((('inputs', str(inp), None), values))
+    return axes
+
+
+def _combination(axes, n):
+    """
+    The n-th combination of the cartesian product of the axes, found without enumerating the ones before it.
+    """
+    values = []
+    for key, axis in reversed(axes):
+        n, i = divmod(n, len(axis))
+        values.append((key, axis[i]))
+    return list(reversed(values))
+
+
+def _apply_combination(base, combination):
+    inputs_dict = json.loads(json.dumps(base))  # a deep copy
+    inputs_dict.setdefault('params', {})
+    inputs_dict.setdefault('inputs', {})
+    for (section, key, name), value in combination:
+        if section == 'params':
+            inputs_dict['params'].setdefault(key, {})[name] = value
+        else:
+            inputs_dict['inputs'][key] = value
+    return inputs_dict
+
+
+def _combination_key(inputs_dict):
+    """
+    Identify a run by everything which is submitted for it, so the same run is recognised however it was specified.
+    """
+    import hashlib
+
+    run = {k: inputs_dict.get(k) for k in ('wf_id', 'inputs', 'params')}
+    return hashlib.sha1(json.dumps(run, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _write_results(results, path):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+@click.command()
+@click.argument("sweep_file")
+@click.option("--history", default='gxwf_sweep', help="Name given to the history of each invocation, followed by its number (default: gxwf_sweep).")
+@click.option("--sample", type=int, default=None, help="Only run this many combinations, chosen at random.")
+@click.option("--seed", type=int, default=None, help="Random seed for --sample, so the same subset can be chosen again.")
+@click.option("--results", default=None, help="JSON file mapping each combination to its invocation (default: SWEEP_FILE with a .results.json extension).")
+@click.option("--workers", '-w', default=4, type=int, help="Number of invocations to submit at the same time (default: 4).")
+@click.option("--dry-run", '-n', is_flag=True, help="Only show the combinations which would be submitted.")
+@click.option("--rerun", is_flag=True, help="Invoke the workflow even if an identical run has already succeeded.")
+def sweep(sweep_file, history, sample, seed, results, workers, dry_run, rerun):
+    """
+    Invoke a workflow once for each combination of parameter values in a sweep YAML file.
+
+    The file is like the YAML used by `gxwf invoke from-yaml`, with an extra `sweep` section giving the values to try for parameters (under `params`, by step and name, as in `params`) and inputs (under `inputs`, by input, as dataset IDs or aliases). Values are a list or a range, e.g.
+
+        sweep: {params: {"3": {threshold: {range: [0.1, 0.5, 0.1]}, mode: [fast, exact]}}}
+
+    All combinations are run, or a random --sample of them. Combinations already recorded in the results file with an invocation are skipped, so an interrupted or extended sweep can simply be run again.
+    """
+    import random
+    import threading
+    import yaml
+    from concurrent.futures import ThreadPoolExecutor
+
+    with open(sweep_file) as f:
+        spec = yaml.safe_load(f)
+    cnfg, aliases = utils._read_login()
+    spec['wf_id'] = aliases.get(spec['wf_id'], spec['wf_id'])
+    axes = _sweep_axes(spec.pop('sweep', None) or {}, aliases)
+
+    total = 1
+    for key, axis in axes:
+        total *= len(axis)
+    numbers = range(total) if sample is None or sample >= total else sorted(random.Random(seed).sample(range(total), sample))
+
+    results_path = results or os.path.splitext(sweep_file)[0] + '.results.json'
+    try:
+        with open(results_path) as f:
+            done = json.load(f)
+    except FileNotFoundError:
+        done = {}
+
+    runs, submitted, duplicates = {}, set(), 0  # identical combinations (e.g. of overlapping ranges) are run once
+    for n in numbers:
+        combination = _combination(axes, n)
+        inputs_dict = _apply_combination(spec, combination)
+        key = _combination_key(inputs_dict)
+        if key in runs or key in submitted:
+            duplicates += 1
+        elif (done.get(key) or {}).get('invocation_id'):
+            submitted.add(key)
+        else:
+            runs[key] = (combination, inputs_dict)
+    click.echo("{} combinations, {} to submit ({} already submitted{}).".format(
+        len(numbers), len(runs), len(submitted), ', {} duplicates'.format(duplicates) if duplicates else ''))
+    if dry_run:
+        for combination, inputs_dict in runs.values():
+            click.echo(', '.join('{}={}'.format('.'.join(k for k in key[1:] if k), json.dumps(value)) for key, value in combination))
+        return
+
+    gi, cnfg, aliases = utils._login()
+    run_ledger = ledger._load_ledger(cnfg)
+    lock = threading.Lock()
+
+    def submit(item):
+        n, (key, (combination, inputs_dict)) = item
+        inv = _invoke(gi, inputs_dict, '{} {}'.format(history, n + 1), run_ledger=run_ledger, reuse=not rerun)
+        with lock:  # record each invocation as soon as it is made, so nothing is submitted twice if the sweep is interrupted
+            done[key] = {'values': {'.'.join(k for k in ck[1:] if k): value for ck, value in combination},
+                         'invocation_id': inv['id'] if inv else None, 'history_id': inv['history_id'] if inv else None}
+            _write_results(done, results_path)
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(submit, enumerate(runs.items())))
+    failed = sum(1 for key in runs if not done[key]['invocation_id'])
+    click.echo("Results saved to {}{}.".format(results_path, "; {} submissions failed and will be retried next time".format(failed) if failed else ''))
@@ -1,31 +1,42 @@
-import click
-import os
-import yaml
-
-from bioblend import galaxy
-
-from requests import ConnectionError as RequestsConnectionError
-from bioblend import ConnectionError as BioblendConnectionError
-from yaml import SafeLoader
-
 from gxwf import utils
+from gxwf import api
+from gxwf import cache
+from gxwf import completion
+from gxwf import search as search_index
+from gxwf.api import Workflow
+
+def _fetch_workflows(index, public, search, no_cache):
+    """
+    Fetch workflows from the server, updating the local index with them.
+    """
+    workflows = list(api.workflows(public, search if no_cache else None))  # parsed as they arrive, straight into Workflow tuples
+    if search and no_cache:  # the server did the filtering, so only matching workflows were sent
+        index.update(workflows)  # a partial listing, but still worth keeping
+        index.save()
+        return workflows
+    index.update(workflows, complete=True)
+    index.save()
+    return index.search(search, row=Workflow) if search else workflows
 
-def list_workflows(public, search):
-    gi, cnfg, aliases = utils._login()
+def list_workflows(public, search, refresh=False, no_cache=False, offline=False):
+    cnfg, aliases = utils._read_login()
     aliases_inverted = {v: k for k, v in aliases.items()}  # need this below
-    if search:
-        workflows = [wf for wf in gi.workflows.get_workflows(published=public) if search in wf['name'] or search in wf['owner']] 
+    index = search_index._load_index(cnfg, 'workflows_published' if public else 'workflows', Workflow._fields)
+    collection = 'published' if public else 'workflows'  # as named by `gxwf sync`
+
+    if offline or (len(index) and not refresh and not no_cache):  # serve the local store, refreshing it in the background if needed
+        workflows = cache._records(index, search, Workflow)
+        cache._cached(index, cnfg, collection, offline)
     else:
-        workflows = gi.workflows.get_workflows(published=public)
+        try:
+            workflows = _fetch_workflows(index, public, search, no_cache)
+        except cache._connection_errors() as e:
+            if not len(index):
+                raise
+            workflows = cache._records(index, search, Workflow)
+            cache._cached(index, cnfg, collection, offline, error=e)
 
-    wf_name, wf_id, wf_alias, steps, owner = ['Workflow name'], ['ID'], ['Alias'], ['Steps'], ['Owner']
     # do we need separate id / alias columns? if we make sure everything can be done via alias
-
-    for wf in workflows:
-        wf_name.append(wf['name'])
-        wf_id.append(wf['id'])
-        wf_alias.append(aliases_inverted.get(wf['id'], ''))
-        steps.append(str(wf['number_of_steps']))
-        owner.append(wf['owner'])
-
-    utils._tabulate([wf_name, wf_id, wf_alias, steps, owner])
\ No newline at end of file
+    completion._update_index(('workflow', wf.id) for wf in workflows)
+    utils._tabulate_rows([('Workflow name', 'name'), ('ID', 'id'), ('Alias', lambda wf: aliases_inverted.get(wf.id, '')),
+                          ('Steps', 'number_of_steps'), ('Owner', 'owner')], workflows)
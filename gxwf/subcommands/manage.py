@@ -1,38 +1,61 @@
 import click
 import os
-import yaml
-
-from bioblend import galaxy
-
-from requests import ConnectionError as RequestsConnectionError
-from yaml import SafeLoader
 
 from gxwf import utils
 
 
 def _open_cnfg():
     try:
-        with open(utils.CONFIG_PATH, "r") as f:
-            return yaml.load(f.read(), Loader=SafeLoader)
+        return utils._load_config()
 
     except FileNotFoundError:
         return {'active_login': None, 'logins': {}, 'aliases': {}}
 
 
+def _policy_options(f):
+    """
+    Options configuring the retry, circuit breaking and rate limiting policy of a login (see gxwf.policy).
+    """
+    options = [
+        click.option("--retries", type=int, help="Number of times to retry a failed request (default: 4)."),
+        click.option("--backoff", type=float, help="Seconds to wait before the first retry, doubled for each retry after (default: 1)."),
+        click.option("--max-backoff", type=float, help="Longest wait between retries, in seconds (default: 60)."),
+        click.option("--failure-threshold", type=int, help="Consecutive failures after which gxwf stops sending requests to the server for a while (default: 8)."),
+        click.option("--reset-timeout", type=float, help="Seconds to wait before trying the server again after that (default: 60)."),
+        click.option("--rate", type=float, help="Maximum requests per second sent to the server, by all gxwf processes together (default: no limit)."),
+        click.option("--burst", type=int, help="Requests which may be sent at once after a pause, within the rate limit (default: the rate)."),
+        click.option("--max-in-flight", type=int, help="Maximum requests waiting for a response at once (default: no limit)."),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _policy(settings):
+    return {k: v for k, v in settings.items() if v is not None}
+
+
 @click.command()
 @click.option("--url", required=True, help="URL of Galaxy server")
 @click.option("--api-key", required=True, help="API key")
 @click.option("--name", required=True, help="Provide a handy name to refer to a login")
-def add_login(url, api_key, name):
+@_policy_options
+def add_login(url, api_key, name, **policy_settings):
     """
     Add a new login to the gxwf config file, specifying URL of the Galaxy server you want to log in to, the API key for your account, and a handy name to refer to the login with.
     
     When a new login is added, a new history with the name `GXWF datasets` is also created to store datasets used or created by GXWF.
+
+    Failed requests to the server are retried; how often and how patiently can be set with the options below, or later with `gxwf manage set-policy`. If the server's admins ask you to limit requests, use --rate and --max-in-flight: the limits hold across all gxwf commands running on this machine.
     """
+    from gxwf import policy  # imports bioblend, which is imported lazily to keep shell completion fast
+    from requests import ConnectionError as RequestsConnectionError
+
     login_dict = _open_cnfg()
+    login = {'url': url, 'api_key': api_key, 'policy': _policy(policy_settings)}
 
     try:
-        gi = galaxy.GalaxyInstance(url=url, key=api_key)
+        gi = policy._galaxy_instance(login)
         hid = gi.histories.create_history(name='GXWF datasets')['id']
         gi.histories.create_history_tag(hid, 'gxwf')
     except (ConnectionError, RequestsConnectionError) as e:
@@ -41,7 +64,10 @@ def add_login(url, api_key, name):
         if name in login_dict['logins']:
             click.echo('A login already exists with the name: {}. Please choose another, or first delete the existing login using `gxwf manage delete`.'.format(name))
             return
-        login_dict['logins'][name] = {'url': url, 'api_key': api_key, 'hid': hid}
+        login['hid'] = hid
+        if not login['policy']:
+            del login['policy']  # use the defaults
+        login_dict['logins'][name] = login
         login_dict['active_login'] = name  # automatically switch to the new login
         click.echo("New login {} created.".format(name))
     utils._write_to_file(login_dict)
@@ -77,6 +103,28 @@ def switch(name):
         click.echo('Sorry, no login is recorded under the name {}.'.format(name))
     utils._write_to_file(login_dict)
 
+@click.command()
+@click.argument('name')
+@_policy_options
+def set_policy(name, **policy_settings):
+    """
+    Change how failed requests to the server are retried, and how requests are limited, for a login, referencing its name.
+
+    Settings which are not given are left as they are; run without any to show the current policy.
+    """
+    from gxwf.policy import DEFAULT_POLICY  # doesn't contact the server, but imports bioblend
+
+    login_dict = _open_cnfg()
+    if name not in login_dict['logins']:
+        click.echo('Sorry, no login is recorded under the name {}.'.format(name))
+        return
+    login = login_dict['logins'][name]
+    login['policy'] = dict(login.get('policy') or {}, **_policy(policy_settings))
+    for setting, default in DEFAULT_POLICY.items():
+        value = login['policy'].get(setting, default)
+        click.echo(click.style("{}: ".format(setting), bold=True) + (str(value) if value is not None else 'not set'))
+    utils._write_to_file(login_dict)
+
 @click.command()
 @click.argument('name') #, required=True, help="Switch to a different login, referencing its name.")
 def delete(name):
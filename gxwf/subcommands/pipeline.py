@@ -0,0 +1,250 @@
+import click
+import operator
+import os
+import time
+
+from gxwf import utils
+from gxwf import download
+from gxwf import dashboard
+from gxwf import ledger
+from gxwf import cache
+from gxwf.subcommands import invoke as invoke_commands
+from gxwf.subcommands import invocations as invocation_commands
+
+
+def _load_spec(spec, aliases):
+    """
+    Check a pipeline spec and resolve its aliases, returning {step name: inputs dict}, each with the steps it takes inputs from under 'after'.
+    """
+    steps = spec.get('steps') or {}
+    if not steps:
+        raise click.ClickException("The pipeline has no steps.")
+    resolved = {}
+    for name, step in steps.items():
+        if not isinstance(step, dict) or 'workflow' not in step:
+            raise click.ClickException("Step {} does not give a workflow.".format(name))
+        inputs, after = {}, set()
+        for inp, value in (step.get('inputs') or {}).items():
+            if isinstance(value, dict) and 'from' in value:
+                if str(value['from']) not in map(str, steps):
+                    raise click.ClickException("Step {} takes input {} from an unknown step: {}".format(name, inp, value['from']))
+                if 'output' not in value:
+                    raise click.ClickException("Step {} takes input {} from step {}, but does not say which output.".format(name, inp, value['from']))
+                after.add(str(value['from']))
+                value = {'from': str(value['from']), 'output': value['output']}
+            elif isinstance(value, str):  # a dataset ID or alias
+                value = {'src': 'hda', 'id': aliases.get(value, value)}
+            elif isinstance(value, dict) and 'id' in value:
+                value = dict(value, id=aliases.get(value['id'], value['id']))
+            inputs[str(inp)] = value
+        resolved[str(name)] = {'wf_id': aliases.get(step['workflow'], step['workflow']), 'inputs': inputs, 'params': step.get('params') or {}, 'after': after}
+    _stages(resolved)  # raises if the steps can't be ordered
+    return resolved
+
+
+def _stages(steps):
+    """
+    Group steps into stages, each taking inputs only from earlier ones; steps in the same stage are independent.
+    """
+    stages, placed = [], set()
+    while len(placed) < len(steps):
+        stage = sorted(name for name, step in steps.items() if name not in placed and step['after'] <= placed)
+        if not stage:
+            raise click.ClickException("The pipeline has a cycle between the steps {}.".format(', '.join(sorted(set(steps) - placed))))
+        stages.append(stage)
+        placed.update(stage)
+    return stages
+
+
+class Scheduler(object):
+    """
+    Runs the steps of a pipeline, submitting each as soon as all the upstream outputs it takes are ready, rather than
+    when the upstream invocations have finished; independent steps are submitted together.
+
+    Only the invocations of steps which others are still waiting for are polled. With eager set, outputs are handed
+    off as soon as they exist, leaving Galaxy to hold the downstream jobs until their inputs are ok.
+    """
+
+    def __init__(self, gi, steps, history, history_id=None, run_ledger=None, reuse=True, eager=False):
+        self.gi = gi
+        self.steps = steps
+        self.history = history
+        self.history_id = history_id
+        self.run_ledger = run_ledger
+        self.reuse = reuse
+        self.eager = eager
+        self.pending = dict(steps)  # step name -> inputs dict, for steps not submitted yet
+        self.runs = {}  # step name -> invocation (as returned by _invoke)
+        self.invocations = {}  # step name -> invocation as last polled
+        self.blocked = {}  # step name -> why it can't be run
+
+    def _states(self, history_id, states):
+        if history_id not in states:  # one request gives us the states of all datasets in the history
+            states[history_id] = {ds['id']: ds['state'] for ds in self.gi.histories._get(id=history_id, contents=True, params={'v': 'dev', 'keys': 'id,state'})}
+        return states[history_id]
+
+    def _output(self, name, label, states):
+        """
+        Resolve an output of a step's invocation to an input: returns (input, None) if it is ready, (None, None) if not
+        yet, or (None, reason) if it never will be. states caches dataset states by history for this cycle.
+        """
+        if name in self.blocked:
+            return None, 'step {} could not be run'.format(name)
+        invocation = self.invocations.get(name)
+        if invocation is None:  # not submitted, or not polled yet
+            return None, None
+        if label in invocation.get('outputs', {}):
+            value = {'src': 'hda', 'id': invocation['outputs'][label]['id']}
+            dataset_ids = [value['id']]
+        elif label in invocation.get('output_collections', {}):
+            value = {'src': 'hdca', 'id': invocation['output_collections'][label]['id']}
+            if self.eager:
+                return value, None
+            collection = self.gi.dataset_collections.show_dataset_collection(value['id'])
+            if collection.get('populated_state', 'ok') == 'failed':
+                return None, 'output {} of step {} could not be populated'.format(label, name)
+            if collection.get('populated_state', 'ok') != 'ok':
+                return None, None
+            dataset_ids = [ds_id for path, ds_id in invocation_commands._flatten(collection.get('elements', []), [])]
+        elif invocation['state'] in ('failed', 'cancelled'):
+            return None, 'the invocation of step {} was {}'.format(name, invocation['state'])
+        elif invocation['state'] in dashboard.TERMINAL_INVOCATION_STATES:
+            return None, 'step {} has no output {}'.format(name, label)
+        else:  # still being scheduled
+            return None, None
+
+        if self.eager:
+            return value, None
+        history_states = self._states(invocation['history_id'], states)
+        failed = [ds_id for ds_id in dataset_ids if history_states.get(ds_id) in download.FAILED_STATES]
+        if failed:
+            return None, 'output {} of step {} is {}'.format(label, name, history_states[failed[0]])
+        if all(history_states.get(ds_id) == 'ok' for ds_id in dataset_ids):
+            return value, None
+        return None, None
+
+    def _ready(self, name, step, states):
+        """
+        Return the inputs dict to submit a step with, if all its inputs are ready, else None.
+        """
+        inputs = {}
+        for inp, value in step['inputs'].items():
+            if isinstance(value, dict) and 'from' in value:
+                value, reason = self._output(value['from'], value['output'], states)
+                if reason:
+                    self.blocked[name] = reason
+                    del self.pending[name]
+                    return None
+                if value is None:
+                    return None
+            inputs[inp] = value
+        return {'wf_id': step['wf_id'], 'inputs': inputs, 'params': step['params']}
+
+    def _submit(self, item):
+        name, inputs_dict = item
+        click.echo(click.style("Step {}: ".format(name), bold=True) + "all inputs ready")
+        return invoke_commands._invoke(self.gi, inputs_dict, '{} {}'.format(self.history, name), self.history_id, self.run_ledger, self.reuse)
+
+    def _poll(self, name):
+        try:
+            return self.gi.invocations.show_invocation(self.runs[name]['id'])
+        except cache._connection_errors() as e:
+            click.echo(click.style("Step {}: ".format(name), bold=True) + "could not poll its invocation ({}), retrying".format(e), err=True)
+            return None
+
+    def give_up(self, reason):
+        """
+        Stop waiting: the steps not submitted yet are blocked with the given reason.
+        """
+        for name in self.pending:
+            self.blocked[name] = reason
+        self.pending.clear()
+
+    def cycle(self, pool):
+        """
+        Poll the invocations other steps are waiting for, then submit every step whose inputs are all ready. Returns the steps submitted.
+        """
+        watched = sorted({upstream for step in self.pending.values() for upstream in step['after'] if upstream in self.runs})
+        for name, invocation in zip(watched, pool.map(self._poll, watched)):
+            if invocation is not None:  # else keep what was polled before, and try again next cycle
+                self.invocations[name] = invocation
+
+        states = {}
+        ready = []
+        for name, step in sorted(self.pending.items()):
+            try:
+                inputs_dict = self._ready(name, step, states)
+            except cache._connection_errors() as e:  # a passing failure shouldn't stop the pipeline, so try again next cycle
+                click.echo(click.style("Step {}: ".format(name), bold=True) + "could not check its inputs ({}), retrying".format(e), err=True)
+                continue
+            if inputs_dict is not None:
+                ready.append((name, inputs_dict))
+        for name, inputs_dict in ready:
+            del self.pending[name]
+        for (name, inputs_dict), invocation in zip(ready, pool.map(self._submit, ready)):
+            if invocation is None:
+                self.blocked[name] = 'the invocation could not be submitted'
+            else:
+                self.runs[name] = invocation
+        return [name for name, inputs_dict in ready]
+
+
+@click.command()
+@click.argument("spec_file")
+@click.option("--history", default=None, help="Name given to the history of each step, followed by the step name (default: the pipeline's `history`, else the spec file name).")
+@click.option("--single-history", is_flag=True, help="Run all steps in one shared history, rather than one history each.")
+@click.option("--eager", is_flag=True, help="Hand each output on as soon as it exists, rather than once it is ok; Galaxy holds the downstream jobs until their inputs are ready.")
+@click.option("--poll-interval", default=10, type=float, help="Seconds between checks on upstream outputs (default: 10).")
+@click.option("--timeout", default=None, type=float, help="Give up on steps still waiting for their inputs after this many seconds (default: wait as long as it takes).")
+@click.option("--workers", '-w', default=4, type=int, help="Number of requests to make at the same time (default: 4).")
+@click.option("--dry-run", '-n', is_flag=True, help="Only check the pipeline and show the order its steps can run in.")
+@click.option("--rerun", is_flag=True, help="Invoke each workflow even if an identical run has already succeeded.")
+def pipeline(spec_file, history, single_history, eager, poll_interval, timeout, workers, dry_run, rerun):
+    """
+    Run a pipeline of workflows, where outputs of one workflow are inputs of the next, given as a YAML file, e.g.
+
+    \b
+        steps:
+          qc:
+            workflow: qc_workflow
+            inputs: {"0": reads_alias}
+          align:
+            workflow: align_workflow
+            inputs: {"0": {from: qc, output: trimmed_reads}, "1": reference_alias}
+            params: {"2": {min_quality: 20}}
+
+    Workflows and dataset inputs are given by ID or alias, and upstream outputs by step and output label. Each step is invoked as soon as the upstream outputs it needs are ready, so steps not depending on each other run in parallel, and a step doesn't wait for unrelated outputs of the steps before it.
+
+    Runs are recorded in the local ledger, so when a pipeline is run again, steps which already succeeded with the same inputs are reused rather than run again, unless --rerun is given. Use `gxwf wait` to wait for the last invocations to finish. Passing connection errors while polling are retried on the next check; use --timeout to stop waiting for inputs which never become ready.
+    """
+    import yaml
+    from concurrent.futures import ThreadPoolExecutor
+
+    with open(spec_file) as f:
+        spec = yaml.safe_load(f) or {}
+    cnfg, aliases = utils._read_login()
+    steps = _load_spec(spec, aliases)
+    if dry_run:
+        for n, stage in enumerate(_stages(steps)):
+            click.echo(click.style("Stage {}: ".format(n + 1), bold=True) + ', '.join(stage))
+        return
+
+    gi, cnfg, aliases = utils._login()
+    history = history or spec.get('history') or os.path.splitext(os.path.basename(spec_file))[0]
+    history_id = invoke_commands._create_history(gi, history) if single_history else None
+    scheduler = Scheduler(gi, steps, history, history_id, ledger._load_ledger(cnfg), reuse=not rerun, eager=eager)
+    deadline = time.time() + timeout if timeout is not None else None
+    with ThreadPoolExecutor(workers) as pool:
+        while scheduler.pending:
+            if not scheduler.cycle(pool) and scheduler.pending:
+                if deadline is not None and time.time() >= deadline:
+                    scheduler.give_up('timed out waiting for its inputs')
+                    break
+                time.sleep(poll_interval if deadline is None else max(0, min(poll_interval, deadline - time.time())))
+
+    rows = [(name, steps[name]['wf_id'], scheduler.runs[name]['id'] if name in scheduler.runs else '',
+             'reused' if scheduler.runs.get(name, {}).get('reused') else 'submitted' if name in scheduler.runs else scheduler.blocked[name])
+            for stage in _stages(steps) for name in stage]
+    utils._tabulate_rows([(header, operator.itemgetter(n)) for n, header in enumerate(('Step', 'Workflow', 'Invocation', 'Status'))], rows)
+    if scheduler.blocked:
+        raise click.ClickException("{} steps could not be run.".format(len(scheduler.blocked)))
@@ -0,0 +1,70 @@
+import click
+import operator
+
+from gxwf import utils
+from gxwf import completion
+from gxwf import dashboard
+from gxwf import profiling
+
+
+def _targets(gi, id_, last):
+    """
+    The invocations to profile: the one given, or else the last finished invocations of the workflow given. Returns (invocation ids, whether id_ was an invocation).
+    """
+    from bioblend import ConnectionError as BioblendConnectionError
+
+    try:
+        return [gi.invocations.show_invocation(id_)['id']], True
+    except BioblendConnectionError:  # not an invocation, so try it as a workflow
+        pass
+    invocations = gi.invocations.get_invocations(workflow_id=id_, limit=last * 4)  # some will still be running
+    finished = [inv['id'] for inv in invocations if inv['state'] in dashboard.TERMINAL_INVOCATION_STATES]
+    return finished[:last], False
+
+
+def _elapsed(seconds):
+    return '' if seconds is None else dashboard._format_elapsed(seconds)
+
+
+@click.command()
+@click.argument('id_', metavar='INVOCATION|WORKFLOW', autocompletion=completion._complete('invocation', 'workflow'))
+@click.option('--last', default=20, type=int, help="Number of recent finished invocations to profile, if a workflow is given (default: 20).")
+@click.option('--workers', default=8, type=int, help="Number of requests to make at the same time (default: 8).")
+def profile(id_, last, workers):
+    """
+    Profile the steps of an invocation, or of the recent invocations of a workflow, from their jobs' metrics, to find which steps make it slow.
+
+    For each step, shows the median and 95th percentile of its jobs' runtime and of the time they spent waiting (queued or staging data), and the median cores and 95th percentile of memory they used. Steps on the critical path - the longest chain of steps, which running more jobs in parallel can't shorten - are marked with their share of it, and the biggest one is reported as the bottleneck.
+
+    An invocation which is still running is profiled as far as it has got. Statistics are computed with numpy if it is installed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    gi, cnfg, aliases = utils._login()
+    invocation_ids, single = _targets(gi, aliases.get(id_, id_), last)
+    if not invocation_ids:
+        raise click.ClickException("No finished invocations found for {}.".format(id_))
+    with ThreadPoolExecutor(workers) as pool:
+        stats, weights, path, total, profiled = profiling._profile(gi, invocation_ids, pool, partial=single)
+    if not stats:
+        raise click.ClickException("No jobs found to profile.")
+
+    on_path = set(path)
+    rows = []
+    for index, step in sorted(stats.items()):
+        runtime = step.get('runtime_seconds', (None, None))
+        wait = step.get('wait_seconds', (None, None))
+        share = '{:.0%}'.format(weights.get(index, 0.0) / total) if index in on_path and total else ''
+        rows.append((index, step['label'] or step['tool_id'] or '', step['jobs'], _elapsed(runtime[0]), _elapsed(runtime[1]),
+                     _elapsed(wait[0]), _elapsed(wait[1]), '' if step.get('galaxy_slots') is None else '{:g}'.format(step['galaxy_slots'][0]),
+                     '' if step.get('memory_mb') is None else '{:.0f}'.format(step['memory_mb'][1]), share))
+    headers = ('Step', 'Name', 'Jobs', 'Runtime', 'p95', 'Waiting', 'p95', 'Cores', 'Memory (MB)', 'Critical')
+    click.echo(click.style("Profile of {} invocation{}".format(profiled, 's' if profiled != 1 else ''), bold=True))
+    utils._tabulate_rows([(header, operator.itemgetter(n)) for n, header in enumerate(headers)], rows)
+
+    if path and total:
+        click.echo("\nCritical path: {} ({})".format(' > '.join(str(index) for index in path), _elapsed(total)))
+        bottleneck = max(path, key=lambda index: weights.get(index, 0.0))
+        step = stats.get(bottleneck, {})
+        click.echo(click.style("Bottleneck: step {} ({}), {:.0%} of the critical path".format(
+            bottleneck, step.get('label') or step.get('tool_id') or 'no jobs', weights[bottleneck] / total), fg='red', bold=True))
@@ -0,0 +1,53 @@
+import click
+import json
+
+from gxwf import utils
+from gxwf import completion
+from gxwf import ledger
+
+
+def _describe_inputs(inputs, aliases_inverted):
+    described = []
+    for name, value in sorted(inputs.items()):
+        value = value.get('id') if isinstance(value, dict) else value
+        described.append('{}={}'.format(name, aliases_inverted.get(value, value)))
+    return ' '.join(described)
+
+
+@click.command()
+@click.option('--workflow', '-w', 'workflow_id', default=None, autocompletion=completion._complete('workflow'), help="Only runs of this workflow (ID or alias).")
+@click.option('--dataset', '-d', 'dataset_id', default=None, autocompletion=completion._complete('dataset'), help="Only runs which used this dataset (ID or alias) as an input.")
+@click.option('--invocation', '-i', 'invocation_id', default=None, autocompletion=completion._complete('invocation'), help="Only the run which made this invocation.")
+@click.option('--limit', '-l', default=50, type=int, help="Show at most this many runs, most recent first (default: 50).")
+@click.option('--json', 'as_json', is_flag=True, help="Print the full ledger records as JSON lines.")
+def runs(workflow_id, dataset_id, invocation_id, limit, as_json):
+    """
+    Query the local ledger of runs submitted with `gxwf invoke`, for the workflow version, inputs and parameters behind each invocation.
+
+    The ledger is kept on this machine, so this works without contacting the server.
+    """
+    cnfg, aliases = utils._read_login()
+    aliases_inverted = {v: k for k, v in aliases.items()}
+    run_ledger = ledger._load_ledger(cnfg)
+    filters = [(kind, aliases.get(value, value)) for kind, value in (('workflow', workflow_id), ('dataset', dataset_id), ('invocation', invocation_id)) if value]
+    if filters:
+        found = None
+        for kind, value in filters:  # runs matching all filters
+            records = {r['invocation_id']: r for r in run_ledger.find(kind, value) if r.get('type') == 'run'}
+            found = records if found is None else {k: v for k, v in found.items() if k in records}
+        records = sorted(found.values(), key=lambda r: r['time'], reverse=True)[:limit]
+    else:
+        records = run_ledger.runs(limit)
+
+    if as_json:
+        for record in records:
+            click.echo(json.dumps(record, sort_keys=True))
+        return
+    outcomes = [run_ledger.outcome(record['invocation_id']) or '' for record in records]
+    utils._tabulate([['Submitted'] + [r['time'] for r in records],
+                     ['Workflow'] + [aliases_inverted.get(r['workflow_id'], r['workflow_id']) for r in records],
+                     ['Version'] + [str(r.get('version')) for r in records],
+                     ['Invocation'] + [r['invocation_id'] for r in records],
+                     ['Outcome'] + outcomes,
+                     ['Inputs'] + [_describe_inputs(r.get('inputs') or {}, aliases_inverted) for r in records],
+                     ['Params'] + [json.dumps(r.get('params') or {}, sort_keys=True) for r in records]])
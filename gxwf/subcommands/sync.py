@@ -0,0 +1,180 @@
+import click
+import os
+import json
+
+from gxwf import api
+from gxwf import utils
+from gxwf import stream
+from gxwf import search as search_index
+from gxwf.subcommands import datasets as dataset_commands
+
+PAGE_SIZE = 500
+HISTORY_FIELDS = ('id', 'name', 'tags', 'deleted', 'purged', 'size', 'update_time')
+INVOCATION_FIELDS = ('id', 'workflow_id', 'history_id', 'state', 'create_time', 'update_time')
+
+
+def _pages(gi, path, params, fields=None):
+    """
+    Fetch a listing page by page, yielding one item at a time, each parsed as it arrives and cut down to fields.
+    """
+    offset = 0
+    while True:
+        count = 0
+        for item in stream._get_list(gi, path, dict(params, limit=PAGE_SIZE, offset=offset), fields):
+            count += 1
+            yield item
+        if count != PAGE_SIZE:  # the last page, or a server which ignores limit and sent everything
+            return
+        offset += PAGE_SIZE
+
+
+def _newest_first(gi, path, params, since, fields=None):
+    """
+    For listings which can't be filtered by update_time, but can be sorted by it: stop once we reach items older than since.
+    """
+    for item in _pages(gi, path, dict(params, sort_by='update_time', sort_desc=True), fields):
+        if since and item.get('update_time') and item['update_time'] < since:
+            return
+        yield item
+
+
+def _changed_datasets(gi, cnfg, since):
+    params = {'keys': ','.join(api.DATASET_FIELDS), 'order': 'update_time-asc'}
+    if since:
+        params.update(q=['update_time-ge'], qv=[since])
+    return _pages(gi, '/datasets', params, api.DATASET_FIELDS)
+
+
+def _changed_history(gi, cnfg, since):
+    """
+    Only the datasets of the gxwf history, which is all `gxwf datasets` shows without --all.
+    """
+    params = {'v': 'dev', 'keys': ','.join(api.DATASET_FIELDS), 'order': 'update_time-asc',
+              'q': ['history_content_type'], 'qv': ['dataset']}
+    if since:
+        params.update(q=params['q'] + ['update_time-ge'], qv=params['qv'] + [since])
+    return _pages(gi, '/histories/{}/contents'.format(cnfg['hid']), params, api.DATASET_FIELDS)
+
+
+def _changed_histories(gi, cnfg, since):
+    for deleted in (False, True):  # deleted histories have to be asked for separately, but we need to know to remove them
+        params = {'keys': ','.join(HISTORY_FIELDS), 'q': ['deleted'], 'qv': [str(deleted)]}
+        if since:
+            params['q'] = params['q'] + ['update_time-ge']
+            params['qv'] = params['qv'] + [since]
+        for history in _pages(gi, '/histories', params, HISTORY_FIELDS):
+            yield history
+
+
+def _changed_workflows(gi, cnfg, since):
+    return _newest_first(gi, '/workflows', {'show_deleted': True}, since, api.WORKFLOW_FIELDS + ('deleted',))
+
+
+def _changed_published(gi, cnfg, since):
+    return _newest_first(gi, '/workflows', {'show_published': True}, since, api.WORKFLOW_FIELDS + ('deleted',))
+
+
+def _changed_invocations(gi, cnfg, since):
+    return _newest_first(gi, '/invocations', {}, since, INVOCATION_FIELDS)
+
+
+# collection: (search index it is stored in, fields kept, function fetching items changed since a time, which items to keep)
+COLLECTIONS = {
+    'datasets': ('datasets_all', api.DATASET_FIELDS, _changed_datasets, dataset_commands._listed),
+    'history': ('datasets', api.DATASET_FIELDS, _changed_history, dataset_commands._listed),
+    'histories': ('histories', HISTORY_FIELDS, _changed_histories, lambda history: not history.get('deleted')),
+    'workflows': ('workflows', api.WORKFLOW_FIELDS, _changed_workflows, lambda wf: not wf.get('deleted')),
+    'published': ('workflows_published', api.WORKFLOW_FIELDS, _changed_published, lambda wf: not wf.get('deleted')),
+    'invocations': ('invocations', INVOCATION_FIELDS, _changed_invocations, lambda invocation: True),
+}
+DEFAULT_COLLECTIONS = tuple(collection for collection in COLLECTIONS if collection != 'history')  # syncing datasets updates the history's store too
+
+
+def _state_path(cnfg):
+    return os.path.join(utils._cache_dir(cnfg), 'sync.json')
+
+
+def _read_state(cnfg):
+    """
+    The high-water mark (latest update_time seen) of each collection synced so far.
+    """
+    try:
+        with open(_state_path(cnfg)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_state(cnfg, state):
+    path = _state_path(cnfg)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def _apply(index, records, keep, complete):
+    """
+    Apply a delta to an index: add or replace the records to keep, and remove the rest (e.g. deleted ones).
+    """
+    kept = [record for record in records if keep(record)]
+    if not complete:
+        index.remove(record['id'] for record in records if not keep(record))
+    index.update(kept, complete=complete)
+    index.save()
+    return len(kept), len(records) - len(kept)
+
+
+def _sync(gi, cnfg, aliases, collections=DEFAULT_COLLECTIONS, full=False):
+    """
+    Bring the local store of each collection up to date, fetching only items updated since the last sync.
+
+    Returns {collection: (number of items updated, number removed)}.
+    """
+    aliases_inverted = {v: k for k, v in aliases.items()}
+    state = _read_state(cnfg)
+    results = {}
+    for collection in collections:
+        index_name, fields, changed, keep = COLLECTIONS[collection]
+        index = search_index._load_index(cnfg, index_name, fields + ('alias',))
+        since = None if full or not len(index) else state.get(collection)  # without a previous sync, fetch everything
+
+        # 'deleted' is needed to decide what to keep, even where it isn't stored
+        records = [dict({k: item.get(k) for k in fields + ('deleted',)}, alias=aliases_inverted.get(item['id'], '')) for item in changed(gi, cnfg, since)]
+        results[collection] = _apply(index, records, keep, complete=since is None)
+        if collection == 'datasets':  # also keep the index of the GXWF history used by `gxwf datasets` up to date
+            gxwf_index = search_index._load_index(cnfg, 'datasets', fields + ('alias',))
+            _apply(gxwf_index, [r for r in records if r.get('history_id') == cnfg['hid']], keep, complete=since is None)
+
+        times = [record['update_time'] for record in records if record.get('update_time')]
+        if times:
+            state[collection] = max(times + ([since] if since else []))
+        _write_state(cnfg, state)  # after each collection, so an interrupted sync doesn't lose progress
+    return results
+
+
+@click.command()
+@click.argument('collections', nargs=-1, type=click.Choice(list(COLLECTIONS)))
+@click.option('--full', is_flag=True, help="Ignore the previous sync and fetch everything.")
+@click.option('--background', is_flag=True, hidden=True, help="Run quietly, unless another background sync is running; used to refresh cached listings.")
+def sync(collections, full, background):
+    """
+    Synchronize the local store of datasets (all of them, and those of the gxwf history), histories, workflows (own and published) and invocations with the server.
+
+    Only items updated since the last sync are fetched. If no COLLECTIONS are given, all are synced. `gxwf list` and `gxwf datasets` show the synced data, and work offline with it.
+    """
+    if background:
+        from gxwf import cache
+
+        lock = cache._try_lock(utils._read_login()[0])
+        if lock is None:
+            return  # already being refreshed
+        with lock:
+            gi, cnfg, aliases = utils._login()
+            _sync(gi, cnfg, aliases, collections or DEFAULT_COLLECTIONS, full)
+        return
+
+    gi, cnfg, aliases = utils._login()
+    results = _sync(gi, cnfg, aliases, collections or DEFAULT_COLLECTIONS, full)
+    for collection, (updated, removed) in results.items():
+        click.echo(click.style("{}: ".format(collection), bold=True) + "{} updated, {} removed".format(updated, removed))
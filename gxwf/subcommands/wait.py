@@ -0,0 +1,131 @@
+import click
+import heapq
+import random
+import time
+
+from gxwf import utils
+from gxwf import completion
+from gxwf import dashboard
+
+MIN_INTERVAL = 2.0  # seconds between polls of an invocation which has just changed
+MAX_INTERVAL = 60.0
+BACKOFF = 1.5  # each poll which finds no change pushes the next one back by this factor
+COALESCE_WINDOW = 1.0  # polls due within this many seconds of each other are made in the same cycle
+LISTING_LIMIT = 1000  # unfinished invocations listed per cycle; any beyond are checked one by one
+EXIT_OK, EXIT_FAILED, EXIT_TIMEOUT = 0, 1, 2
+
+
+def _targets(gi, invocation_ids, workflow_ids, history_tags):
+    """
+    The invocations to wait for: those given, plus all unfinished invocations of the given workflows, or in histories with the given tags.
+    """
+    targets = list(invocation_ids)
+    for workflow_id in workflow_ids:
+        targets += [inv['id'] for inv in gi.invocations.get_invocations(workflow_id=workflow_id, include_terminal=False)]
+    for tag in history_tags:
+        for history in gi.histories._get(params={'q': ['tag'], 'qv': [tag], 'keys': 'id,tags'}):
+            if tag in (history.get('tags') or []):
+                targets += [inv['id'] for inv in gi.invocations.get_invocations(history_id=history['id'], include_terminal=False)]
+    return list(dict.fromkeys(targets))  # without duplicates, keeping the order
+
+
+class Waiter(object):
+    """
+    Polls a set of invocations until all have finished, each on its own schedule.
+
+    Polls are kept in a heap keyed by when each invocation is next expected to change: soon after it last changed,
+    then backing off while nothing happens. Polls falling due together are coalesced: one listing of all unfinished
+    invocations tells which are still being scheduled, so only invocations whose steps have all been scheduled need a
+    request of their own, for their jobs' states.
+    """
+
+    def __init__(self, gi, invocation_ids):
+        self.gi = gi
+        self.heap = [(0.0, n, id_) for n, id_ in enumerate(invocation_ids)]  # (due, tie-breaker, invocation id)
+        heapq.heapify(self.heap)
+        self.intervals = {id_: MIN_INTERVAL for id_ in invocation_ids}
+        self.last_seen = {}  # invocation id -> (invocation state, job states), to tell whether it changed
+        self.states = {}  # invocation id -> terminal invocation state, once known
+        self.results = {}  # invocation id -> 'ok' or 'failed', for finished invocations
+        self.counter = len(invocation_ids)
+
+    def _schedule(self, id_, changed):
+        self.intervals[id_] = MIN_INTERVAL if changed else min(MAX_INTERVAL, self.intervals[id_] * BACKOFF)
+        self.counter += 1
+        due = time.monotonic() + self.intervals[id_] * random.uniform(0.9, 1.1)  # jitter, so polls don't bunch up again
+        heapq.heappush(self.heap, (due, self.counter, id_))
+
+    def _check(self, id_, active):
+        """
+        Return (finished, outcome, observed state) for an invocation, given the listing of unfinished invocations.
+        """
+        if id_ in active:  # still being scheduled: its jobs can wait
+            return False, None, (active[id_]['state'], None)
+        state = self.states.get(id_) or self.gi.invocations.show_invocation(id_)['state']
+        if state not in dashboard.TERMINAL_INVOCATION_STATES:  # e.g. it started after the listing was made, or the listing was cut short
+            return False, None, (state, None)
+        self.states[id_] = state  # it won't change any more
+        if state in ('failed', 'cancelled'):
+            return True, 'failed', (state, None)
+        jobs = self.gi.invocations.get_invocation_summary(id_).get('states', {})
+        observed = (state, tuple(sorted(jobs.items())))
+        if any(jobs.get(s) for s in dashboard.ACTIVE_JOB_STATES):
+            return False, None, observed
+        return True, 'failed' if any(jobs.get(s) for s in dashboard.ERROR_JOB_STATES + ('paused',)) else 'ok', observed
+
+    def cycle(self, pool):
+        """
+        Wait until the next poll is due, then make it, and any others due shortly after. Returns the invocations which finished.
+        """
+        time.sleep(max(0.0, self.heap[0][0] - time.monotonic()))
+        batch = []
+        while self.heap and self.heap[0][0] <= time.monotonic() + COALESCE_WINDOW:
+            batch.append(heapq.heappop(self.heap)[2])
+
+        active = {inv['id']: inv for inv in self.gi.invocations.get_invocations(include_terminal=False, limit=LISTING_LIMIT)}
+        finished = []
+        for id_, (done, outcome, observed) in zip(batch, pool.map(lambda id_: self._check(id_, active), batch)):
+            if done:
+                self.results[id_] = outcome
+                finished.append(id_)
+            else:
+                self._schedule(id_, changed=self.last_seen.get(id_) != observed)
+            self.last_seen[id_] = observed
+        return finished
+
+
+@click.command()
+@click.argument('invocation_ids', nargs=-1, autocompletion=completion._complete('invocation'))
+@click.option('--workflow', '-w', 'workflow_ids', multiple=True, autocompletion=completion._complete('workflow'), help="Also wait for all unfinished invocations of this workflow (ID or alias). Can be given more than once.")
+@click.option('--history-tag', 'history_tags', multiple=True, help="Also wait for all unfinished invocations in histories with this tag. Can be given more than once.")
+@click.option('--timeout', type=float, default=None, help="Give up after this many seconds.")
+@click.option('--workers', default=8, type=int, help="Number of requests to make at the same time (default: 8).")
+@click.option('--quiet', '-q', is_flag=True, help="Don't report each invocation as it finishes.")
+def wait(invocation_ids, workflow_ids, history_tags, timeout, workers, quiet):
+    """
+    Wait until invocations have finished, given by ID (or alias), by workflow or by history tag.
+
+    Exits with status 0 if all succeeded, 1 if any failed (including failed or paused jobs) and 2 if --timeout was reached first.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    gi, cnfg, aliases = utils._login()
+    targets = _targets(gi, [aliases.get(id_, id_) for id_ in invocation_ids], [aliases.get(id_, id_) for id_ in workflow_ids], history_tags)
+    if not targets:
+        click.echo("No invocations to wait for.")
+        return
+
+    waiter = Waiter(gi, targets)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    with ThreadPoolExecutor(workers) as pool:
+        while waiter.heap:
+            if deadline is not None and waiter.heap[0][0] > deadline:
+                break
+            for id_ in waiter.cycle(pool):
+                if not quiet:
+                    click.echo("{}: ".format(id_) + click.style(waiter.results[id_], fg='green' if waiter.results[id_] == 'ok' else 'red', bold=True))
+
+    failed = [id_ for id_, outcome in waiter.results.items() if outcome != 'ok']
+    pending = [entry[2] for entry in waiter.heap]
+    click.echo("{} succeeded, {} failed, {} still running.".format(len(waiter.results) - len(failed), len(failed), len(pending)))
+    click.get_current_context().exit(EXIT_TIMEOUT if pending else EXIT_FAILED if failed else EXIT_OK)
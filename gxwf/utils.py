@@ -1,59 +1,161 @@
-import yaml
-from bioblend import galaxy
 import os
+import hashlib
+import operator
+import pickle
 import click
 
 CONFIG_PATH = os.path.expanduser("~/.gxwf")
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser("~/.cache")), 'gxwf')
+
+_parsed_configs = {}  # config path -> (stat key, pickled config), so a process parses each config at most once
+
+def _yaml_loader():
+    import yaml  # yaml, like bioblend, is imported lazily to keep shell completion fast
+
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)  # libyaml's loader is many times faster, where PyYAML was built with it
+
+def _config_key(configfile):
+    st = os.stat(configfile)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _config_cache_path(configfile):
+    return os.path.join(CACHE_DIR, 'config-{}.pickle'.format(hashlib.sha1(os.path.abspath(configfile).encode()).hexdigest()[:16]))
+
+def _cache_config(configfile, key, data):
+    """
+    Keep a parsed config (pickled) for the rest of this process, and on disk for later ones.
+    """
+    _parsed_configs[configfile] = (key, data)
+    path = _config_cache_path(configfile)
+    tmp = '{}.{}'.format(path, os.getpid())
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:  # only readable by the user, like the API keys in it
+            pickle.dump((key, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # it's only a cache
+
+def _load_config(configfile=CONFIG_PATH):
+    """
+    Parse the config file, or reuse the parsed config if the file's mtime and size are unchanged since it was last
+    parsed, by this process or another. Raises FileNotFoundError if there is no config.
+    """
+    key = _config_key(configfile)
+    cached = _parsed_configs.get(configfile)
+    if cached is None or cached[0] != key:
+        try:
+            with open(_config_cache_path(configfile), 'rb') as f:
+                cached = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            cached = None
+    if cached is not None and cached[0] == key:
+        _parsed_configs[configfile] = cached
+        return pickle.loads(cached[1])  # a fresh copy each time, so callers can change it freely
+
+    import yaml
+    with open(configfile) as f:
+        cnfg = yaml.load(f, Loader=_yaml_loader())
+    _cache_config(configfile, key, pickle.dumps(cnfg, protocol=pickle.HIGHEST_PROTOCOL))
+    return cnfg
 
 def _read_configfile(configfile=CONFIG_PATH):
     try:
-        with open(configfile) as f:
-            cnfg = yaml.safe_load(f)
-        return cnfg
+        return _load_config(configfile)
     except FileNotFoundError:
         print("No login details provided - please run gxwf init.")
     except ConnectionError:
         print("Could not connect - check login details are correct.")
 
 def _write_to_file(yml, file_dest=CONFIG_PATH):
+    import yaml
+
     with open(file_dest, "w") as f:
-        f.write(yaml.dump(yml, Dumper=yaml.SafeDumper))
+        f.write(yaml.dump(yml, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper)))
+    if file_dest == CONFIG_PATH:  # the next command needn't parse what we just wrote
+        _cache_config(file_dest, _config_key(file_dest), pickle.dumps(yml, protocol=pickle.HIGHEST_PROTOCOL))
 
-def _login():
+def _read_login():
+    """
+    Get the active login details and aliases from the config, without contacting the server.
+    """
     login_dict = _read_configfile()
-    cnfg = login_dict['logins'][login_dict['active_login']]
-    aliases = login_dict['aliases']
-    gi = galaxy.GalaxyInstance(cnfg['url'], cnfg['api_key'])
-    gi.histories.get_histories()  # just to check the connection
+    return login_dict['logins'][login_dict['active_login']], login_dict['aliases']
+
+def _cache_dir(cnfg):
+    """
+    Directory for locally cached data belonging to a login; logins are told apart by server URL and API key.
+    """
+    key = hashlib.sha1('{}|{}'.format(cnfg['url'], cnfg['api_key']).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, key)
+
+def _login():
+    from gxwf import policy  # imports bioblend, so imported here rather than at the top so shell completion doesn't pay for it
+    cnfg, aliases = _read_login()
+    gi = policy._galaxy_instance(cnfg)  # retries and circuit breaking for every request, as configured for the login
+    gi.histories.get_histories(limit=1)  # just to check the connection
     return gi, cnfg, aliases
 
-def _tabulate(values):
+def _format_size(size):
     """
-    Print data as a table
+    Format a number of bytes for humans, e.g. 1.5 GB.
+    """
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            break
+        size /= 1024
+    return '{:.0f} {}'.format(size, unit) if unit == 'B' else '{:.1f} {}'.format(size, unit)
 
-    values is a list of lists, each list a column
+def _cell(value):
+    return '' if value is None else str(value)
+
+def _tabulate_rows(columns, rows):
+    """
+    Print records as a table, without building a copy of the data as strings.
+
+    columns is a list of (header, field) tuples, field being the name of an attribute of each record (e.g. a named
+    tuple) or a function returning the cell for a record.
     """
-    col_widths = [len(max(col, key=len)) + 2 for col in values]
+    headers = [header for header, field in columns]
+    getters = [operator.attrgetter(field) if isinstance(field, str) else field for header, field in columns]
 
-    if len(values[0]) <= 1:
+    if not rows:
         print("No results found.")
         return 0
 
+    col_widths = [len(header) + 2 for header in headers]
+    for row in rows:  # a first pass just to size the columns
+        for n, get in enumerate(getters):
+            col_widths[n] = max(col_widths[n], len(_cell(get(row))) + 2)
+
     try:
         width = os.get_terminal_size(0)[0]  # get terminal width
     except OSError:
         width = 80  # default
 
+    wide_col = None
     if sum(col_widths) > width:  # check if the columns are too wide for terminal
         wide_col = col_widths.index(max(col_widths))  # for simplicity we only edit the widest col
         col_widths[wide_col] -= sum(col_widths) - width
-        for n in range(len(values[wide_col])):  # check elements of the widest col
-            val = values[wide_col][n]
+
+    def shorten(cells):
+        if wide_col is not None:
+            val = cells[wide_col]
             if len(val) > col_widths[wide_col] - 5:  # insert ellipsis to shorten wide elements
-                values[wide_col][n] = val[:int(col_widths[wide_col]/2-3)] + '...' + val[int(3-col_widths[wide_col]/2):]
+                cells[wide_col] = val[:int(col_widths[wide_col]/2-3)] + '...' + val[int(3-col_widths[wide_col]/2):]
+        return cells
 
     row_format = ''.join(["{{:<{}}}".format(n) for n in col_widths])
 
-    click.echo(click.style(row_format.format(*[col[0] for col in values]), bold=True))  # print col headers
-    for row in range(1, len(values[0])):
-        click.echo(row_format.format(*[col[row] for col in values]))
+    click.echo(click.style(row_format.format(*shorten(list(headers))), bold=True))  # print col headers
+    for row in rows:
+        click.echo(row_format.format(*shorten([_cell(get(row)) for get in getters])))
+
+def _tabulate(values):
+    """
+    Print data as a table
+
+    values is a list of lists, each list a column
+    """
+    rows = list(zip(*[col[1:] for col in values]))
+    return _tabulate_rows([(col[0], operator.itemgetter(n)) for n, col in enumerate(values)], rows)
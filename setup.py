@@ -54,6 +54,10 @@ setup(
         'gxformat2',
         'bioblend'
     ],
+    extras_require={
+        'export': ['pyarrow'],  # Parquet output for `gxwf invocations export`
+        'profile': ['numpy'],  # faster statistics for `gxwf profile`
+    },
     entry_points="""
     [console_scripts]
     gxwf=gxwf.cli:cli
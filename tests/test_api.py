@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_api
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for the Python API.
+"""
+import json
+
+from gxwf import api
+
+
+class FakeResponse(object):
+    def __init__(self, items):
+        self.status_code = 200
+        self.data = json.dumps(items).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunk_size):
+        return (self.data[i:i + chunk_size] for i in range(0, len(self.data), chunk_size))
+
+
+class FakeGalaxy(object):
+    url = 'https://galaxy.example/api'
+
+    def __init__(self, listings):
+        self.listings = listings
+        self.requests = []
+        self.invocations = self
+
+    def make_get_request(self, url, params=None, stream=False):
+        self.requests.append((url[len(self.url):], params))
+        return FakeResponse(self.listings[url[len(self.url):]])
+
+    def get_invocation_summary(self, invocation_id):
+        return {'states': {'ok': 3} if invocation_id == 'i1' else {'running': 1}}
+
+
+def test_listings_yield_typed_records():
+    """
+    Arrange: A session whose server lists a workflow and two invocations of it, with an alias for the workflow.
+    Act: List workflows, and invocations of the workflow given by its alias.
+    Assert: Named tuples are returned with the alias and job states filled in, using the same login throughout.
+    """
+    gi = FakeGalaxy({
+        '/workflows': [{'id': 'w1', 'name': 'rnaseq', 'owner': 'me', 'tags': [], 'number_of_steps': 3, 'update_time': 't', 'extra': 'ignored'}],
+        '/workflows/w1/invocations': [{'id': 'i1', 'workflow_id': 'w1', 'history_id': 'h1', 'state': 'scheduled', 'update_time': 't'},
+                                      {'id': 'i2', 'workflow_id': 'w1', 'history_id': 'h2', 'state': 'new', 'update_time': 't'}],
+    })
+    session = api.Session(gi, {'hid': 'h0'}, {'happy_turing': 'w1'})
+
+    assert list(api.workflows(session=session)) == [api.Workflow('w1', 'rnaseq', 'me', [], 3, 't', 'happy_turing')]
+    invocations = list(api.invocations('happy_turing', session=session))
+    assert [(inv.id, inv.jobs) for inv in invocations] == [('i1', {'ok': 3}), ('i2', {'running': 1})]
+    assert invocations[0].history_id == 'h1'
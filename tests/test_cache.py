@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_cache
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for serving `gxwf datasets` from the local store, offline or while it is refreshed.
+"""
+import os
+import time
+
+import pytest
+
+from gxwf import api
+from gxwf import utils
+from gxwf import cache
+from gxwf import completion
+from gxwf import search as search_index
+from gxwf.subcommands import datasets as dataset_commands
+
+CNFG = {'url': 'https://galaxy.example', 'api_key': 'k', 'hid': 'h0'}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    A local store holding one dataset of the gxwf history, saved an hour ago, and a record of background refreshes started.
+    """
+    monkeypatch.setattr(utils, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(utils, '_read_login', lambda: (CNFG, {}))
+    monkeypatch.setattr(completion, '_update_index', lambda *args, **kwargs: None)
+    revalidated = []
+    monkeypatch.setattr(cache, '_revalidate', lambda cnfg, collection: revalidated.append(collection))
+
+    index = search_index._load_index(CNFG, 'datasets', api.Dataset._fields)
+    index.update([api.Dataset('d1', 'cached reads', 'fastqsanger', [], 'h0', 'ok', False, '2021-01-01')])
+    index.save()
+    an_hour_ago = time.time() - 3600
+    os.utime(index.path, (an_hour_ago, an_hour_ago))
+    return revalidated
+
+
+def _offline_server(*args, **kwargs):
+    raise ConnectionError('server is down')
+
+
+def test_stale_listing_refreshes_only_the_history(store, capsys):
+    """
+    Arrange: A cached listing older than FRESH_FOR.
+    Act: List datasets, without --all.
+    Assert: The cached datasets are shown straight away, and only the gxwf history is refreshed in the background.
+    """
+    dataset_commands.datasets(None, False)
+    out, err = capsys.readouterr()
+    assert 'cached reads' in out
+    assert 'refreshing in the background' in err
+    assert store == ['history']
+
+
+def test_fresh_listing_not_refreshed(store, capsys):
+    """
+    Arrange: A cached listing saved just now.
+    Act: List datasets.
+    Assert: Nothing is refreshed.
+    """
+    os.utime(search_index._load_index(CNFG, 'datasets').path)
+    dataset_commands.datasets(None, False)
+    assert store == []
+
+
+def test_offline_never_contacts_server(store, monkeypatch, capsys):
+    """
+    Arrange: A server which can't be reached.
+    Act: List datasets with --offline, even asking for a refresh.
+    Assert: The cached datasets are shown with a note of their age, without a request or a refresh.
+    """
+    monkeypatch.setattr(api, 'datasets', _offline_server)
+    dataset_commands.datasets(None, False, refresh=True, offline=True)
+    out, err = capsys.readouterr()
+    assert 'cached reads' in out
+    assert 'Offline: showing data cached 1 hour ago' in err
+    assert store == []
+
+
+def test_connection_error_falls_back_to_cache(store, monkeypatch, capsys):
+    """
+    Arrange: A server which can't be reached.
+    Act: List datasets with --refresh, then with nothing cached.
+    Assert: The cached datasets are shown, saying why; with nothing cached, the error is raised.
+    """
+    monkeypatch.setattr(api, 'datasets', _offline_server)
+    dataset_commands.datasets(None, False, refresh=True)
+    out, err = capsys.readouterr()
+    assert 'cached reads' in out
+    assert 'Could not reach the server (server is down)' in err
+
+    with pytest.raises(ConnectionError):
+        dataset_commands.datasets(None, True, refresh=True)  # the store of all datasets is empty
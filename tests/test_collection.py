@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_collection
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for building collections with `gxwf collection create`.
+"""
+import click
+import pytest
+
+from gxwf import api
+from gxwf import mapping
+from gxwf.subcommands import collection
+
+
+def _datasets(*names):
+    return [mapping.Candidate('id_' + name, name, 'fastqsanger.gz', 'hda', '') for name in names]
+
+
+def test_reads_paired_by_sample():
+    """
+    Arrange: Forward and reverse reads of two samples, named in different styles, and a read without its mate.
+    Act: Select them by pattern and build the elements of a collection.
+    Assert: A list:paired of the two samples, with the lone read left out.
+    """
+    datasets = _datasets('sampleA_R1_001.fastq.gz', 'sampleA_R2_001.fastq.gz', 'sampleB.1.fastq.gz', 'sampleB.2.fastq.gz',
+                         'sampleC_R1.fastq.gz', 'notes.txt')
+    selected = collection._select(datasets, ['*.fastq.gz'], [], {})
+    elements, collection_type, left_out = collection._elements(selected, 'list:paired')
+
+    assert collection_type == 'list:paired'
+    assert {sample: (f.name, r.name) for sample, (f, r) in elements.items()} == {
+        'sampleA_001': ('sampleA_R1_001.fastq.gz', 'sampleA_R2_001.fastq.gz'), 'sampleB': ('sampleB.1.fastq.gz', 'sampleB.2.fastq.gz')}
+    assert [ds.name for ds in left_out] == ['sampleC_R1.fastq.gz']
+    assert collection._elements(selected, 'auto')[1] == 'list'  # not everything pairs
+
+
+def test_sample_sheet(tmp_path):
+    """
+    Arrange: A TSV sample sheet giving reads by name, alias and ID.
+    Act: Read it, and describe the collection.
+    Assert: Each sample is a paired element of the datasets given.
+    """
+    sheet = tmp_path / 'samples.tsv'
+    sheet.write_text('Sample\tR1\tR2\ns1\ta_1.fastq.gz\tmy_alias\ns2\tf00\tb_2.fastq.gz\n')
+    elements, collection_type = collection._read_sheet(str(sheet), _datasets('a_1.fastq.gz', 'b_2.fastq.gz'), {'my_alias': 'a2'})
+    ids = {sample: tuple(ds.id for ds in pair) for sample, pair in elements.items()}
+
+    assert collection_type == 'list:paired'
+    assert ids == {'s1': ('id_a_1.fastq.gz', 'a2'), 's2': ('f00', 'id_b_2.fastq.gz')}
+    assert api._element_identifiers(ids, collection_type)[0] == {
+        'name': 's1', 'src': 'new_collection', 'collection_type': 'paired',
+        'element_identifiers': [{'name': 'forward', 'src': 'hda', 'id': 'id_a_1.fastq.gz'}, {'name': 'reverse', 'src': 'hda', 'id': 'a2'}]}
+
+
+def test_replicates_not_paired_unless_asked():
+    """
+    Arrange: Single-end replicates numbered _1 and _2.
+    Act: Build the elements with --type auto, then with --type list:paired.
+    Assert: auto gives a list of both; pairing only happens when asked for.
+    """
+    selected = _datasets('rep_1.fastq.gz', 'rep_2.fastq.gz')
+    elements, collection_type, left_out = collection._elements(selected, 'auto')
+    assert (collection_type, sorted(elements)) == ('list', ['rep_1', 'rep_2'])
+
+    elements, collection_type, left_out = collection._elements(selected, 'list:paired')
+    assert (collection_type, list(elements)) == ('list:paired', ['rep'])
+
+
+def test_short_sample_sheet_row(tmp_path):
+    """
+    Arrange: A sample sheet with a row missing its reverse read.
+    Act: Read it.
+    Assert: A ClickException names the line, rather than a crash.
+    """
+    sheet = tmp_path / 'samples.csv'
+    sheet.write_text('sample,forward,reverse\ns1,a,b\ns2,c\n')
+    with pytest.raises(click.ClickException, match='Line 3'):
+        collection._read_sheet(str(sheet), [], {})
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_completion
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for the shell completion index.
+"""
+from gxwf import completion
+
+
+def test_aliases_complete_by_kind(tmp_path):
+    """
+    Arrange: Index a workflow ID and aliases for a workflow and a dataset.
+    Act: Look up candidates by prefix.
+    Assert: Only matching keys of the requested kind are returned, and replaced aliases are dropped.
+    """
+    path = str(tmp_path / 'completion')
+    completion._update_index([('workflow', 'f2db41e1'), ('dataset', 'bbd44e69')], aliases={'happy_turing': 'f2db41e1', 'happy_hopper': 'bbd44e69'}, path=path)
+
+    assert completion._lookup('workflow', 'ha', path=path) == [('happy_turing', 'f2db41e1')]
+    assert [key for key, id_ in completion._lookup('alias', 'happy_', path=path)] == ['happy_hopper', 'happy_turing']
+    assert completion._lookup('workflow', 'f2', path=path) == [('f2db41e1', None)]
+
+    completion._update_index(aliases={'sad_turing': 'f2db41e1'}, path=path)
+    assert completion._lookup('alias', 'happy', path=path) == []
+    assert completion._lookup('workflow', 's', path=path) == [('sad_turing', 'f2db41e1')]
+
+
+def test_lookup_without_index(tmp_path):
+    """
+    Arrange/Act: Look up candidates before any index has been written.
+    Assert: No candidates are returned.
+    """
+    assert completion._lookup('workflow', '', path=str(tmp_path / 'missing')) == []
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_config
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for loading the gxwf config.
+"""
+import os
+
+import yaml
+
+from gxwf import api
+from gxwf import utils
+
+
+def test_parsed_config_is_reused_until_changed(tmp_path, monkeypatch):
+    """
+    Arrange: A config file, with the cache in a temporary directory.
+    Act: Load it, load it again as a new process would, change it, and load it again.
+    Assert: It is only parsed the first time and after the change, and changes to a loaded config don't leak into the cache.
+    """
+    monkeypatch.setattr(utils, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(utils, '_parsed_configs', {})
+    path = str(tmp_path / 'gxwf.yml')
+    with open(path, 'w') as f:
+        yaml.dump({'active_login': 'main', 'aliases': {'happy_turing': 'f2db41e1'}}, f)
+
+    parses = []
+    load = yaml.load
+    monkeypatch.setattr(yaml, 'load', lambda *args, **kwargs: parses.append(1) or load(*args, **kwargs))
+
+    cnfg = utils._load_config(path)
+    cnfg['aliases']['changed'] = 'x'
+    utils._parsed_configs.clear()  # as in a new process
+    assert utils._load_config(path)['aliases'] == {'happy_turing': 'f2db41e1'}
+    assert len(parses) == 1
+
+    with open(path, 'a') as f:
+        f.write('logins: {}\n')
+    os.utime(path, ns=(0, 0))  # a different mtime, even on filesystems with coarse timestamps
+    assert utils._load_config(path)['logins'] == {}
+    assert len(parses) == 2
+
+
+def test_aliases_saved_to_given_config(tmp_path, monkeypatch):
+    """
+    Arrange: A config file other than the default, with the cache in a temporary directory.
+    Act: Save aliases to it.
+    Assert: The aliases are written to that file, keeping the rest of it.
+    """
+    monkeypatch.setattr(utils, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(utils, '_parsed_configs', {})
+    monkeypatch.setattr(utils, '_read_login', lambda: ({}, {}))
+    monkeypatch.setattr(api.completion, '_update_index', lambda *args, **kwargs: None)
+    monkeypatch.setattr(api.search_index, '_update_aliases', lambda *args: None)
+    path = str(tmp_path / 'other.yml')
+    with open(path, 'w') as f:
+        yaml.dump({'active_login': 'main', 'aliases': {}}, f)
+
+    api._save_aliases({'happy_turing': 'f2db41e1'}, path)
+    with open(path) as f:
+        assert yaml.safe_load(f) == {'active_login': 'main', 'aliases': {'happy_turing': 'f2db41e1'}}
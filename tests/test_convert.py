@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_convert
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for converting workflows between native and Format 2.
+"""
+import json
+
+from gxwf.subcommands import convert
+
+FORMAT2_WF = """class: GalaxyWorkflow
+label: test
+inputs:
+  input1: data
+steps:
+  cat:
+    tool_id: cat1
+    in:
+      input1: input1
+"""
+
+
+def test_format2_round_trip(tmp_path):
+    """
+    Arrange: Write a Format 2 workflow.
+    Act: Convert it to native and back again.
+    Assert: The native workflow has the expected steps and the label survives the round trip.
+    """
+    src = tmp_path / 'wf.gxwf.yml'
+    src.write_text(FORMAT2_WF)
+
+    path, native, error = convert._convert_file((str(src), convert._dest_path(str(src), str(tmp_path), 'native'), 'native'))
+    assert error is None and native.endswith('wf.ga')
+    with open(native) as f:
+        assert len(json.load(f)['steps']) == 2
+
+    path, format2, error = convert._convert_file((native, str(tmp_path / 'back.gxwf.yml'), 'format2'))
+    assert error is None
+    assert convert._read_workflow(format2)['name'] == 'test'
+
+
+def test_read_workflow_ignores_other_yaml(tmp_path):
+    """
+    Arrange: Write a YAML file which is not a workflow.
+    Act: Read it as a workflow.
+    Assert: None is returned, so upload treats it as a dataset.
+    """
+    src = tmp_path / 'config.yml'
+    src.write_text("a: 1\n")
+    assert convert._read_workflow(str(src)) is None
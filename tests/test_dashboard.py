@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_dashboard
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for the live invocations dashboard.
+"""
+import io
+
+from concurrent.futures import ThreadPoolExecutor
+
+from gxwf import dashboard
+
+
+class FakeInvocations(object):
+    def __init__(self):
+        self.summaries = []
+
+    def get_invocations(self, workflow_id=None, limit=None):
+        return [{'id': 'inv1', 'workflow_id': 'wf1', 'state': 'scheduled', 'create_time': '2024-01-01T10:00:00', 'update_time': '2024-01-01T10:05:00'},
+                {'id': 'inv2', 'workflow_id': 'wf1', 'state': 'scheduled', 'create_time': '2024-01-01T11:00:00', 'update_time': '2024-01-01T11:00:00'}]
+
+    def get_invocation_summary(self, invocation_id):
+        self.summaries.append(invocation_id)
+        return {'states': {'ok': 4} if invocation_id == 'inv1' else {'ok': 1, 'running': 2, 'error': 1}}
+
+
+class FakeWorkflows(object):
+    def _get(self, id=None, params=None):
+        return {'name': 'rnaseq'}
+
+
+class FakeGalaxy(object):
+    def __init__(self):
+        self.invocations = FakeInvocations()
+        self.workflows = FakeWorkflows()
+
+
+def test_poll_and_render():
+    """
+    Arrange: A server with one finished and one running invocation.
+    Act: Poll twice and render a frame, filtered to failed invocations.
+    Assert: The finished invocation's jobs are only fetched once, and only the failing invocation is shown, with its counts.
+    """
+    gi = FakeGalaxy()
+    board = dashboard.Dashboard(gi)
+    with ThreadPoolExecutor(2) as pool:
+        board.poll(pool)
+        board.poll(pool)
+    assert sorted(gi.invocations.summaries) == ['inv1', 'inv2', 'inv2']
+
+    board.filter = 'failed'
+    lines = board.render(120, 40)
+    assert len(lines) == 4 and 'inv2' in lines[3] and 'rnaseq' in lines[3] and '25%' in lines[3]
+    assert all(len(line) <= 120 for line in lines[1:2])
+
+
+def test_rows_fit_narrow_terminal():
+    """
+    Arrange: A server with running invocations.
+    Act: Render a frame 60 characters wide.
+    Assert: No line is wider than the terminal, not counting colour codes, so none wraps.
+    """
+    board = dashboard.Dashboard(FakeGalaxy())
+    with ThreadPoolExecutor(2) as pool:
+        board.poll(pool)
+    lines = board.render(60, 40)
+    assert len(lines) == 5
+    assert all(len(dashboard.ANSI_CODE.sub('', line)) <= 60 for line in lines)
+    assert lines[3].endswith('\x1b[0m')
+
+
+def test_screen_redraws_changed_lines_only():
+    """
+    Arrange: A screen which has drawn a frame.
+    Act: Draw a frame with one changed line, and one fewer line.
+    Assert: Only the changed line is rewritten, and the rest of the screen below is cleared.
+    """
+    out = io.StringIO()
+    screen = dashboard.Screen(out)
+    screen.draw(['a', 'b', 'c'])
+    out.seek(0)
+    out.truncate()
+    screen.draw(['a', 'B'])
+    assert out.getvalue() == '\x1b[2;1HB\x1b[K\x1b[3;1H\x1b[J'
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_download
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for resumable, verified dataset downloads.
+"""
+import hashlib
+
+import pytest
+
+from gxwf import download
+
+CONTENT = b'ACGT' * 1000
+DATASET = {'id': 'abc', 'extension': 'fasta', 'file_size': len(CONTENT),
+           'hashes': [{'hash_function': 'SHA-256', 'hash_value': hashlib.sha256(CONTENT).hexdigest()}]}
+
+
+class FakeGalaxy(object):
+    url = 'https://galaxy.example.org/prefix/api'
+
+
+class FakeResponse(object):
+    def __init__(self, headers):
+        start, end = 0, len(CONTENT) - 1
+        if 'Range' in headers:
+            first, last = headers['Range'][6:].split('-')
+            start, end = int(first), int(last or end)
+        self.status_code = (416 if start >= len(CONTENT) else 206) if 'Range' in headers else 200
+        self.headers = {'Content-Range': 'bytes {}-{}/{}'.format(start, end, len(CONTENT))}
+        self.body = CONTENT[start:end + 1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        return [self.body[i:i + 100] for i in range(0, len(self.body), 100)]
+
+
+@pytest.fixture
+def requests_made(monkeypatch):
+    made = []
+
+    def fake_get(gi, url, headers=None, **kwargs):
+        made.append(headers)
+        return FakeResponse(headers)
+    monkeypatch.setattr(download, '_get', fake_get)
+    return made
+
+
+def test_download_resumes_from_part_file(tmp_path, requests_made):
+    """
+    Arrange: Leave the first half of a dataset in a .part file.
+    Act: Download the dataset.
+    Assert: Only the rest is requested, and the complete file passes verification.
+    """
+    dest = str(tmp_path / 'out.fasta')
+    with open(dest + '.part', 'wb') as f:
+        f.write(CONTENT[:2000])
+
+    download._download_dataset(FakeGalaxy(), DATASET, dest)
+    assert requests_made == [{'Range': 'bytes=2000-'}]
+    with open(dest, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_ranged_download_fetches_only_missing_parts(tmp_path, requests_made, monkeypatch):
+    """
+    Arrange: Split a dataset into 1000 byte parts and record the first two as already downloaded.
+    Act: Download the dataset with several connections.
+    Assert: Only the remaining parts are requested, and the file is assembled correctly.
+    """
+    monkeypatch.setattr(download, 'PART_SIZE', 1000)
+    monkeypatch.setattr(download, 'RANGED_MIN_SIZE', 1000)
+    dest = str(tmp_path / 'out.fasta')
+    with open(dest + '.part', 'wb') as f:
+        f.write(CONTENT[:2000] + b'\0' * 2000)
+    with open(dest + '.part.json', 'w') as f:
+        f.write('{"size": 4000, "part_size": 1000, "done": [0, 1]}')
+
+    download._download_ranged(FakeGalaxy(), DATASET, dest, 3)
+    assert sorted(h['Range'] for h in requests_made[1:]) == ['bytes=2000-2999', 'bytes=3000-3999']
+    with open(dest, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_download_rejects_checksum_mismatch(tmp_path, requests_made):
+    """
+    Arrange: Record the wrong checksum for a dataset.
+    Act: Download the dataset.
+    Assert: The download fails and no partial data is kept to resume from.
+    """
+    dest = tmp_path / 'out.fasta'
+    dataset = dict(DATASET, hashes=[{'hash_function': 'MD5', 'hash_value': '0' * 32}])
+    with pytest.raises(download.DownloadError):
+        download._download_dataset(FakeGalaxy(), dataset, str(dest))
+    assert not dest.exists() and not (tmp_path / 'out.fasta.part').exists()
+
+
+def test_interrupted_ranged_download_not_resumed_as_stream(tmp_path, requests_made):
+    """
+    Arrange: Leave a preallocated .part file with holes and its state file, as an interrupted ranged download does.
+    Act: Download the dataset, without a checksum, as a single stream.
+    Assert: The .part file is dropped and the whole dataset is downloaded, rather than the zero-filled file being taken as complete.
+    """
+    dest = str(tmp_path / 'out.fasta')
+    with open(dest + '.part', 'wb') as f:
+        f.write(CONTENT[:1000] + b'\0' * 3000)
+    with open(dest + '.part.json', 'w') as f:
+        f.write('{"size": 4000, "part_size": 1000, "done": [0]}')
+
+    download._download_dataset(FakeGalaxy(), dict(DATASET, hashes=[]), dest)
+    assert requests_made == [{}]
+    with open(dest, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not (tmp_path / 'out.fasta.part.json').exists()
+
+
+def test_unsatisfiable_range_only_accepted_for_complete_part(tmp_path, requests_made):
+    """
+    Arrange: Leave a .part file longer than the dataset.
+    Act: Download the dataset, so the server can't satisfy the range.
+    Assert: The .part file is dropped and the dataset is downloaded again from the start.
+    """
+    dest = str(tmp_path / 'out.fasta')
+    with open(dest + '.part', 'wb') as f:
+        f.write(CONTENT + b'extra')
+
+    download._download_dataset(FakeGalaxy(), dict(DATASET, hashes=[]), dest)
+    assert requests_made == [{'Range': 'bytes=4005-'}, {}]
+    with open(dest, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_dataset_url_under_path_prefix(monkeypatch):
+    """
+    Arrange: A server under a path prefix, and a dataset whose download_url already includes it and a query string.
+    Act: Request the dataset.
+    Assert: The URL has the prefix once, and the extension is passed as a parameter rather than appended to the URL.
+    """
+    calls = []
+    monkeypatch.setattr(download, '_get', lambda gi, url, headers=None, **kwargs: calls.append((url, kwargs['params'])))
+    download._get_dataset(FakeGalaxy(), dict(DATASET, download_url='/prefix/api/datasets/abc/display?preview=True'))
+    assert calls == [('https://galaxy.example.org/prefix/api/datasets/abc/display', {'to_ext': 'fasta'})]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_export
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for exporting invocation history with `gxwf invocations export`.
+"""
+import csv
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gxwf import export
+
+
+class FakeGalaxy(object):
+    """
+    inv1 has finished: step 1 ran one job and step 2 was mapped over two. inv2 still has a job running.
+    """
+    def __init__(self):
+        self.invocations = self.jobs = self
+        self.fetched = []
+
+    def show_invocation(self, invocation_id):
+        self.fetched.append(invocation_id)
+        return {'id': invocation_id, 'workflow_id': 'w1', 'history_id': 'h1', 'state': 'scheduled',
+                'create_time': '2021-05-01T10:00:00', 'update_time': '2021-05-01T10:05:00',
+                'steps': [{'id': 's0', 'order_index': 0, 'state': 'scheduled', 'job_id': None, 'workflow_step_label': 'reads'},
+                          {'id': 's1', 'order_index': 1, 'state': 'scheduled', 'job_id': 'j1', 'workflow_step_label': 'trim'},
+                          {'id': 's2', 'order_index': 2, 'state': 'scheduled', 'job_id': None, 'workflow_step_label': 'align'}]}
+
+    def get_jobs(self, invocation_id=None, limit=None, offset=0, order_by='update_time'):
+        assert order_by == 'create_time'  # else jobs updated while paging could move between pages
+        state = 'ok' if invocation_id == 'inv1' else 'running'
+        return [{'id': 'j{}'.format(n), 'tool_id': 't', 'state': state, 'create_time': '2021-05-01T10:0{}:00'.format(n),
+                 'update_time': '2021-05-01T10:0{}:30'.format(n)} for n in (1, 2, 3)]
+
+    def show_invocation_step(self, invocation_id, step_id):
+        return {'jobs': [{'id': 'j2'}, {'id': 'j3'}] if step_id == 's2' else []}
+
+
+def test_export_appends_finished_invocations(tmp_path):
+    """
+    Arrange: One finished and one running invocation.
+    Act: Export them as CSV twice.
+    Assert: Only the finished one is exported, with a row per job and its step, and nothing is exported twice.
+    """
+    gi = FakeGalaxy()
+    with ThreadPoolExecutor(2) as pool:
+        assert export._export(gi, ['inv1', 'inv2'], str(tmp_path), 'csv', pool) == (1, 3, 1)
+        assert export._export(gi, ['inv1', 'inv2'], str(tmp_path), 'csv', pool) == (0, 0, 1)
+    assert gi.fetched.count('inv1') == 1
+
+    with open(str(tmp_path / 'jobs.csv')) as f:
+        jobs = list(csv.DictReader(f))
+    assert [(row['job_id'], row['step_label'], row['seconds']) for row in jobs] == [('j1', 'trim', '30.0'), ('j2', 'align', '30.0'), ('j3', 'align', '30.0')]
+    with open(str(tmp_path / 'invocations.csv')) as f:
+        assert [(row['invocation_id'], row['jobs'], row['seconds']) for row in csv.DictReader(f)] == [('inv1', '3', '300.0')]
+
+
+def test_interrupted_export_not_duplicated(tmp_path, monkeypatch):
+    """
+    Arrange: An export interrupted after writing an invocation's jobs, but before marking the invocation as exported.
+    Act: Export again.
+    Assert: The invocation is exported, without appending its jobs a second time.
+    """
+    gi = FakeGalaxy()
+    append = export.CsvTable.append
+
+    def interrupted(table, rows):
+        if table.path.endswith('invocations.csv'):
+            raise KeyboardInterrupt
+        append(table, rows)
+    monkeypatch.setattr(export.CsvTable, 'append', interrupted)
+    with ThreadPoolExecutor(2) as pool:
+        with pytest.raises(KeyboardInterrupt):
+            export._export(gi, ['inv1'], str(tmp_path), 'csv', pool)
+        monkeypatch.undo()
+        assert export._export(gi, ['inv1'], str(tmp_path), 'csv', pool) == (1, 0, 0)
+
+    with open(str(tmp_path / 'jobs.csv')) as f:
+        assert [row['job_id'] for row in csv.DictReader(f)] == ['j1', 'j2', 'j3']
+    with open(str(tmp_path / 'invocations.csv')) as f:
+        assert [row['invocation_id'] for row in csv.DictReader(f)] == ['inv1']
+
+
+def test_invocation_lasts_until_its_last_job():
+    """
+    Arrange: An invocation which was scheduled at 10:05, with a job which ran until 11:00.
+    Act: Fetch its row.
+    Assert: Its duration runs to the end of the job, not to when it was scheduled.
+    """
+    gi = FakeGalaxy()
+    jobs = FakeGalaxy.get_jobs(gi, 'inv1', order_by='create_time')
+    jobs[-1]['update_time'] = '2021-05-01T11:00:00'
+    gi.get_jobs = lambda invocation_id=None, limit=None, offset=0, order_by=None: jobs
+    invocation_row, job_rows = export._fetch(gi, 'inv1')
+    assert invocation_row['seconds'] == 3600.0
+
+
+def test_parquet_parts_read_as_one_table(tmp_path):
+    """
+    Arrange: A finished invocation, and pyarrow if it is installed.
+    Act: Export it as Parquet, then export again with a new invocation.
+    Assert: The jobs directory reads as one table holding the jobs of both.
+    """
+    pq = pytest.importorskip('pyarrow.parquet')
+    gi = FakeGalaxy()
+    gi.get_jobs = lambda invocation_id=None, limit=None, offset=0, order_by=None: FakeGalaxy.get_jobs(gi, 'inv1', order_by='create_time')  # both have finished
+    with ThreadPoolExecutor(2) as pool:
+        export._export(gi, ['inv1'], str(tmp_path), 'parquet', pool)
+        export._export(gi, ['inv1', 'inv2'], str(tmp_path), 'parquet', pool)
+    jobs = pq.read_table(str(tmp_path / 'jobs'))
+    assert sorted(set(jobs.column('invocation_id').to_pylist())) == ['inv1', 'inv2']
+    assert jobs.num_rows == 6
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_gc
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for cleaning up histories with `gxwf gc`.
+"""
+from click.testing import CliRunner
+
+from gxwf import utils
+from gxwf.subcommands import gc
+
+
+class FakeGalaxy(object):
+    def __init__(self, histories, invocation_states=None):
+        self.histories = self.invocations = self
+        self.listed = histories
+        self.invocation_states = invocation_states or {}
+        self.deleted = []
+
+    def _get(self, params=None):
+        if 'history_id' in params:
+            return [{'state': state} for state in self.invocation_states.get(params['history_id'], [])]
+        return self.listed
+
+    def delete_history(self, history_id, purge=False):
+        if history_id == 'broken':
+            raise ConnectionError('server error')
+        self.deleted.append(history_id)
+
+
+HISTORIES = [
+    {'id': 'h1', 'name': 'gxwf_history', 'tags': ['gxwf'], 'state': 'ok', 'size': 100, 'update_time': '2020-01-01T00:00:00'},
+    {'id': 'h2', 'name': 'gxwf_history', 'tags': ['gxwf'], 'state': 'error', 'size': 200, 'update_time': '2020-01-01T00:00:00'},
+    {'id': 'h3', 'name': 'recent', 'tags': ['gxwf'], 'state': 'ok', 'size': 300, 'update_time': '2999-01-01T00:00:00'},
+    {'id': 'mine', 'name': 'GXWF datasets', 'tags': ['gxwf'], 'state': 'ok', 'size': 1, 'update_time': '2020-01-01T00:00:00'},
+    {'id': 'other', 'name': 'renamed datasets', 'tags': ['gxwf'], 'state': 'ok', 'size': 1, 'update_time': '2020-01-01T00:00:00'},
+    {'id': 'unnamed', 'name': 'GXWF datasets', 'tags': ['gxwf'], 'state': 'ok', 'size': 1, 'update_time': '2020-01-01T00:00:00'},
+    {'id': 'untagged', 'name': 'scratch', 'tags': [], 'state': 'ok', 'size': 1, 'update_time': '2020-01-01T00:00:00'},
+]
+
+
+def test_datasets_histories_of_all_logins_protected():
+    """
+    Arrange: gxwf histories, among them the `GXWF datasets` histories of two logins (one renamed) and one of an unknown login.
+    Act: List the histories gc may delete, then select old ones in the error state or with failed invocations.
+    Assert: No `GXWF datasets` history is ever listed, and the filters select the expected histories.
+    """
+    gi = FakeGalaxy(HISTORIES, {'h1': ['failed'], 'h2': ['scheduled']})
+    protected = gc._protected_ids({'logins': {'a': {'hid': 'mine'}, 'b': {'hid': 'other'}}})
+    histories = gc._gxwf_histories(gi, protected)
+
+    assert [h['id'] for h in histories] == ['h1', 'h2', 'h3']
+    assert [h['id'] for h in gc._select(gi, histories, 30, ['error'], [], 2)] == ['h2']
+    assert [h['id'] for h in gc._select(gi, histories, 30, [], ['failed'], 2)] == ['h1']
+
+
+def test_gc_confirms_and_counts_only_deleted(monkeypatch):
+    """
+    Arrange: Two old histories, one of which fails to delete.
+    Act: Run gc, declining the confirmation, then with --yes.
+    Assert: Nothing is deleted when declined; otherwise only the size of the history actually deleted is reported as freed.
+    """
+    histories = [dict(HISTORIES[0]), dict(HISTORIES[1], id='broken')]
+    gi = FakeGalaxy(histories)
+    monkeypatch.setattr(utils, '_login', lambda: (gi, {'hid': 'mine'}, {}))
+    monkeypatch.setattr(utils, '_read_configfile', lambda: {'logins': {'a': {'hid': 'mine'}}})
+
+    result = CliRunner().invoke(gc.gc, ['--purge'], input='n\n')
+    assert gi.deleted == []
+    assert 'Purge 2 histories' in result.output
+
+    result = CliRunner().invoke(gc.gc, ['--purge', '--yes'])
+    assert gi.deleted == ['h1']
+    assert '1 histories purged; 100 B freed' in result.output
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_invocations
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for waiting for and downloading invocation outputs with `gxwf invocations download`.
+"""
+import os
+
+from gxwf.subcommands import invocations
+
+
+class FakeGalaxy(object):
+    """
+    An invocation which is scheduled on the second poll, with a dataset output which is ok from the start and the
+    given populated states of its output collection on each poll (the last one repeated).
+    """
+    def __init__(self, collection_states):
+        self.invocations = self.dataset_collections = self.histories = self
+        self.collection_states = collection_states
+        self.polls = 0
+
+    def show_invocation(self, invocation_id):
+        self.polls += 1
+        return {'id': invocation_id, 'history_id': 'h1', 'state': 'scheduled' if self.polls > 1 else 'ready',
+                'outputs': {'report': {'id': 'd1'}}, 'output_collections': {'reads': {'id': 'c1'}}}
+
+    def show_dataset_collection(self, collection_id):
+        state = self.collection_states[min(self.polls, len(self.collection_states)) - 1]
+        elements = [{'element_identifier': 's1', 'element_type': 'hda', 'object': {'id': 'd2'}}] if state == 'ok' else []
+        return {'id': collection_id, 'populated_state': state, 'populated_state_message': 'tool failed', 'elements': elements}
+
+    def _get(self, id=None, contents=False, params=None):
+        return [{'id': 'd1', 'state': 'ok'}, {'id': 'd2', 'state': 'ok'}]
+
+
+def _download(monkeypatch, gi, tmp_path):
+    monkeypatch.setattr(invocations, '_fetch_output', lambda gi, ds_id, path: os.path.join(*path))
+    return invocations._download_outputs(gi, 'inv1', str(tmp_path), 2, 0)
+
+
+def test_collection_downloaded_once_populated(monkeypatch, tmp_path):
+    """
+    Arrange: An output collection which is still being populated on the first polls.
+    Act: Wait for the invocation and download its outputs.
+    Assert: Both the dataset and the collection's element are downloaded, with no failures.
+    """
+    gi = FakeGalaxy(['new', 'new', 'ok'])
+    downloaded, failures = _download(monkeypatch, gi, tmp_path)
+    assert sorted(os.path.relpath(path, str(tmp_path)) for path in downloaded) == sorted(['report', os.path.join('reads', 's1')])
+    assert failures == []
+    assert gi.polls == 3
+
+
+def test_failed_collection_stops_waiting(monkeypatch, tmp_path):
+    """
+    Arrange: An output collection which fails to be populated.
+    Act: Wait for the invocation and download its outputs.
+    Assert: The loop ends, the dataset output is downloaded and the collection is reported as a failure.
+    """
+    gi = FakeGalaxy(['new', 'failed'])
+    downloaded, failures = _download(monkeypatch, gi, tmp_path)
+    assert [os.path.basename(path) for path in downloaded] == ['report']
+    assert failures == [(os.path.join(str(tmp_path), 'reads'), 'collection could not be populated: tool failed')]
+    assert gi.polls == 2
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_invoke
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for invoking workflows, with Galaxy creating the history as part of each invocation.
+"""
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from gxwf import utils
+from gxwf import ledger
+from gxwf.subcommands import invoke
+
+
+class FakeGalaxy(object):
+    """
+    A server recording the requests made to it, which creates a new history for each invocation not given one, or rejects them all.
+    """
+    def __init__(self, fail=False):
+        self.workflows = self.histories = self
+        self.fail = fail
+        self.requests = []
+        self.tagged = threading.Event()
+
+    def invoke_workflow(self, wf_id, inputs=None, params=None, history_name=None, history_id=None):
+        self.requests.append(('invoke', history_name, history_id))
+        if self.fail:
+            raise ConnectionError('bad dataset ID')
+        n = sum(1 for request in self.requests if request[0] == 'invoke')
+        return {'id': 'inv{}'.format(n), 'history_id': history_id or 'new{}'.format(n), 'workflow_id': 'wfi'}
+
+    def create_history(self, name):
+        self.requests.append(('create_history', name, None))
+        return {'id': 'shared'}
+
+    def create_history_tag(self, history_id, tag):
+        self.requests.append(('tag', history_id, tag))
+        self.tagged.set()
+
+    def delete_history(self, history_id, purge=False):
+        self.requests.append(('delete_history', history_id, purge))
+
+
+@pytest.fixture(autouse=True)
+def no_completion_index(monkeypatch):
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+
+
+INPUTS = {'wf_id': 'wf1', 'inputs': {'0': {'src': 'hda', 'id': 'ds1'}}, 'params': {}}
+
+
+def test_history_created_by_invocation():
+    """
+    Arrange: A server accepting invocations.
+    Act: Invoke a workflow in a new history.
+    Assert: The history is named in the invocation request rather than created first, and is tagged afterwards.
+    """
+    gi = FakeGalaxy()
+    run = invoke._invoke(gi, INPUTS, 'my history')
+
+    assert run['history_id'] == 'new1'
+    assert gi.tagged.wait(5)
+    assert gi.requests == [('invoke', 'my history', None), ('tag', 'new1', 'gxwf')]
+
+
+def test_failed_invocation_leaves_nothing_behind():
+    """
+    Arrange: A server rejecting the invocation.
+    Act: Invoke a workflow.
+    Assert: None is returned, and no history was created, so there is none to tidy up.
+    """
+    gi = FakeGalaxy(fail=True)
+    assert invoke._invoke(gi, INPUTS, 'my history') is None
+    assert gi.requests == [('invoke', 'my history', None)]
+
+
+@pytest.mark.parametrize('single_history', [False, True])
+def test_batch_from_yaml(tmp_path, monkeypatch, single_history):
+    """
+    Arrange: Two YAML files of inputs.
+    Act: Invoke them as a batch, with and without --single-history.
+    Assert: Each gets its own history from its invocation request, or both share one history created (and tagged) up front.
+    """
+    gi = FakeGalaxy()
+    monkeypatch.setattr(utils, '_login', lambda: (gi, {'hid': 'h0'}, {}))
+    monkeypatch.setattr(ledger, '_load_ledger', lambda cnfg: ledger.Ledger(str(tmp_path / 'ledger.jsonl')))
+    monkeypatch.setattr(invoke.api, '_run_record', lambda gi, inputs_dict, run_ledger: {'key': inputs_dict['inputs']['0']['id']})
+    paths = []
+    for n in (1, 2):
+        paths.append(str(tmp_path / 'inputs{}.yml'.format(n)))
+        utils._write_to_file(dict(INPUTS, inputs={'0': {'src': 'hda', 'id': 'ds{}'.format(n)}}), paths[-1])
+
+    result = CliRunner().invoke(invoke.from_yaml, paths + (['--single-history'] if single_history else []))
+    assert result.exit_code == 0, result.output
+    invocations = [request for request in gi.requests if request[0] == 'invoke']
+    if single_history:
+        assert gi.requests[:2] == [('create_history', 'gxwf_history', None), ('tag', 'shared', 'gxwf')]
+        assert invocations == [('invoke', None, 'shared')] * 2
+    else:
+        assert not [request for request in gi.requests if request[0] == 'create_history']
+        assert invocations == [('invoke', 'gxwf_history', None)] * 2
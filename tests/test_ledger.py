@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_ledger
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for the local run ledger and call-caching of identical runs.
+"""
+from gxwf import ledger
+from gxwf.subcommands import invoke
+
+
+def test_ledger_index_follows_appends(tmp_path):
+    """
+    Arrange: A ledger with a run recorded by one process.
+    Act: Append an outcome and another run through a second ledger object, then query the first.
+    Assert: Records are found by run key, invocation, workflow and dataset, including those appended since the index was built.
+    """
+    path = str(tmp_path / 'ledger.jsonl')
+    first = ledger.Ledger(path)
+    first.append({'type': 'run', 'key': 'k1', 'workflow_id': 'wf1', 'inputs': {'0': {'src': 'hda', 'id': 'ds1'}}, 'invocation_id': 'inv1'})
+    assert [r['invocation_id'] for r in first.find('dataset', 'ds1')] == ['inv1']
+
+    second = ledger.Ledger(path)
+    second.append({'type': 'outcome', 'invocation_id': 'inv1', 'state': 'ok'})
+    second.append({'type': 'run', 'key': 'k2', 'workflow_id': 'wf1', 'inputs': {}, 'invocation_id': 'inv2'})
+
+    assert first.outcome('inv1') == 'ok'
+    assert [r['invocation_id'] for r in first.find('workflow', 'wf1')] == ['inv1', 'inv2']
+    assert [r['invocation_id'] for r in first.runs()] == ['inv2', 'inv1']
+    assert first.find('key', 'missing') == []
+
+
+class FakeGalaxy(object):
+    """
+    Just enough of a GalaxyInstance to invoke a workflow whose invocations all succeed.
+    """
+    def __init__(self):
+        self.invoked = 0
+        self.purged = set()
+        self.workflows = self
+        self.datasets = self
+        self.invocations = self
+        self.histories = self
+
+    def show_workflow(self, wf_id):
+        return {'version': 2}
+
+    def show_dataset(self, ds_id):
+        return {'hashes': [{'hash_function': 'MD5', 'hash_value': 'abc'}]}
+
+    def invoke_workflow(self, wf_id, inputs=None, params=None, history_name=None, history_id=None):
+        self.invoked += 1
+        return {'id': 'inv{}'.format(self.invoked), 'history_id': 'h{}'.format(self.invoked), 'workflow_id': 'wfi'}
+
+    def show_invocation(self, invocation_id):
+        return {'id': invocation_id, 'state': 'scheduled'}
+
+    def get_invocation_summary(self, invocation_id):
+        return {'states': {'ok': 2}}
+
+    def show_history(self, history_id):
+        return {'id': history_id, 'deleted': history_id in self.purged, 'purged': history_id in self.purged}
+
+    def create_history_tag(self, history_id, tag):
+        pass
+
+
+def test_identical_run_is_reused(tmp_path, monkeypatch):
+    """
+    Arrange: A workflow whose runs succeed, and an empty ledger.
+    Act: Invoke the same run twice, then once more with reuse switched off.
+    Assert: The second run reuses the first invocation, and its outcome is recorded so the server isn't asked again.
+    """
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+    run_ledger = ledger.Ledger(str(tmp_path / 'ledger.jsonl'))
+    gi = FakeGalaxy()
+    inputs_dict = {'wf_id': 'wf1', 'inputs': {'0': {'src': 'hda', 'id': 'ds1'}}, 'params': {'3': {'threshold': 1}}}
+
+    assert invoke._invoke(gi, inputs_dict, 'h', run_ledger=run_ledger)['id'] == 'inv1'
+    reused = invoke._invoke(gi, inputs_dict, 'h', run_ledger=run_ledger)
+    assert reused['id'] == 'inv1' and reused['reused']
+    assert run_ledger.outcome('inv1') == 'ok'
+    assert invoke._invoke(gi, inputs_dict, 'h', run_ledger=run_ledger, reuse=False)['id'] == 'inv2'
+    assert gi.invoked == 2
+
+
+def test_edited_workflow_not_reused(tmp_path, monkeypatch):
+    """
+    Arrange: A run which succeeded, recorded in the ledger.
+    Act: Edit the workflow, then submit the same run again in a later command (with the ledger loaded afresh).
+    Assert: The new version is looked up, so the run is submitted rather than reusing the old version's invocation.
+    """
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+    gi = FakeGalaxy()
+    inputs_dict = {'wf_id': 'wf1', 'inputs': {'0': {'src': 'hda', 'id': 'ds1'}}, 'params': {}}
+    assert invoke._invoke(gi, inputs_dict, 'h', run_ledger=ledger.Ledger(str(tmp_path / 'ledger.jsonl')))['id'] == 'inv1'
+
+    gi.show_workflow = lambda wf_id: {'version': 3}
+    run = invoke._invoke(gi, inputs_dict, 'h', run_ledger=ledger.Ledger(str(tmp_path / 'ledger.jsonl')))
+    assert run['id'] == 'inv2' and not run['reused']
+
+
+def test_purged_run_not_reused(tmp_path, monkeypatch):
+    """
+    Arrange: A run which succeeded, recorded in the ledger, whose history has since been purged (e.g. by `gxwf gc --purge`).
+    Act: Submit the same run again.
+    Assert: The workflow is invoked again rather than handing back an invocation whose outputs are gone.
+    """
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+    run_ledger = ledger.Ledger(str(tmp_path / 'ledger.jsonl'))
+    gi = FakeGalaxy()
+    inputs_dict = {'wf_id': 'wf1', 'inputs': {'0': {'src': 'hda', 'id': 'ds1'}}, 'params': {}}
+    assert invoke._invoke(gi, inputs_dict, 'h', run_ledger=run_ledger)['id'] == 'inv1'
+
+    gi.purged.add('h1')
+    run = invoke._invoke(gi, inputs_dict, 'h', run_ledger=run_ledger)
+    assert run['id'] == 'inv2' and not run['reused']
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_mapping
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for mapping datasets to workflow inputs automatically, for `gxwf invoke auto`.
+"""
+from gxwf import mapping
+
+WORKFLOW = {
+    'inputs': {'0': {'label': 'forward'}, '1': {'label': 'reverse'}, '2': {'label': 'reference'}, '3': {'label': 'threshold'}},
+    'steps': {
+        '0': {'type': 'data_input', 'tool_inputs': {'format': ['fastqsanger']}},
+        '1': {'type': 'data_input', 'tool_inputs': {'format': ['fastqsanger']}},
+        '2': {'type': 'data_input', 'tool_inputs': {'format': ['fasta']}},
+        '3': {'type': 'parameter_input', 'tool_inputs': {'parameter_type': 'float', 'default': 0.5}},
+        '4': {'type': 'tool', 'tool_inputs': {}},
+    },
+}
+
+
+def _candidates(*names):
+    return [mapping.Candidate('id_' + name, name, mapping._split_name(name)[1].replace('fastq', 'fastqsanger'), 'hda', '') for name in names]
+
+
+def test_samples_mapped_by_label():
+    """
+    Arrange: A workflow taking paired reads and a reference, and a history with two samples of reads, a reference and an unpaired read file.
+    Act: Map the datasets to the inputs.
+    Assert: Each complete sample is a run sharing the reference, and the incomplete one is skipped.
+    """
+    index = mapping.CandidateIndex(_candidates('sampleA_R1.fastq', 'sampleA_R2.fastq', 'sampleB_R1.fastq', 'sampleB_R2.fastq',
+                                               'sampleC_R1.fastq', 'hg38.fasta'))
+    result = mapping._map_inputs(mapping._workflow_inputs(WORKFLOW), index)
+
+    assert not result.missing
+    assert sorted(result.runs) == ['sampleA', 'sampleB']
+    assert list(result.skipped) == ['sampleC']
+    inputs_dict = mapping._inputs_dict('wf1', result.runs['sampleB'])
+    assert inputs_dict['inputs'] == {'0': {'src': 'hda', 'id': 'id_sampleB_R1.fastq'}, '1': {'src': 'hda', 'id': 'id_sampleB_R2.fastq'},
+                                     '2': {'src': 'hda', 'id': 'id_hg38.fasta'}}
+
+
+def test_patterns_and_params():
+    """
+    Arrange: Reads named unlike the input labels.
+    Act: Map them with a pattern per input, and a parameter value.
+    Assert: Samples are taken from the patterns, and the parameter is given to every run.
+    """
+    index = mapping.CandidateIndex(_candidates('s1.a.fastq', 's1.b.fastq', 's2.a.fastq', 's2.b.fastq', 'ref.fasta'))
+    result = mapping._map_inputs(mapping._workflow_inputs(WORKFLOW), index, {'forward': '*.a.fastq', '1': '*.b.fastq'}, {'threshold': '0.1'})
+
+    assert sorted(result.runs) == ['s1', 's2']
+    assert result.runs['s2']['1'].name == 's2.b.fastq'
+    assert result.runs['s1']['3'] == '0.1'
+
+
+def test_generic_labels_not_guessed():
+    """
+    Arrange: A workflow with two inputs whose labels match no dataset names.
+    Act: Map two datasets to it, without and then with patterns.
+    Assert: Without patterns both inputs are reported as ambiguous rather than given the same dataset; with them, each sample gets two different datasets.
+    """
+    workflow = {'inputs': {'0': {'label': 'Input 1'}, '1': {'label': 'Input 2'}},
+                'steps': {'0': {'type': 'data_input', 'tool_inputs': {}}, '1': {'type': 'data_input', 'tool_inputs': {}}}}
+    inputs = mapping._workflow_inputs(workflow)
+    index = mapping.CandidateIndex(_candidates('a.fastq', 'b.fastq'))
+    result = mapping._map_inputs(inputs, index)
+
+    assert not result.runs
+    assert result.ambiguous == ['Input 1', 'Input 2']
+
+    index = mapping.CandidateIndex(_candidates('a.x.fastq', 'a.y.fastq', 'b.x.fastq', 'b.y.fastq'))
+    result = mapping._map_inputs(inputs, index, {'Input 1': '*.x.fastq', 'Input 2': '*.y.fastq'})
+    assert sorted(result.runs) == ['a', 'b']
+    assert (result.runs['a']['0'].name, result.runs['a']['1'].name) == ('a.x.fastq', 'a.y.fastq')
+
+
+def test_shared_label_words_ignored():
+    """
+    Arrange: Inputs labelled 'Forward reads' and 'Reverse reads', and reads named like s1_reads_R1.fastq.
+    Act: Map the reads to the inputs.
+    Assert: One run per sample, without spurious samples from the shared word 'reads'.
+    """
+    workflow = {'inputs': {'0': {'label': 'Forward reads'}, '1': {'label': 'Reverse reads'}},
+                'steps': {'0': {'type': 'data_input', 'tool_inputs': {'format': ['fastqsanger']}},
+                          '1': {'type': 'data_input', 'tool_inputs': {'format': ['fastqsanger']}}}}
+    index = mapping.CandidateIndex(_candidates('s1_reads_R1.fastq', 's1_reads_R2.fastq', 's2_reads_R1.fastq', 's2_reads_R2.fastq'))
+    result = mapping._map_inputs(mapping._workflow_inputs(workflow), index)
+
+    assert sorted(result.runs) == ['s1_reads', 's2_reads']
+    assert not result.skipped
+    assert result.runs['s2_reads']['1'].name == 's2_reads_R2.fastq'
+
+
+def test_numbered_samples_kept_apart():
+    """
+    Arrange: Inputs labelled 'Forward reads' and 'Reverse reads', and reads of samples numbered 1 and 2, e.g. sample_1_R1.fastq.
+    Act: Map the reads to the inputs.
+    Assert: Only the R1/R2 marker is taken off the names, so each sample is a run of its own reads.
+    """
+    workflow = {'inputs': {'0': {'label': 'Forward reads'}, '1': {'label': 'Reverse reads'}},
+                'steps': {'0': {'type': 'data_input', 'tool_inputs': {'format': ['fastqsanger']}},
+                          '1': {'type': 'data_input', 'tool_inputs': {'format': ['fastqsanger']}}}}
+    index = mapping.CandidateIndex(_candidates('sample_1_R1.fastq', 'sample_1_R2.fastq', 'sample_2_R1.fastq', 'sample_2_R2.fastq'))
+    result = mapping._map_inputs(mapping._workflow_inputs(workflow), index)
+
+    assert sorted(result.runs) == ['sample_1', 'sample_2']
+    assert not result.skipped
+    assert (result.runs['sample_2']['0'].name, result.runs['sample_2']['1'].name) == ('sample_2_R1.fastq', 'sample_2_R2.fastq')
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_pipeline
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for running pipelines of workflows with `gxwf pipeline`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import pytest
+
+from gxwf.subcommands import invoke
+from gxwf.subcommands import pipeline
+
+SPEC = {'steps': {
+    'qc': {'workflow': 'qc_wf', 'inputs': {'0': 'reads'}},
+    'align': {'workflow': 'align_wf', 'inputs': {'0': {'from': 'qc', 'output': 'trimmed'}, '1': 'ref'}},
+    'report': {'workflow': 'report_wf', 'inputs': {'0': {'from': 'qc', 'output': 'missing'}}},
+    'other': {'workflow': 'other_wf', 'inputs': {'0': 'reads'}},
+}}
+
+
+class FakeGalaxy(object):
+    """
+    The qc invocation is being scheduled on the first poll, then has its trimmed output queued, then ok.
+    """
+    def __init__(self):
+        self.invoked = []
+        self.polls = 0
+        self.workflows = self.invocations = self.histories = self
+
+    def invoke_workflow(self, wf_id, inputs=None, params=None, history_name=None, history_id=None):
+        self.invoked.append((wf_id, inputs))
+        return {'id': 'inv_' + wf_id, 'history_id': 'h_' + wf_id}
+
+    def show_invocation(self, invocation_id):
+        self.polls += 1
+        if self.polls == 1:
+            return {'id': invocation_id, 'history_id': 'h_qc_wf', 'state': 'ready', 'outputs': {}}
+        return {'id': invocation_id, 'history_id': 'h_qc_wf', 'state': 'scheduled', 'outputs': {'trimmed': {'id': 'ds_trimmed'}}}
+
+    def _get(self, id=None, contents=False, params=None):
+        return [{'id': 'ds_trimmed', 'state': 'queued' if self.polls == 2 else 'ok'}]
+
+    def create_history_tag(self, history_id, tag):
+        pass
+
+
+def test_steps_run_as_upstream_outputs_are_ready(monkeypatch):
+    """
+    Arrange: A pipeline where align and report take outputs of qc, one of which it never makes, and other is independent.
+    Act: Run scheduler cycles until no step is left pending.
+    Assert: Independent steps go first, align is submitted with qc's output once it is ok, and report is blocked.
+    """
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+    gi = FakeGalaxy()
+    steps = pipeline._load_spec(SPEC, {'reads': 'ds_reads'})
+    assert pipeline._stages(steps) == [['other', 'qc'], ['align', 'report']]
+
+    scheduler = pipeline.Scheduler(gi, steps, 'test')
+    submitted = []
+    with ThreadPoolExecutor(2) as pool:
+        while scheduler.pending:
+            submitted.append(scheduler.cycle(pool))
+    assert submitted == [['other', 'qc'], [], [], ['align']]
+    assert gi.invoked[-1] == ('align_wf', {'0': {'src': 'hda', 'id': 'ds_trimmed'}, '1': {'src': 'hda', 'id': 'ref'}})
+    assert scheduler.blocked == {'report': 'step qc has no output missing'}
+
+
+def test_cycles_are_rejected():
+    """
+    Arrange/Act: Load a pipeline whose two steps each take an output of the other.
+    Assert: It is rejected before anything is run.
+    """
+    spec = {'steps': {'a': {'workflow': 'w', 'inputs': {'0': {'from': 'b', 'output': 'x'}}},
+                      'b': {'workflow': 'w', 'inputs': {'0': {'from': 'a', 'output': 'x'}}}}}
+    with pytest.raises(click.ClickException):
+        pipeline._load_spec(spec, {})
+
+
+def test_poll_errors_retried(monkeypatch):
+    """
+    Arrange: A server which fails the first poll of qc's invocation with a connection error.
+    Act: Run scheduler cycles until no step is left pending.
+    Assert: The error costs one cycle, and align is still submitted once qc's output is ok.
+    """
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+    gi = FakeGalaxy()
+    show_invocation = gi.show_invocation
+    failed = []
+
+    def flaky(invocation_id):
+        if not failed:
+            failed.append(invocation_id)
+            raise ConnectionError('connection reset')
+        return show_invocation(invocation_id)
+
+    gi.show_invocation = flaky
+    spec = {'steps': {name: SPEC['steps'][name] for name in ('qc', 'align')}}
+    scheduler = pipeline.Scheduler(gi, pipeline._load_spec(spec, {}), 'test')
+    submitted = []
+    with ThreadPoolExecutor(2) as pool:
+        while scheduler.pending:
+            submitted.append(scheduler.cycle(pool))
+    assert submitted == [['qc'], [], [], [], ['align']]
+    assert not scheduler.blocked
+
+
+def test_timeout_gives_up_on_waiting_steps(monkeypatch, tmp_path):
+    """
+    Arrange: A pipeline whose second step waits for an output which stays queued.
+    Act: Run it with a short --timeout.
+    Assert: The command stops, shows the summary table and reports the waiting step as timed out.
+    """
+    from click.testing import CliRunner
+    from gxwf import ledger
+    from gxwf import utils
+
+    monkeypatch.setattr(invoke.completion, '_update_index', lambda *args, **kwargs: None)
+    gi = FakeGalaxy()
+    gi._get = lambda id=None, contents=False, params=None: [{'id': 'ds_trimmed', 'state': 'queued'}]
+    monkeypatch.setattr(utils, '_read_login', lambda: ({'hid': 'h0'}, {}))
+    monkeypatch.setattr(utils, '_login', lambda: (gi, {'hid': 'h0'}, {}))
+    monkeypatch.setattr(ledger, '_load_ledger', lambda cnfg: None)
+    spec_file = tmp_path / 'pipeline.yml'
+    spec_file.write_text('steps: {qc: {workflow: qc_wf, inputs: {"0": reads}}, align: {workflow: align_wf, inputs: {"0": {from: qc, output: trimmed}}}}')
+
+    result = CliRunner().invoke(pipeline.pipeline, [str(spec_file), '--timeout', '0.2', '--poll-interval', '0.05'])
+    assert 'timed out waiting for its inputs' in result.output
+    assert '1 steps could not be run' in result.output
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_policy
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for the retry and circuit breaking policy applied to Galaxy API calls.
+"""
+import pytest
+
+from bioblend import ConnectionError as BioblendConnectionError
+
+from gxwf import policy
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _sender(*outcomes):
+    """
+    A send function returning (or raising) each outcome in turn, and the list of calls made to it.
+    """
+    outcomes, calls = list(outcomes), []
+
+    def send(*args, **kwargs):
+        calls.append(args)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return send, calls
+
+
+def test_retries_idempotent_requests_only(monkeypatch):
+    """
+    Arrange: A policy which doesn't sleep, and servers failing with 502 before succeeding or asking to slow down.
+    Act: Send GET and POST requests.
+    Assert: The GET is retried until it succeeds, honouring Retry-After; the POST is not retried after a 502, but is after a 429.
+    """
+    delays = []
+    p = policy.RequestPolicy(retries=3, sleep=delays.append)
+
+    send, calls = _sender(FakeResponse(502), FakeResponse(503, {'Retry-After': '7'}), FakeResponse(200))
+    assert p.call('GET', send, 'url').status_code == 200
+    assert len(calls) == 3 and delays[1] == 7
+
+    send, calls = _sender(BioblendConnectionError('bad gateway', status_code=502))
+    with pytest.raises(BioblendConnectionError):
+        p.call('POST', send, 'url')
+    assert len(calls) == 1
+
+    send, calls = _sender(BioblendConnectionError('too many', status_code=429), FakeResponse(200))
+    assert p.call('POST', send, 'url').status_code == 200
+    assert len(calls) == 2
+
+
+def test_bad_retry_after_header_backs_off(monkeypatch):
+    """
+    Arrange: A policy which doesn't sleep, and a server answering 503 with a Retry-After header which is neither seconds nor a date.
+    Act: Send a GET request.
+    Assert: The header is ignored and the request is retried with the usual backoff, rather than crashing.
+    """
+    delays = []
+    p = policy.RequestPolicy(retries=3, sleep=delays.append)
+    send, calls = _sender(FakeResponse(503, {'Retry-After': 'garbage'}), FakeResponse(200))
+    assert p.call('GET', send, 'url').status_code == 200
+    assert len(calls) == 2 and len(delays) == 1
+
+
+def test_circuit_opens_after_repeated_failures():
+    """
+    Arrange: A policy which opens its circuit after two failures, and a server which keeps failing.
+    Act: Send requests until the circuit opens.
+    Assert: Further requests fail without being sent, until the reset timeout has passed.
+    """
+    p = policy.RequestPolicy(retries=0, failure_threshold=2, reset_timeout=60, sleep=lambda delay: None)
+    send, calls = _sender(FakeResponse(503), FakeResponse(503), FakeResponse(200))
+    p.call('GET', send, 'url')
+    p.call('GET', send, 'url')
+    with pytest.raises(policy.CircuitOpenError):
+        p.call('GET', send, 'url')
+    assert len(calls) == 2
+
+    p.opened_at -= 61  # as if the reset timeout had passed
+    assert p.call('GET', send, 'url').status_code == 200
+    assert p.opened_at is None and p.failures == 0
+
+
+def test_limits_shared_through_lock_dir(tmp_path):
+    """
+    Arrange: Two limiters sharing a lock directory, as two gxwf processes would, with one request in flight allowed.
+    Act: Hold a request open with one limiter, then send requests with both.
+    Assert: The other limiter can't send while the slot is held, and the shared bucket spaces requests out at the rate.
+    """
+    import threading
+    import time
+
+    first = policy.Limiter(str(tmp_path), rate=20, burst=1, max_in_flight=1)
+    second = policy.Limiter(str(tmp_path), rate=20, burst=1, max_in_flight=1)
+
+    sent = threading.Event()
+
+    def send():
+        with second.request():
+            sent.set()
+
+    with first.request():
+        thread = threading.Thread(target=send)
+        thread.start()
+        assert not sent.wait(0.2)
+    thread.join(1)
+    assert sent.is_set()
+
+    start = time.monotonic()
+    for limiter in (first, second, first, second):
+        with limiter.request():
+            pass
+    assert time.monotonic() - start >= 3 / 20 * 0.9  # the first token may still be in the bucket
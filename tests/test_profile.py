@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_profile
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for profiling workflow steps with `gxwf profile`.
+"""
+import subprocess
+import sys
+
+import pytest
+
+from gxwf import profiling
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_quantiles_by_step(monkeypatch, use_numpy):
+    """
+    Arrange: Values for two steps, with one missing, computed with numpy (if installed) or pure Python.
+    Act: Compute the median and 95th percentile of each step.
+    Assert: They match numpy's default (linear) interpolation.
+    """
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(profiling, '_numpy', lambda: None)
+    quantiles = profiling._quantiles([1, 2, 1, 1, 2, 1], [4.0, 10.0, 1.0, None, 20.0, 3.0], (0.5, 0.95))
+    assert quantiles[1][0] == 3 and quantiles[1][1] == pytest.approx([3.0, 3.9])
+    assert quantiles[2][0] == 2 and quantiles[2][1] == pytest.approx([15.0, 19.5])
+
+
+def test_critical_path():
+    """
+    Arrange: A diamond-shaped workflow (input 0, steps 1 and 2 both after it, step 3 after both) with step weights.
+    Act: Find the critical path.
+    Assert: It goes through the slower branch, with the branch's weight added.
+    """
+    workflow = {'steps': {'0': {'input_steps': {}}, '1': {'input_steps': {'in': {'source_step': 0}}},
+                          '2': {'input_steps': {'in': {'source_step': 0}}},
+                          '3': {'input_steps': {'a': {'source_step': 1}, 'b': {'source_step': 2}}}}}
+    path, total = profiling._critical_path(profiling._graph(workflow), {1: 5.0, 2: 60.0, 3: 10.0})
+    assert path == [0, 2, 3]
+    assert total == 70.0
+
+
+def test_step_stats_leave_rows_alone():
+    """
+    Arrange: Job rows of one step, one of them without metrics.
+    Act: Summarise them by step, then weigh the steps.
+    Assert: The rows are unchanged, and the stats and weights both fall back to the whole time of the job without metrics.
+    """
+    rows = [{'step_index': 1, 'invocation_id': 'i1', 'seconds': 100.0, 'runtime_seconds': 10.0},
+            {'step_index': 1, 'invocation_id': 'i2', 'seconds': 50.0, 'runtime_seconds': None}]
+    stats = profiling._step_stats(rows)
+
+    assert stats[1]['wait_seconds'][0] == 90.0
+    assert stats[1]['runtime_seconds'][0] == 30.0
+    assert rows[1]['runtime_seconds'] is None and 'wait_seconds' not in rows[0]
+    assert profiling._step_weights(rows) == {1: 30.0}
+
+
+def test_weights_without_job_metrics():
+    """
+    Arrange: Job rows of three chained steps from a server without job metrics.
+    Act: Weigh the steps and find the critical path.
+    Assert: Steps are weighed by their jobs' whole time, so the slowest step is on the path rather than every weight being 0.
+    """
+    rows = [{'step_index': step, 'invocation_id': 'i1', 'seconds': seconds, 'runtime_seconds': None}
+            for step, seconds in ((0, 5.0), (1, 60.0), (2, 5.0), (2, 20.0))]
+    weights = profiling._step_weights(rows)
+
+    assert weights == {0: 5.0, 1: 60.0, 2: 20.0}
+    assert profiling._critical_path({0: set(), 1: {0}, 2: {1}}, weights) == ([0, 1, 2], 85.0)
+
+
+def test_cli_does_not_import_numpy():
+    """
+    Arrange: A fresh interpreter.
+    Act: Import the CLI, as every gxwf command and shell completion does.
+    Assert: numpy is not imported.
+    """
+    code = 'import sys, gxwf.cli; print("numpy" in sys.modules)'
+    assert subprocess.check_output([sys.executable, '-c', code]).decode().strip() == 'False'
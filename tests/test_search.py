@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_search
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for the local search index.
+"""
+from gxwf.search import SearchIndex
+
+FIELDS = ('id', 'name', 'extension', 'tags', 'alias')
+RECORDS = [
+    {'id': '1', 'name': 'sample1_forward.fastq', 'extension': 'fastqsanger', 'tags': ['gxwf'], 'alias': 'happy_turing'},
+    {'id': '2', 'name': 'sample1_reverse.fastq', 'extension': 'fastqsanger', 'tags': ['gxwf'], 'alias': ''},
+    {'id': '3', 'name': 'sample1.bam', 'extension': 'bam', 'tags': [], 'alias': ''},
+]
+
+
+def _index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'index'), FIELDS)
+    index.update(RECORDS, complete=True)
+    return index
+
+
+def test_field_qualified_and_fuzzy_search(tmp_path):
+    """
+    Arrange: Index a few datasets.
+    Act: Search with field-qualified, misspelt and short terms.
+    Assert: The expected records are returned, best match first.
+    """
+    index = _index(tmp_path)
+    assert [r['id'] for r in index.search('ext:bam')] == ['3']
+    assert [r['id'] for r in index.search('tag:gxwf revrse')] == ['2']
+    assert [r['id'] for r in index.search('alias:turing')] == ['1']
+    assert [r['id'] for r in index.search('forward')][0] == '1'
+    assert index.search('name:nothing') == []
+
+
+def test_complete_update_removes_missing_records(tmp_path):
+    """
+    Arrange: Index a few datasets.
+    Act: Update the index with a listing missing one of them, and with a renamed one.
+    Assert: The missing record is gone and the renamed one is found by its new name only.
+    """
+    index = _index(tmp_path)
+    index.update([RECORDS[0], dict(RECORDS[1], name='renamed.fastq')], complete=True)
+    assert len(index) == 2
+    assert index.search('bam') == []
+    assert [r['id'] for r in index.search('renamed')] == ['2']
+    assert [r['id'] for r in index.search('name:reverse')] == []
+
+
+def test_queries_translate_to_server_filters():
+    """
+    Arrange/Act: Translate a query into workflow and dataset API parameters.
+    Assert: Field-qualified terms become the matching Galaxy filters and bare terms filter on name.
+    """
+    from gxwf import search
+
+    assert search._workflow_params('rnaseq owner:bob tag:paired') == {'search': "name:'rnaseq' user:'bob' tag:'paired'"}
+
+    params = search._dataset_params('reads ext:fastqsanger state:error', keys=('id', 'name'))
+    assert list(zip(params['q'], params['qv'])) == [('name-contains', 'reads'), ('extension-eq', 'fastqsanger'), ('state-eq', 'error'), ('deleted-eq', 'false')]
+    assert params['keys'] == 'id,name'
+
+
+def test_named_tuple_records(tmp_path):
+    """
+    Arrange: Index a few datasets, then replace one with a named tuple record.
+    Act: Search the index, asking for named tuples.
+    Assert: The records come back as named tuples with the indexed values.
+    """
+    from collections import namedtuple
+
+    Row = namedtuple('Row', FIELDS)
+    index = _index(tmp_path)
+    index.update([Row('3', 'sample1_sorted.bam', 'bam', [], 'quiet_hopper')])
+    assert index.search('ext:bam', row=Row) == [Row('3', 'sample1_sorted.bam', 'bam', [], 'quiet_hopper')]
+    assert index.search('hopper')[0]['name'] == 'sample1_sorted.bam'
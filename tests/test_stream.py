@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_stream
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for incremental parsing of API listings.
+"""
+import json
+
+import pytest
+
+from gxwf import stream
+
+
+def test_items_split_across_chunks():
+    """
+    Arrange: A listing with nested values, non-ASCII text and a trailing number, encoded as bytes.
+    Act: Parse it fed one byte at a time, and in a single chunk.
+    Assert: The same items are yielded either way, as they would be by json.loads.
+    """
+    items = [{'id': 'a1', 'name': 'Überlauf ✓', 'tags': ['x', 'y'], 'size': 12}, {'id': 'b2', 'nested': {'k': [1, 2.5, None]}}, 12345]
+    data = json.dumps(items, indent=1).encode()
+
+    assert list(stream._iter_array(data[i:i + 1] for i in range(len(data)))) == items
+    assert list(stream._iter_array([data])) == items
+    assert list(stream._iter_array([b' [ ] '])) == []
+
+
+def test_truncated_listing_raises():
+    """
+    Arrange/Act: Parse a listing which stops part of the way through.
+    Assert: An error is raised after the complete items, rather than the listing silently being cut short.
+    """
+    parsed = []
+    with pytest.raises(ValueError):
+        for item in stream._iter_array([b'[{"id": 1}, {"id"']):
+            parsed.append(item)
+    assert parsed == [{'id': 1}]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_sweep
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for expanding parameter sweeps with `gxwf invoke sweep`.
+"""
+import json
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from gxwf import utils
+from gxwf.subcommands import invoke
+
+
+def test_sweep_expansion():
+    """
+    Arrange: A sweep over a float range, a list of values and an input given by alias.
+    Act: Expand every combination and apply each to the base run.
+    Assert: The cartesian product is enumerated in order, ranges include their end, and runs are identified by what is submitted.
+    """
+    assert invoke._sweep_values({'range': [0.1, 0.3, 0.1]}) == [0.1, 0.2, 0.3]
+    assert invoke._sweep_values({'range': [1, 7, 3]}) == [1, 4, 7]
+
+    sweep = {'params': {3: {'threshold': [1, 2], 'mode': ['fast', 'exact', 'fast']}}, 'inputs': {'0': ['reads']}}
+    axes = invoke._sweep_axes(sweep, {'reads': 'f2db41e1'})
+    combinations = [invoke._combination(axes, n) for n in range(2 * 3 * 1)]
+    assert [[value for key, value in c][:2] for c in combinations] == [[1, 'fast'], [1, 'exact'], [1, 'fast'], [2, 'fast'], [2, 'exact'], [2, 'fast']]
+
+    base = {'wf_id': 'wf1', 'inputs': {'1': {'src': 'hda', 'id': 'x'}}, 'params': {}}
+    runs = [invoke._apply_combination(base, c) for c in combinations]
+    assert runs[0] == {'wf_id': 'wf1', 'inputs': {'0': {'src': 'hda', 'id': 'f2db41e1'}, '1': {'src': 'hda', 'id': 'x'}},
+                       'params': {'3': {'threshold': 1, 'mode': 'fast'}}}
+    assert base['params'] == {}
+    assert len({invoke._combination_key(run) for run in runs}) == 4  # the repeated 'fast' gives duplicate runs
+
+
+def test_bad_ranges_rejected():
+    """
+    Arrange: Ranges with a zero step, a step going away from their stop, and too few bounds.
+    Act: Expand them.
+    Assert: Each is rejected with a BadParameter, while a descending range with a negative step is expanded.
+    """
+    for bounds in ([1, 5, 0], [1, 5, -1], [5, 1, 1], [1, 5]):
+        with pytest.raises(click.BadParameter):
+            invoke._sweep_values({'range': bounds})
+    assert invoke._sweep_values({'range': [3, 1, -1]}) == [3, 2, 1]
+
+
+def test_duplicates_counted_apart_from_submitted(tmp_path, monkeypatch):
+    """
+    Arrange: A sweep with a repeated value, one of whose combinations was already submitted.
+    Act: Do a dry run of the sweep.
+    Assert: The duplicate and the already submitted combination are reported separately.
+    """
+    monkeypatch.setattr(utils, '_read_login', lambda: ({}, {}))
+    sweep_file = tmp_path / 'sweep.yml'
+    sweep_file.write_text('wf_id: wf1\ninputs: {}\nparams: {}\nsweep: {params: {"3": {mode: [fast, exact, fast]}}}\n')
+    key = invoke._combination_key({'wf_id': 'wf1', 'inputs': {}, 'params': {'3': {'mode': 'exact'}}})
+    (tmp_path / 'sweep.results.json').write_text(json.dumps({key: {'invocation_id': 'inv1'}}))
+
+    result = CliRunner().invoke(invoke.sweep, [str(sweep_file), '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[0] == '3 combinations, 1 to submit (1 already submitted, 1 duplicates).'
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_sync
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for incremental updates of the local store with `gxwf sync`.
+"""
+import json
+
+from gxwf import utils
+from gxwf import search as search_index
+from gxwf.subcommands import sync
+
+
+class FakeResponse(object):
+    def __init__(self, items):
+        self.status_code = 200
+        self.data = json.dumps(items).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunk_size):
+        return (self.data[i:i + chunk_size] for i in range(0, len(self.data), chunk_size))
+
+
+class FakeGalaxy(object):
+    """
+    Serves listings from self.items, applying the update_time filter, sorting and paging as Galaxy does (unless ignore_limit is set).
+    """
+    url = 'https://galaxy.example/api'
+
+    def __init__(self, items, ignore_limit=False):
+        self.items = items
+        self.ignore_limit = ignore_limit
+        self.requests = []
+
+    def make_get_request(self, url, params=None, stream=False):
+        path, params = url[len(self.url):], dict(params or {})
+        self.requests.append((path, params))
+        items = list(self.items[path])
+        filters = dict(zip(params.get('q', []), params.get('qv', [])))
+        if 'update_time-ge' in filters:
+            items = [item for item in items if item['update_time'] >= filters['update_time-ge']]
+        if 'deleted' in filters:
+            items = [item for item in items if str(item.get('deleted', False)) == filters['deleted']]
+        items.sort(key=lambda item: item['update_time'], reverse=bool(params.get('sort_desc')))
+        if not self.ignore_limit and 'limit' in params:
+            items = items[params['offset']:params['offset'] + params['limit']]
+        return FakeResponse(items)
+
+
+def _dataset(id_, update_time, history_id='h0', deleted=False):
+    return {'id': id_, 'name': 'reads {}'.format(id_), 'extension': 'fastqsanger', 'tags': [], 'history_id': history_id,
+            'state': 'ok', 'deleted': deleted, 'update_time': update_time}
+
+
+def test_pages(monkeypatch):
+    """
+    Arrange: A listing of five items, with pages of two, from a server which pages and from one which ignores limit.
+    Act: Fetch the listing page by page.
+    Assert: All items are yielded once; the paging server is asked for each page, the other only once.
+    """
+    monkeypatch.setattr(sync, 'PAGE_SIZE', 2)
+    items = {'/datasets': [_dataset('d{}'.format(n), 't{}'.format(n)) for n in range(5)]}
+
+    gi = FakeGalaxy(items)
+    assert [item['id'] for item in sync._pages(gi, '/datasets', {}, ('id',))] == ['d0', 'd1', 'd2', 'd3', 'd4']
+    assert [params['offset'] for path, params in gi.requests] == [0, 2, 4]
+
+    gi = FakeGalaxy(items, ignore_limit=True)
+    assert len(list(sync._pages(gi, '/datasets', {}))) == 5
+    assert len(gi.requests) == 1
+
+
+def test_sync_applies_deltas(tmp_path, monkeypatch):
+    """
+    Arrange: A server with three datasets, two of them in the gxwf history.
+    Act: Sync, then delete one dataset, add another and sync again.
+    Assert: The second sync only asks for datasets updated since the high-water mark, and the stores of all datasets and of the gxwf history get the changes.
+    """
+    monkeypatch.setattr(utils, 'CACHE_DIR', str(tmp_path))
+    cnfg = {'url': 'https://galaxy.example', 'api_key': 'k', 'hid': 'h0'}
+    items = {'/datasets': [_dataset('d1', '2021-01-01'), _dataset('d2', '2021-01-02'), _dataset('d3', '2021-01-03', history_id='h1')]}
+    gi = FakeGalaxy(items)
+
+    assert sync._sync(gi, cnfg, {'my_reads': 'd1'}, ('datasets',)) == {'datasets': (3, 0)}
+    assert sync._read_state(cnfg) == {'datasets': '2021-01-03'}
+    assert 'q' not in gi.requests[0][1]  # the first sync fetches everything
+
+    items['/datasets'][0] = _dataset('d1', '2021-01-04', deleted=True)
+    items['/datasets'].append(_dataset('d4', '2021-01-05'))
+    gi.requests = []
+    assert sync._sync(gi, cnfg, {}, ('datasets',)) == {'datasets': (2, 1)}  # d3 again, as the filter includes the mark itself
+    assert gi.requests[0][1]['qv'] == ['2021-01-03']
+    assert sync._read_state(cnfg) == {'datasets': '2021-01-05'}
+
+    assert sorted(search_index._load_index(cnfg, 'datasets_all').numbers) == ['d2', 'd3', 'd4']
+    assert sorted(search_index._load_index(cnfg, 'datasets').numbers) == ['d2', 'd4']
+
+
+def test_newest_first_stops_at_high_water_mark(tmp_path, monkeypatch):
+    """
+    Arrange: Workflows which can only be sorted by update_time, not filtered by it, one of them deleted since the last sync.
+    Act: Sync workflows with a high-water mark.
+    Assert: Listing stops at the first workflow older than the mark, and the deleted one is removed.
+    """
+    monkeypatch.setattr(utils, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(sync, 'PAGE_SIZE', 1)
+    cnfg = {'url': 'https://galaxy.example', 'api_key': 'k', 'hid': 'h0'}
+    workflow = {'name': 'wf', 'owner': 'me', 'tags': [], 'number_of_steps': 2}
+    items = {'/workflows': [dict(workflow, id='w1', update_time='2021-01-01'), dict(workflow, id='w2', update_time='2021-01-02')]}
+    gi = FakeGalaxy(items)
+    sync._sync(gi, cnfg, {}, ('workflows',))
+
+    items['/workflows'].append(dict(workflow, id='w2', update_time='2021-01-03', deleted=True))
+    del items['/workflows'][1]
+    gi.requests = []
+    assert sync._sync(gi, cnfg, {}, ('workflows',)) == {'workflows': (0, 1)}
+    assert len(gi.requests) == 2  # the deleted workflow, then the first one older than the mark
+    assert sorted(search_index._load_index(cnfg, 'workflows').numbers) == ['w1']
+
+
+def test_history_sync_lists_only_gxwf_history(tmp_path, monkeypatch):
+    """
+    Arrange: The gxwf history with two datasets.
+    Act: Sync the history collection, as a refresh of `gxwf datasets` does.
+    Assert: Only the history's contents are requested, and the store shown by `gxwf datasets` gets them.
+    """
+    monkeypatch.setattr(utils, 'CACHE_DIR', str(tmp_path))
+    cnfg = {'url': 'https://galaxy.example', 'api_key': 'k', 'hid': 'h0'}
+    gi = FakeGalaxy({'/histories/h0/contents': [_dataset('d1', '2021-01-01'), _dataset('d2', '2021-01-02')]})
+
+    assert sync._sync(gi, cnfg, {}, ('history',)) == {'history': (2, 0)}
+    assert [path for path, params in gi.requests] == ['/histories/h0/contents']
+    assert sorted(search_index._load_index(cnfg, 'datasets').numbers) == ['d1', 'd2']
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_wait
+.. moduleauthor:: Simon Bray <sbray@informatik.uni-freiburg.de>
+
+Tests for waiting on invocations with `gxwf wait`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from gxwf.subcommands import wait
+
+
+class FakeInvocations(object):
+    """
+    inv1 is still being scheduled for the first two listings; inv2 has a job running, then fails.
+    """
+    def __init__(self):
+        self.listings = 0
+        self.summaries = 0
+
+    def get_invocations(self, include_terminal=True, limit=None):
+        self.listings += 1
+        return [{'id': 'inv1', 'state': 'ready'}] if self.listings <= 2 else []
+
+    def show_invocation(self, invocation_id):
+        return {'id': invocation_id, 'state': 'scheduled'}
+
+    def get_invocation_summary(self, invocation_id):
+        if invocation_id == 'inv2':
+            self.summaries += 1
+            return {'states': {'ok': 1, 'running': 1} if self.summaries == 1 else {'ok': 1, 'error': 1}}
+        return {'states': {'ok': 3}}
+
+
+class FakeGalaxy(object):
+    def __init__(self):
+        self.invocations = FakeInvocations()
+
+
+def test_waits_until_all_finished(monkeypatch):
+    """
+    Arrange: Two invocations, one still being scheduled and one with a running job, and short poll intervals.
+    Act: Run poll cycles until nothing is left to wait for.
+    Assert: Both finish with the right outcome, due polls share one listing, and nothing is polled after it finished.
+    """
+    monkeypatch.setattr(wait, 'MIN_INTERVAL', 0.01)
+    monkeypatch.setattr(wait, 'COALESCE_WINDOW', 0.05)
+    gi = FakeGalaxy()
+    waiter = wait.Waiter(gi, ['inv1', 'inv2'])
+    cycles = 0
+    with ThreadPoolExecutor(2) as pool:
+        while waiter.heap:
+            waiter.cycle(pool)
+            cycles += 1
+    assert waiter.results == {'inv1': 'ok', 'inv2': 'failed'}
+    assert gi.invocations.listings == cycles
+    assert gi.invocations.summaries == 2